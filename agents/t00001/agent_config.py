@@ -62,6 +62,8 @@ agent_config = {
         "mask_size_p": 0.5,
         "mask_dir_p": 0.05,
     },
+    # step all envs of a rollout worker in one vectorised env
+    "vector_env": False,
     # aerospike configs (db)
     "aerospike": {
         "connection": {
@@ -74,10 +76,25 @@ agent_config = {
         },
         "namespace": "prod",
     },
+    # source of gym env data, either 'aerospike' or 'memmap'
+    "obs_store": {
+        "backend": "aerospike",
+    },
+    "feature_build": {
+        "num_cpus": 13,
+        "pool_threshold": 20_000,
+        "executor": "shared_memory",
+        "num_workers": 1,
+        "max_memory_gb": None,
+    },
     "redis": {
         "host": "localhost",
         "port": 6369,
     },
+    "tick_stream": {
+        "enabled": False,
+        "channel": "redis",
+    },
     "mt5": mt5_creds["metaquotes"]["demo"],
     # trader configs
     "trader": {
@@ -10,13 +10,18 @@ from __future__ import annotations
 import pickle as cPickle
 import argparse
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from flask import Flask
 from flask import request
 from flask import Response
 
 from releat.connectors.mt5 import MT5Connector
+from releat.signals.tick_stream import RedisTickChannel
+from releat.signals.tick_stream import TickPublisher
 from releat.utils.configs.constants import mt5_api_port_map
+from releat.utils.configs.constants import tick_columns
 
 argParser = argparse.ArgumentParser(
     description="Start mt5 api",
@@ -35,6 +40,7 @@ class MT5Api:
     def __init__(self):
         """Initialize class."""
         self.conn = None
+        self.publishers = {}
 
     def initialize(self, mt5_config):
         """Initialize MT5 connector."""
@@ -88,6 +94,47 @@ class MT5Api:
 
         return Response(df, content_type="application/octet-stream")
 
+    def get_ticks(self, data):
+        """Get ticks as an arrow ipc stream."""
+        ticks = self.conn.get_ticks(data["symbol"], int(data["t0"]), int(data["t1"]))
+        if ticks is None:
+            return {"error": "mt5 failed to return ticks"}, 500
+
+        columns = data.get("columns", tick_columns)
+        table = pa.table({c: np.ascontiguousarray(ticks[c]) for c in columns})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        return Response(
+            sink.getvalue().to_pybytes(),
+            content_type="application/vnd.apache.arrow.stream",
+        )
+
+    def start_stream(self, data):
+        """Start publishing new ticks of a symbol, see releat.signals.tick_stream."""
+        broker = data["broker"]
+        symbol = data["symbol"]
+        if (broker, symbol) in self.publishers:
+            return {"status": "already streaming"}, 200
+
+        start_time_msc = self.conn.get_last_tick_time(symbol)
+        if start_time_msc is None:
+            return {"error": f"no ticks for {symbol}"}, 500
+
+        maxlen = data.get("maxlen", 100_000)
+        channel = RedisTickChannel(data["host"], data["port"], maxlen=maxlen)
+        publisher = TickPublisher(
+            channel,
+            broker,
+            symbol,
+            lambda t0: self.conn.get_ticks(symbol, t0, t0 + 86_400_000),
+            start_time_msc,
+        )
+        publisher.start(data.get("interval", 0.05))
+        self.publishers[(broker, symbol)] = publisher
+        return {"status": "ok", "start_time_msc": start_time_msc}, 200
+
 
 mt5c = MT5Api()
 
@@ -132,5 +179,19 @@ def get_tick_data():
     return mt5c.get_tick_data(data)
 
 
+@app.route("/get_ticks", methods=["GET"])
+def get_ticks():
+    """Get ticks between two times in ms from epoch as an arrow ipc stream."""
+    data = request.json
+    return mt5c.get_ticks(data)
+
+
+@app.route("/start_stream", methods=["POST"])
+def start_stream():
+    """Start publishing new ticks to a redis stream."""
+    data = request.json
+    return mt5c.start_stream(data)
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=mt5_api_port_map[args.broker][args.symbol], debug=False)
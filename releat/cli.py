@@ -6,6 +6,7 @@ from time import sleep
 import aerospike
 import typer
 
+from releat.data.pipeline import export_obs_store
 from releat.data.pipeline import populate_train_data
 from releat.data.pipeline import update_gym_env_hparam
 from releat.utils.configs.config_builder import load_config
@@ -54,6 +55,14 @@ def build_train_data(agent_version):
     _ = populate_train_data(config, mode="initialise")
 
 
+@app.command()
+def export_obs(agent_version):
+    """Exports training data from db to local memory mapped arrays."""
+    config = load_config(agent_version)
+    client = aerospike.client(config.aerospike.connection).connect()
+    _ = export_obs_store(config, client)
+
+
 @app.command()
 def launch_train_data_updater(agent_version):
     """Periodically updates train data db."""
@@ -2,9 +2,12 @@
 from __future__ import annotations
 
 import numpy as np
-from tqdm import tqdm
+from aerospike import exception as ex
+from aerospike_helpers.batch import records as br
+from aerospike_helpers.operations import operations as op
 
 from releat.utils.logging import get_logger
+from releat.utils.time import count_trade_intervals
 
 logger = get_logger(__name__)
 
@@ -45,25 +48,33 @@ def get_records_in_aerospike(config, client):
         return 0
 
 
-def search_aerospike_for_dt(config, client, dt, start_val=None):
+def search_aerospike_for_dt(config, client, dt, start_val=None, num_probes=64):
     """Search aerospike for date.
 
     When uploading data to a table that already exists, find the index that
     corresponds to the specified datetime, dt
 
+    Records are contiguous on the trade calendar (see fill_trade_interval), so the
+    index is first estimated from the date of the last record and checked with a
+    single read. If the estimate misses, i.e. the table has gaps, the dates are
+    searched with batched probes, which narrows the search range by a factor of
+    num_probes for each round trip.
+
     Args:
         config (pydantic.BaseModels):
             as defined in 'agent_config.py'
         client (aerospike.Client):
             client for downloading and inserting records
-        dt (pd.DateTime):
-            each record is read and compared to this datetime
+        dt (int):
+            datetime as seconds since epoch, compared to the date bin of each record
         start_val (int):
-            the table index at which the scanning start
+            the table index of the last record to search
+        num_probes (int):
+            number of records read per round trip when the estimate misses
 
     Returns:
-        int
-            table index for dt, the input datetime
+        int | None
+            table index for dt, the input datetime, None if dt is not in the table
 
     """
     max_data_ind = get_records_in_aerospike(config, client)
@@ -72,21 +83,144 @@ def search_aerospike_for_dt(config, client, dt, start_val=None):
     if max_data_ind == 0:
         return 0
 
-    ind_offset = None
-    for i in tqdm(np.arange(max_data_ind, -1, -1)):
-        key = (
+    dt = int(dt)
+
+    # estimate index from the trade calendar relative to the last record
+    max_date = _select_dates(config, client, [max_data_ind])[0]
+    if max_date is not None and dt <= max_date:
+        ind = max_data_ind - count_trade_intervals(
+            dt,
+            max_date,
+            config.raw_data.trade_timeframe,
+        )
+        if ind >= 0 and _select_dates(config, client, [ind])[0] == dt:
+            return ind
+        logger.info(f"date {dt} not at calendar index {ind}, searching table")
+
+    # dates increase with the index, missing records do not narrow the range
+    lo, hi = 0, max_data_ind
+    scan = False
+    while lo <= hi:
+        if scan or (hi - lo + 1 <= num_probes):
+            # contiguous window at the start of the range
+            inds = np.arange(lo, min(lo + num_probes, hi + 1))
+        else:
+            inds = np.unique(np.linspace(lo, hi, num_probes).astype(int))
+        dates = _select_dates(config, client, inds)
+        found = [i for i, x in zip(inds, dates) if x is not None and x == dt]
+        if len(found) > 0:
+            return int(found[0])
+        below = [i for i, x in zip(inds, dates) if x is not None and x < dt]
+        above = [i for i, x in zip(inds, dates) if x is not None and x > dt]
+        if len(below) == 0 and len(above) == 0:
+            # no dates found in any of the probes, read the range one window at a
+            # time so that each round trip reads at most num_probes records
+            if scan or (hi - lo + 1 <= num_probes):
+                lo = int(inds[-1]) + 1
+            scan = True
+            continue
+        scan = False
+        lo = int(max(below)) + 1 if len(below) > 0 else lo
+        hi = int(min(above)) - 1 if len(above) > 0 else hi
+
+    return None
+
+
+def _select_dates(config, client, inds):
+    """Select dates.
+
+    Args:
+        config (pydantic.BaseModels):
+            as defined in 'agent_config.py'
+        client (aerospike.Client):
+            client for downloading and inserting records
+        inds (list[int]):
+            table indexes of the records
+
+    Returns:
+        list[int | None]
+            date of each record, None if the record or date does not exist
+
+    """
+    try:
+        records = batch_select_records(config, client, inds, ["date"])
+    except ex.RecordNotFound:
+        return [None] * len(inds)
+    return [x.get("date") if x is not None else None for x in records]
+
+
+def batch_select_records(config, client, inds, bins):
+    """Batch select records.
+
+    Reads a subset of bins for many records in one round trip
+
+    Args:
+        config (pydantic.BaseModels):
+            as defined in 'agent_config.py'
+        client (aerospike.Client):
+            client for downloading and inserting records
+        inds (list[int]):
+            table indexes of the records
+        bins (list[str]):
+            names of the bins to read
+
+    Returns:
+        list[dict | None]
+            bins for each record in the same order as inds, None if the record does
+            not exist
+
+    """
+    keys = [
+        (
             config.aerospike.namespace,
             config.aerospike.set_name,
             int(i),
         )
-        try:
-            _, _, bins = client.get(key)
-        except Exception as e:
-            logger.critical(str(repr(e)))
-            bins = {}
-        if "date" in bins:
-            if dt == bins["date"]:
-                ind_offset = i
-                break
-
-    return ind_offset
+        for i in inds
+    ]
+    records = client.select_many(keys, list(bins))
+    return [x[2] if x[1] is not None else None for x in records]
+
+
+def batch_put_records(config, client, inds, records):
+    """Batch put records.
+
+    Writes many records in one batch call. Each record only overwrites the bins that
+    it contains, which is the same behaviour as client.put
+
+    Args:
+        config (pydantic.BaseModels):
+            as defined in 'agent_config.py'
+        client (aerospike.Client):
+            client for downloading and inserting records
+        inds (list[int]):
+            table indexes of the records
+        records (list[dict]):
+            bins to write for each record, same length as inds
+
+    Returns:
+        None
+
+    """
+    if len(inds) == 0:
+        return
+
+    batch_records = br.BatchRecords(
+        [
+            br.Write(
+                (
+                    config.aerospike.namespace,
+                    config.aerospike.set_name,
+                    int(i),
+                ),
+                [op.write(k, v) for k, v in bins.items()],
+            )
+            for i, bins in zip(inds, records)
+        ],
+    )
+    res = client.batch_write(batch_records)
+    failed = [x for x in res.batch_records if x.result != 0]
+    assert len(failed) == 0, (
+        f"{len(failed)} of {len(inds)} records failed to write, "
+        f"first failed key: {failed[0].key} result: {failed[0].result}"
+    )
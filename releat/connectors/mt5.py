@@ -353,6 +353,60 @@ class MT5Connector:
                 if len(df) > 0:
                     df = pd.DataFrame(df).drop("time", axis=1)
                     return df
+                # no ticks, i.e. weekends, try 3 times in case history is still syncing
+                counter += 4
+                sleep(1)
             except Exception:
                 counter += 1
                 sleep(10)
+
+    def get_ticks(self, symbol, t0, t1):
+        """Get ticks.
+
+        Same as get_tick_data, but with times in ms from epoch and without pandas.
+
+        Args:
+            symbol (str)
+            t0 (int)
+                start time in ms from epoch, inclusive
+            t1 (int)
+                end time in ms from epoch, exclusive
+
+        Returns:
+            np.array | None
+                structured array of ticks, empty if there are no ticks. None if
+                MT5 fails
+
+        """
+        dt0 = datetime.fromtimestamp(t0 // 1000, tz=pytz.utc)
+        dt1 = datetime.fromtimestamp(t1 // 1000 + 1, tz=pytz.utc)
+
+        counter = 0
+        while counter < 10:
+            try:
+                ticks = mt5.copy_ticks_range(symbol, dt0, dt1, mt5.COPY_TICKS_ALL)
+                if ticks is None:
+                    raise ValueError(mt5.last_error())
+                # mt5 only takes whole seconds
+                time_msc = ticks["time_msc"]
+                return ticks[(time_msc >= t0) & (time_msc < t1)]
+            except Exception:
+                counter += 1
+                sleep(10)
+        return None
+
+    def get_last_tick_time(self, symbol):
+        """Get last tick time.
+
+        Args:
+            symbol (str)
+
+        Returns:
+            int | None
+                time of the last tick in ms from epoch
+
+        """
+        tick = mt5.symbol_info_tick(symbol)
+        if tick is None:
+            return None
+        return tick.time_msc
@@ -0,0 +1,180 @@
+"""Feature cache.
+
+Raw feature files are saved by the index and name of the feature, see
+get_feature_dir, which does not change when the feature parameters change. The cache
+keeps a copy of each raw feature file under a hash of everything that the file
+depends on:
+- feature parameters, i.e. name, inputs, kwargs and timeframes
+- trade timeframe and offset
+- month and fingerprint of the tick data files
+
+so that a rebuild only calculates the (feature, month) cells that are missing or have
+changed. Files are hard linked where possible, and always replaced rather than
+overwritten, so that the cache and the raw feature files never modify each other.
+
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from releat.data.cleaning import get_tick_file
+
+# bump to invalidate the cache when the feature calculations change
+CACHE_VERSION = 3
+
+
+def get_tick_fingerprint(config, broker, symbol, dt):
+    """Get tick fingerprint.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            symbol name
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+
+    Returns:
+        list
+            name, size and modified time of the tick files that are loaded for the
+            month, i.e. the previous and current month, see load_raw_tick_data
+
+    """
+    prev_dt = datetime.strptime(dt, "%Y-%m-%d").date() - relativedelta(months=1)
+    fingerprint = []
+    for f_dt in [prev_dt.strftime("%Y-%m-%d"), dt]:
+        f = get_tick_file(config, broker, symbol, f_dt)
+        if os.path.exists(f):
+            stat = os.stat(f)
+            fingerprint.append([os.path.basename(f), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+
+def get_feature_key(config, feat_group_ind, feat_ind, dt):
+    """Get feature key.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of the feature group
+        feat_ind (int):
+            index of the feature within the feature group
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+
+    Returns:
+        str
+            hash of everything that the raw feature file of the month depends on
+
+    """
+    feat_group = config.features[feat_group_ind]
+    fc = feat_group.simple_features[feat_ind]
+    raw_data = config.raw_data
+
+    key = {
+        "version": CACHE_VERSION,
+        "name": fc.name,
+        "broker": fc.broker,
+        "symbol": fc.symbol,
+        "inputs": fc.inputs,
+        "kwargs": fc.kwargs,
+        "timeframe": fc.timeframe,
+        "group_timeframe": feat_group.timeframe,
+        "fillna": fc.fillna,
+        "trade_timeframe": raw_data.trade_timeframe,
+        "trade_time_offset": raw_data.trade_time_offset,
+        "tick_time_diff_clip_val": raw_data.tick_time_diff_clip_val,
+        "dt": dt,
+        "ticks": get_tick_fingerprint(config, fc.broker, fc.symbol, dt),
+    }
+    key = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def get_cache_file(config, feat_group_ind, feat_ind, dt):
+    """Get cache file.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of the feature group
+        feat_ind (int):
+            index of the feature within the feature group
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+
+    Returns:
+        str
+            location of the cached raw feature file
+
+    """
+    key = get_feature_key(config, feat_group_ind, feat_ind, dt)
+    return f"{config.paths.feature_dir}/cache/{key}.parquet"
+
+
+def link_file(src, dst):
+    """Link file.
+
+    Hard links src to dst (or copies if hard links are not supported), replacing dst.
+
+    Args:
+        src (str):
+            existing file
+        dst (str):
+            new file
+
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    # hidden so that it is not globbed with the raw feature files
+    tmp_f = f"{os.path.dirname(dst)}/.{os.path.basename(dst)}.tmp"
+    if os.path.exists(tmp_f):
+        os.remove(tmp_f)
+    try:
+        os.link(src, tmp_f)
+    except OSError:
+        shutil.copyfile(src, tmp_f)
+    os.replace(tmp_f, dst)
+
+
+def restore_from_cache(cache_f, save_f):
+    """Restore from cache.
+
+    Args:
+        cache_f (str):
+            cached raw feature file
+        save_f (str):
+            raw feature file
+
+    Returns:
+        bool
+            True if the file was in the cache
+
+    """
+    if not os.path.exists(cache_f):
+        return False
+    if not (os.path.exists(save_f) and os.path.samefile(cache_f, save_f)):
+        link_file(cache_f, save_f)
+    return True
+
+
+def add_to_cache(save_f, cache_f):
+    """Add to cache.
+
+    Args:
+        save_f (str):
+            raw feature file
+        cache_f (str):
+            cached raw feature file
+
+    """
+    link_file(save_f, cache_f)
@@ -9,12 +9,21 @@ Converts to:
 from __future__ import annotations
 
 import os
+from collections import OrderedDict
 from datetime import datetime
+from datetime import timedelta
 
 import polars as pl
 from dateutil.relativedelta import relativedelta
 
-from releat.data.extractor import download_tick_data
+from releat.data.extractor import download_ticks
+from releat.data.tick_archive import read_tick_archive
+from releat.data.tick_archive import write_tick_archive
+from releat.data.tick_store import get_file_fingerprint
+from releat.data.tick_store import get_month_files
+from releat.data.tick_store import is_month_ingested
+from releat.data.tick_store import scan_tick_files
+from releat.data.tick_store import write_tick_month
 
 
 def clean_raw_tick_data(df, tick_time_diff_clip_val):
@@ -34,6 +43,8 @@ def clean_raw_tick_data(df, tick_time_diff_clip_val):
     #TODO include real_volume when working on CME / futures data
 
     """
+    # time_diff is calculated in ns, whatever the time unit of the input
+    df = df.with_columns(pl.col("time_msc").dt.cast_time_unit("ns"))
     df = df.with_columns(((pl.col("bid") + pl.col("ask")) / 2).alias("avg_price"))
     df = df.with_columns((pl.col("ask") - pl.col("bid")).alias("spread"))
     df = df.with_columns(
@@ -128,9 +139,11 @@ def group_tick_data_by_time(config, feat_group_ind, tick_df, mode="train", lazy=
     feature_timeframe = config.features[feat_group_ind].timeframe
     trade_timeframe = config.raw_data.trade_timeframe
 
+    # tick_ind is the row of each tick in tick_df, so that features can be calculated
+    # over the tick arrays from the first tick and number of ticks of each window
     tick_df = tick_df.with_columns(
         pl.col("time_msc").dt.offset_by(by="-" + config.raw_data.trade_time_offset),
-    )
+    ).with_row_count("tick_ind")
 
     if lazy:
         df_group = (
@@ -157,6 +170,44 @@ def group_tick_data_by_time(config, feat_group_ind, tick_df, mode="train", lazy=
     return df_group
 
 
+def get_tick_file_name(dt):
+    """Get tick file name.
+
+    Args:
+        dt (datetime.date):
+            first day of the month
+
+    Returns:
+        str
+            name of the monthly tick data file, i.e. 2023-04-01_2023-04-30.parquet
+
+    """
+    dt1 = dt + relativedelta(months=1) - relativedelta(days=1)
+    return f"{dt.strftime('%Y-%m-%d')}_{dt1.strftime('%Y-%m-%d')}.parquet"
+
+
+def get_tick_file(config, broker, symbol, dt):
+    """Get tick file.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            symbol name
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+
+    Returns:
+        str
+            local path of the monthly tick data file, see load_raw_tick_data
+
+    """
+    dt = datetime.strptime(dt, "%Y-%m-%d").date()
+    return f"{config.paths.tick_data_dir}/{broker}/{symbol}/{get_tick_file_name(dt)}"
+
+
 def load_raw_tick_data(config, broker, symbol, dt, df=None):
     """Load raw tick data.
 
@@ -185,8 +236,9 @@ def load_raw_tick_data(config, broker, symbol, dt, df=None):
             trading instrument, i.e. EURUSD
         dt (str):
             monthly dates in the format '%y-%m-01' or 'inference' or 'update'
-        df (pd.DataFrame | None):
-            only provide a pandas dataframe of tick data when dt = 'inference'
+        df (pd.DataFrame | pl.DataFrame | None):
+            only provide a dataframe of tick data when dt = 'inference', i.e. from
+            TickRingBuffer.to_frame
 
     Returns:
         pl.DataFrame:
@@ -212,7 +264,8 @@ def load_raw_tick_data(config, broker, symbol, dt, df=None):
         )
         return df
     elif dt == "inference":
-        df = pl.from_pandas(df)
+        if not isinstance(df, pl.DataFrame):
+            df = pl.from_pandas(df)
         df = clean_raw_tick_data(df, config.raw_data.tick_time_diff_clip_val)
         df = df.select(
             [
@@ -226,77 +279,311 @@ def load_raw_tick_data(config, broker, symbol, dt, df=None):
             ],
         )
         return df
+    elif config.raw_data.use_tick_store:
+        return load_tick_store_month(config, broker, symbol, dt)
     else:
-        # git the current file name
-        dt = datetime.strptime(dt, "%Y-%m-%d").date()
-        dt1 = dt + relativedelta(months=1) - relativedelta(days=1)
-        curr_f = f"{dt.strftime('%Y-%m-%d')}_{dt1.strftime('%Y-%m-%d')}.parquet"
-
-        # try to read the tail end of the previous file
-        prev_f = None
-        prev_dt = dt - relativedelta(months=1)
-        prev_dt1 = dt - relativedelta(days=1)
-        if prev_dt1.year >= 2019:
-            prev_f = (
-                f"{prev_dt.strftime('%Y-%m-%d')}_{prev_dt1.strftime('%Y-%m-%d')}.parquet"
-            )
-
-        local_tick_data_dir = f"{config.paths.tick_data_dir}/{broker}/{symbol}"
-        os.makedirs(local_tick_data_dir, exist_ok=True)
-
         tick_df = []
 
-        for f in [prev_f, curr_f]:
-            if f is not None:
-                local_f = f"{local_tick_data_dir}/{f}"
-
-                # TODO clean this logic, make polars instead of pandas
-                if not os.path.exists(local_f):
-                    if prev_f == f:
-                        df = download_tick_data(
-                            broker,
-                            symbol,
-                            prev_dt,
-                            prev_dt1 + relativedelta(days=1),
-                            data_mode=config.raw_data.data_mode,
-                        )["tick_df"]
-                    elif curr_f == f:
-                        df = download_tick_data(
-                            broker,
-                            symbol,
-                            dt,
-                            dt1 + relativedelta(days=1),
-                            data_mode=config.raw_data.data_mode,
-                        )["tick_df"]
-                    df.to_parquet(local_f, engine="pyarrow")
-                    df = pl.from_pandas(df)
-                else:
-                    df = pl.read_parquet(local_f, use_pyarrow=True)
-
-                if f == prev_f:
-                    df = df.filter(
-                        pl.col("time_msc")
-                        >= pl.col("time_msc").max().dt.offset_by("-1d"),
-                    )
-                df = clean_raw_tick_data(df, config.raw_data.tick_time_diff_clip_val)
-                tick_df.append(
-                    df.select(
-                        [
-                            pl.col("bid").cast(pl.Float32),
-                            pl.col("ask").cast(pl.Float32),
-                            pl.col("time_msc").dt.cast_time_unit("ns"),
-                            pl.col("avg_price").cast(pl.Float32),
-                            pl.col("spread").cast(pl.Float32),
-                            pl.col("time_diff").cast(pl.Float32),
-                            pl.col("flags").cast(pl.Int32),
-                        ],
-                    ),
+        # also read the tail end of the previous file
+        tick_months = get_tick_months(dt)
+        for f_dt in tick_months:
+            df = read_tick_file(config, broker, symbol, f_dt)
+
+            if (len(tick_months) > 1) and (f_dt == tick_months[0]):
+                df = df.filter(
+                    pl.col("time_msc") >= pl.col("time_msc").max().dt.offset_by("-1d"),
                 )
+            df = clean_raw_tick_data(df, config.raw_data.tick_time_diff_clip_val)
+            tick_df.append(select_tick_columns(df))
         tick_df = pl.concat(tick_df, how="vertical")
         return tick_df
 
 
-def get_trade_price(config, broker, symbol, dt):
+def select_tick_columns(df):
+    """Select tick columns.
+
+    Args:
+        df (pl.DataFrame):
+            output of clean_raw_tick_data
+
+    Returns:
+        pl.DataFrame
+            tick data with the column types used to build features
+
+    """
+    return df.select(
+        [
+            pl.col("bid").cast(pl.Float32),
+            pl.col("ask").cast(pl.Float32),
+            pl.col("time_msc").dt.cast_time_unit("ns"),
+            pl.col("avg_price").cast(pl.Float32),
+            pl.col("spread").cast(pl.Float32),
+            pl.col("time_diff").cast(pl.Float32),
+            pl.col("flags").cast(pl.Int32),
+        ],
+    )
+
+
+def read_tick_file(config, broker, symbol, dt):
+    """Read tick file.
+
+    Reads the monthly tick file, downloading it if it does not exist.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in the 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        dt (datetime.date):
+            first day of the month
+
+    Returns:
+        pl.DataFrame
+            raw tick data
+
+    """
+    local_tick_data_dir = f"{config.paths.tick_data_dir}/{broker}/{symbol}"
+    os.makedirs(local_tick_data_dir, exist_ok=True)
+    local_f = f"{local_tick_data_dir}/{get_tick_file_name(dt)}"
+
+    if not os.path.exists(local_f):
+        df = download_ticks(
+            broker,
+            symbol,
+            dt,
+            dt + relativedelta(months=1),
+            data_mode=config.raw_data.data_mode,
+        )
+        write_tick_archive(df, local_f, broker, symbol)
+    return read_tick_archive(local_f)
+
+
+def get_tick_months(dt):
+    """Get tick months.
+
+    Args:
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+
+    Returns:
+        list[datetime.date]
+            months of tick data that are loaded for dt, i.e. the previous month (if
+            after 2019) and the current month, see load_raw_tick_data
+
+    """
+    dt = datetime.strptime(dt, "%Y-%m-%d").date()
+    prev_dt = dt - relativedelta(months=1)
+    if (dt - relativedelta(days=1)).year >= 2019:
+        return [prev_dt, dt]
+    return [dt]
+
+
+def ingest_tick_month(config, broker, symbol, dt):
+    """Ingest tick month.
+
+    Cleans a monthly tick file and writes it to the tick store, see
+    releat.data.tick_store
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in the 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        dt (datetime.date):
+            first day of the month
+
+    """
+    dt_str = dt.strftime("%Y-%m-%d")
+    # before reading, so that a file replaced while reading is ingested again
+    tick_f = get_tick_file(config, broker, symbol, dt_str)
+    source = get_file_fingerprint(tick_f)
+    df = read_tick_file(config, broker, symbol, dt)
+    source = source or get_file_fingerprint(tick_f)
+
+    df = clean_raw_tick_data(df, config.raw_data.tick_time_diff_clip_val)
+    df = select_tick_columns(df)
+    write_tick_month(config, broker, symbol, dt_str, df, source=source)
+
+
+def prepare_tick_data(config, broker, symbol, dt):
+    """Prepare tick data.
+
+    Downloads the tick files, and ingests them into the tick store if it is used, so
+    that dt can be loaded by load_raw_tick_data without writing any files.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in the 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+
+    """
+    for f_dt in get_tick_months(dt):
+        f_dt_str = f_dt.strftime("%Y-%m-%d")
+        if config.raw_data.use_tick_store:
+            tick_f = get_tick_file(config, broker, symbol, f_dt_str)
+            if not is_month_ingested(config, broker, symbol, f_dt_str, tick_f):
+                ingest_tick_month(config, broker, symbol, f_dt)
+        elif not os.path.exists(get_tick_file(config, broker, symbol, f_dt_str)):
+            _ = read_tick_file(config, broker, symbol, f_dt)
+
+
+def load_tick_store_month(config, broker, symbol, dt):
+    """Load tick store month.
+
+    Same output as load_raw_tick_data for a month, read from the tick store. Only
+    the day partitions of the current month and the last day of the previous month
+    are read, and the ticks are already cleaned.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in the 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+
+    Returns:
+        pl.DataFrame:
+            polars dataframe of cleaned tick data
+
+    """
+    _ = prepare_tick_data(config, broker, symbol, dt)
+
+    tick_df = []
+    for f_dt in get_tick_months(dt):
+        f_dt_str = f_dt.strftime("%Y-%m-%d")
+        if f_dt_str == dt:
+            files = get_month_files(config, broker, symbol, f_dt_str)
+            tick_df.append(scan_tick_files(files).collect())
+        else:
+            # the last tick of the previous month is in its last day partition
+            files = get_month_files(config, broker, symbol, f_dt_str)
+            if len(files) == 0:
+                continue
+            t_max = pl.read_parquet(files[-1], columns=["time_msc"])["time_msc"].max()
+            t0 = t_max - timedelta(days=1)
+            files = get_month_files(
+                config,
+                broker,
+                symbol,
+                f_dt_str,
+                start_date=t0.strftime("%Y-%m-%d"),
+            )
+            df = scan_tick_files(files, t0=t0).collect()
+            # same as cleaning the last day on its own, see load_raw_tick_data
+            df = df.with_columns(
+                pl.when(pl.arange(0, pl.count()) == 0)
+                .then(None)
+                .otherwise(pl.col("time_diff"))
+                .alias("time_diff"),
+            )
+            tick_df.append(df)
+
+    return pl.concat(tick_df, how="vertical")
+
+
+class TickCache:
+    """Tick cache.
+
+    LRU cache of cleaned tick data keyed by (broker, symbol, dt), bounded by the size
+    of the tick data in bytes. The grouped tick data of each feature timeframe is
+    cached with it, so that feature groups and the trade price of the same month do
+    not load, clean and group the same ticks again.
+
+    """
+
+    def __init__(self, config, max_bytes=None):
+        """Init.
+
+        Args:
+            config (pydantic.BaseModel):
+                defined in agent_config.py
+            max_bytes (float | None):
+                the least recently used tick data is dropped when the cache is larger,
+                the most recent tick data is always kept. No limit if None
+
+        """
+        self.config = config
+        self.max_bytes = max_bytes
+        self.tick_dfs = OrderedDict()
+        self.df_groups = {}
+
+    def get(self, broker, symbol, dt):
+        """Get tick data.
+
+        Args:
+            broker (str):
+                broker name
+            symbol (str):
+                trading instrument, i.e. EURUSD
+            dt (str):
+                see load_raw_tick_data
+
+        Returns:
+            pl.DataFrame
+                cleaned tick data
+
+        """
+        k = (broker, symbol, dt)
+        if k in self.tick_dfs:
+            self.tick_dfs.move_to_end(k)
+            return self.tick_dfs[k]
+
+        self.tick_dfs[k] = load_raw_tick_data(self.config, broker, symbol, dt)
+        while (len(self.tick_dfs) > 1) and (self.max_bytes is not None):
+            if sum(x.estimated_size() for x in self.tick_dfs.values()) <= self.max_bytes:
+                break
+            k0, _ = self.tick_dfs.popitem(last=False)
+            self.df_groups = {
+                x: v for x, v in self.df_groups.items() if x[:3] != k0
+            }
+        return self.tick_dfs[k]
+
+    def get_group(self, feat_group_ind, broker, symbol, dt, lazy=False):
+        """Get grouped tick data.
+
+        Args:
+            feat_group_ind (int):
+                index of feat group, the grouping only depends on its timeframe
+            broker (str):
+                broker name
+            symbol (str):
+                trading instrument, i.e. EURUSD
+            dt (str):
+                see load_raw_tick_data
+            lazy (bool):
+                if True, use lazy polars dataframe
+
+        Returns:
+            pl.GroupBy
+                see group_tick_data_by_time
+
+        """
+        tick_df = self.get(broker, symbol, dt)
+        timeframe = self.config.features[feat_group_ind].timeframe
+        k = (broker, symbol, dt, timeframe, lazy)
+        if k not in self.df_groups:
+            self.df_groups[k] = group_tick_data_by_time(
+                self.config,
+                feat_group_ind,
+                tick_df,
+                lazy=lazy,
+            )
+        return self.df_groups[k]
+
+
+def get_trade_price(config, broker, symbol, dt, tick_cache=None):
     """Get trade price.
 
     For each trade time interval, get the bid and ask price for the next X seconds
@@ -308,13 +595,18 @@ def get_trade_price(config, broker, symbol, dt):
             trading isntrument, i.e. EURUSD
         dt (str):
             monthly dates in the format '%Y-%m-01'
+        tick_cache (TickCache | None):
+            if given, tick data is read from the cache
 
     Returns:
         None
 
     """
     trade_timeframe = config.raw_data.trade_timeframe
-    tick_df = load_raw_tick_data(config, broker, symbol, dt)
+    if tick_cache is None:
+        tick_df = load_raw_tick_data(config, broker, symbol, dt)
+    else:
+        tick_df = tick_cache.get(broker, symbol, dt)
 
     tick_df = tick_df.with_columns(
         pl.col("time_msc").dt.offset_by(by="-" + config.raw_data.trade_time_offset),
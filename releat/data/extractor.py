@@ -2,12 +2,18 @@
 from __future__ import annotations
 
 import _pickle as cPickle
+from datetime import date
+from datetime import datetime
+from datetime import timezone
 
 import pandas as pd
+import polars as pl
+import pyarrow as pa
 import requests
 
 from releat.utils.configs.constants import mt5_api_port_map
 from releat.utils.configs.constants import mt5_creds
+from releat.utils.configs.constants import tick_columns
 from releat.utils.logging import get_logger
 from releat.workflows.service_manager import start_mt5_api
 
@@ -15,6 +21,125 @@ from releat.workflows.service_manager import start_mt5_api
 logger = get_logger(__name__)
 
 
+def check_mt5_api(broker, symbol, data_mode):
+    """Check mt5 api.
+
+    Starts the mt5 api of the symbol if it is not running and logs into mt5.
+
+    Args:
+        broker (str):
+            broker as string
+        symbol (str):
+            trading instrument, e.g. EURUSD
+        data_mode (str):
+            either 'live' or 'demo'
+
+    """
+    port = mt5_api_port_map[broker][symbol]
+    resp = requests.get(f"http://127.0.0.1:{port}/healthcheck")
+    if resp.status_code != 200:
+        logger.warning(f"Connection error to port {port}. Initializing...")
+        start_mt5_api(broker, symbol)
+        resp = requests.get(f"http://127.0.0.1:{port}/healthcheck")
+        assert resp.status_code == 200, f"http://127.0.0.1:{port} failed to initialize"
+
+    mt5_config = mt5_creds[broker][data_mode]
+    resp = requests.post(f"http://127.0.0.1:{port}/init", json=mt5_config)
+    logger.info(f"Connection success to port {port}")
+
+
+def to_epoch_ms(dt):
+    """To epoch ms.
+
+    Args:
+        dt (datetime.datetime | datetime.date | int):
+            datetime, naive datetimes and dates are utc, or ms from epoch
+
+    Returns:
+        int
+            ms from epoch
+
+    """
+    if isinstance(dt, date) and not isinstance(dt, datetime):
+        dt = datetime(dt.year, dt.month, dt.day)
+    if isinstance(dt, datetime):
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1000)
+    return int(dt)
+
+
+def download_ticks(
+    broker,
+    symbol,
+    t0,
+    t1,
+    data_mode,
+    columns=None,
+    check_api=True,
+    timeout=60,
+):
+    """Download ticks.
+
+    Same as download_tick_data, but the times are sent as ms from epoch and the ticks
+    are returned by the mt5 api as an arrow ipc stream, which is read into polars
+    without pandas or pickle.
+
+    Args:
+        broker (str):
+            broker as string
+        symbol (str):
+            trading instrument, e.g. EURUSD
+        t0 (datetime.datetime | int):
+            start time, inclusive, see to_epoch_ms
+        t1 (datetime.datetime | int):
+            end time, exclusive, see to_epoch_ms
+        data_mode (str):
+            either 'live' or 'demo'
+        columns (list[str] | None):
+            tick columns, defaults to tick_columns
+        check_api (bool):
+            True or False
+        timeout (int):
+            timeout of api in seconds
+
+    Returns:
+        pl.DataFrame
+            ticks with time_msc as datetime in ns, empty if there are no ticks
+
+    Raises:
+        requests.HTTPError:
+            if mt5 fails to return the ticks
+
+    """
+    port = mt5_api_port_map[broker][symbol]
+    if check_api:
+        check_mt5_api(broker, symbol, data_mode)
+
+    d_request = {
+        "symbol": symbol,
+        "t0": to_epoch_ms(t0),
+        "t1": to_epoch_ms(t1),
+        "columns": columns or tick_columns,
+    }
+    resp = requests.get(
+        f"http://127.0.0.1:{port}/get_ticks",
+        json=d_request,
+        timeout=timeout,
+    )
+    resp.raise_for_status()
+
+    with pa.ipc.open_stream(resp.content) as reader:
+        df = pl.from_arrow(reader.read_all())
+    if "time_msc" in df.columns:
+        # ns, the same as download_tick_data and the cleaned tick data
+        df = df.with_columns(
+            pl.col("time_msc").cast(pl.Datetime("ms")).dt.cast_time_unit("ns"),
+        )
+    logger.debug(f"{broker} {symbol} {t0} >> {t1} {str(len(df)).rjust(8)} ticks")
+    return df
+
+
 def download_tick_data(broker, symbol, dt0, dt1, data_mode, check_api=True, timeout=60):
     """Download tick data.
 
@@ -41,16 +166,7 @@ def download_tick_data(broker, symbol, dt0, dt1, data_mode, check_api=True, time
     """
     port = mt5_api_port_map[broker][symbol]
     if check_api:
-        resp = requests.get(f"http://127.0.0.1:{port}/healthcheck")
-        if resp.status_code != 200:
-            logger.warning(f"Connection error to port {port}. Initializing...")
-            start_mt5_api(broker, symbol)
-            resp = requests.get(f"http://127.0.0.1:{port}/healthcheck")
-            assert resp.stats_code == 200, f"http://127.0.0.1:{port} failed to initialize"
-
-        mt5_config = mt5_creds[broker][data_mode]
-        resp = requests.post(f"http://127.0.0.1:{port}/init", json=mt5_config)
-        logger.info(f"Connection success to port {port}")
+        check_mt5_api(broker, symbol, data_mode)
 
     dt0 = dt0.strftime("%Y-%m-%d %H:%M:%S.%f")
     dt1 = dt1.strftime("%Y-%m-%d %H:%M:%S.%f")
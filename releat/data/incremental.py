@@ -0,0 +1,617 @@
+"""Incremental features.
+
+Live inference engine that updates the feature data by one row per trade timestep
+from the ticks since the last timestep, instead of filtering, cleaning and grouping
+all of the ticks of each feature window as update_feature_dict does.
+
+The ticks of the window of a feature group, i.e. the last 5 minutes, are read from
+the TickRingBuffer of the symbol. Each window keeps running state that is updated
+by the ticks that enter and leave the window:
+- mean and differencing: sum and count of each input
+- min and max: monotonic deques of (time, value), amortized O(1) per tick
+- one_hot: count of each flag
+- grad: sums of x, y, x^2 and xy relative to an anchor tick, the least squares
+  slope is translation invariant so the anchor does not need to be in the window
+
+Other features, i.e. skew, grad_with_peak_trends and inflection, are calculated by
+make_feature over the ticks of the window, as in update_feature_dict. The running
+state is recalculated from the window every resync_steps so that rounding errors of
+the sums and ticks that were replaced in the tick buffer do not accumulate, and
+whenever the number of ticks in the previous window has changed, i.e. late ticks
+at or before the previous trade time were added to the tick buffer.
+
+The rows of each feature are held in preallocated arrays, see FeatureRows.
+
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from releat.data.cleaning import group_tick_data_by_time
+from releat.data.cleaning import load_raw_tick_data
+from releat.data.pipeline import make_feature
+from releat.data.tick_buffer import to_ns
+
+# features that are updated from running state, other features use make_feature
+INCREMENTAL_FEATURES = ["differencing", "mean", "min", "max", "one_hot", "grad"]
+
+# fillna strategies of update_feature_dict that are supported
+FILL_STRATEGIES = ["forward", "zero"]
+
+# flags counted by one_hot_fx_flag
+FX_FLAGS = [2, 4, 6]
+
+
+class FeatureRows:
+    """Last rows of a feature.
+
+    Same as a dataframe of feature_data, the times and values are held in arrays of
+    twice the number of rows and the rows that are kept are moved to the front when
+    the end of the arrays is reached.
+
+    """
+
+    def __init__(self, df):
+        """Init.
+
+        Args:
+            df (pl.DataFrame):
+                rows of a feature as returned by init_feature_dict, the number of
+                rows is kept
+
+        """
+        self.schema = df.schema
+        self.cols = [c for c in df.columns if c != "time_msc"]
+        self.capacity = len(df)
+        self.times = np.zeros(2 * self.capacity, dtype=np.int64)
+        self.values = np.zeros((2 * self.capacity, len(self.cols)), dtype=np.float64)
+
+        time_msc = df["time_msc"].dt.cast_time_unit("ns").cast(pl.Int64)
+        self.times[: self.capacity] = time_msc.to_numpy()
+        for j, col in enumerate(self.cols):
+            self.values[: self.capacity, j] = (
+                df[col].cast(pl.Float64).fill_null(np.nan).to_numpy()
+            )
+        self.start = 0
+        self.end = self.capacity
+
+    def last_time(self):
+        """Time of the last row.
+
+        Returns:
+            int
+                ns from epoch
+
+        """
+        return int(self.times[self.end - 1])
+
+    def last_row(self):
+        """Values of the last row.
+
+        Returns:
+            np.array
+
+        """
+        return self.values[self.end - 1]
+
+    def append(self, t, row):
+        """Append a row and drop the oldest row.
+
+        Args:
+            t (int):
+                time in ns from epoch
+            row (np.array):
+                values of the row
+
+        """
+        if self.end == len(self.times):
+            keep = self.capacity - 1
+            self.times[:keep] = self.times[self.end - keep : self.end]
+            self.values[:keep] = self.values[self.end - keep : self.end]
+            self.end = keep
+        self.times[self.end] = t
+        self.values[self.end] = row
+        self.end += 1
+        self.start = self.end - self.capacity
+
+    def to_frame(self):
+        """To frame.
+
+        Returns:
+            pl.DataFrame
+                rows in the same format as the dataframes of feature_data
+
+        """
+        columns = [
+            pl.Series("time_msc", self.times[self.start : self.end]).cast(
+                self.schema["time_msc"],
+            ),
+        ]
+        for j, col in enumerate(self.cols):
+            s = pl.Series(col, self.values[self.start : self.end, j]).fill_nan(None)
+            columns.append(s.cast(self.schema[col]))
+        return pl.DataFrame(columns)
+
+
+class TickWindow:
+    """Running state of the ticks of a symbol in the window of a feature group.
+
+    The window holds the ticks from trade_time - timeframe to trade_time, same as
+    update_feature_dict.
+
+    """
+
+    def __init__(self, tick_buffer, timeframe, feature_configs, tick_time_diff_clip_val):
+        """Init.
+
+        Args:
+            tick_buffer (TickRingBuffer):
+                ticks of the symbol
+            timeframe (str):
+                feature timeframe in polars format, i.e. 30s or 5m
+            feature_configs (list[pydantic.BaseModel]):
+                configs of the features of the symbol that use running state
+            tick_time_diff_clip_val (float):
+                see clean_raw_tick_data
+
+        """
+        self.tick_buffer = tick_buffer
+        self.timeframe = pd.Timedelta(timeframe.replace("m", "T")).value
+        self.clip_val = tick_time_diff_clip_val
+
+        self.sum_inputs = {
+            fc.inputs[0] for fc in feature_configs if fc.name in INCREMENTAL_FEATURES
+        }
+        self.sum_inputs.discard("flags")
+        self.min_inputs = {fc.inputs[0] for fc in feature_configs if fc.name == "min"}
+        self.max_inputs = {fc.inputs[0] for fc in feature_configs if fc.name == "max"}
+        self.grad_inputs = {fc.inputs[0] for fc in feature_configs if fc.name == "grad"}
+        self.count_flags = any(fc.name == "one_hot" for fc in feature_configs)
+
+        self.t0 = None
+        self.t1 = None
+
+    def reset(self, trade_time):
+        """Calculate the running state from the ticks of the window.
+
+        Args:
+            trade_time (int):
+                time of the last tick of the window in ns from epoch
+
+        """
+        self.n = 0
+        self.sums = {col: 0.0 for col in self.sum_inputs}
+        self.mins = {col: deque() for col in self.min_inputs}
+        self.maxs = {col: deque() for col in self.max_inputs}
+        self.flag_counts = np.zeros(len(FX_FLAGS), dtype=np.int64)
+        self.anchor = None
+        self.grad_sums = {col: np.zeros(4) for col in self.grad_inputs}
+
+        self.t0 = trade_time - self.timeframe
+        self.t1 = trade_time
+        i0 = self.index(self.t0)
+        i1 = self.index(self.t1, side="right")
+        self.add(i0, i1)
+
+    def index(self, t, side="left"):
+        """Index of a time in the tick buffer, see TickRingBuffer.index."""
+        return int(np.searchsorted(self.tick_buffer.view("time_msc"), t, side=side))
+
+    def get_tick_values(self, i0, i1):
+        """Get tick values.
+
+        Args:
+            i0 (int):
+                first tick in the tick buffer
+            i1 (int):
+                end tick (exclusive) in the tick buffer
+
+        Returns:
+            t (np.array)
+                tick times in ns
+            values (dict[str, np.array])
+                tick values as in load_raw_tick_data(..., dt='inference')
+
+        """
+        tb = self.tick_buffer
+        t = tb.view("time_msc", i0, i1)
+        bid = tb.view("bid", i0, i1)
+        ask = tb.view("ask", i0, i1)
+        t_prev = tb.view("time_msc", i0 - 1, i0)[0] if i0 > 0 else t[0]
+        values = {
+            "bid": bid.astype(np.float32),
+            "ask": ask.astype(np.float32),
+            "avg_price": ((bid + ask) / 2).astype(np.float32),
+            "spread": (ask - bid).astype(np.float32),
+            "time_diff": np.clip(np.diff(t, prepend=t_prev) / 1e9, 0, self.clip_val)
+            .astype(np.float32),
+            "flags": tb.view("flags", i0, i1) % 128,
+        }
+        return t, values
+
+    def add(self, i0, i1):
+        """Add the ticks that enter the window.
+
+        Args:
+            i0 (int):
+                first tick in the tick buffer
+            i1 (int):
+                end tick (exclusive) in the tick buffer
+
+        """
+        if i1 <= i0:
+            return
+        t, values = self.get_tick_values(i0, i1)
+        self.n += i1 - i0
+        for col in self.sum_inputs:
+            self.sums[col] += values[col].sum(dtype=np.float64)
+        for col in self.min_inputs:
+            push_monotonic(self.mins[col], t, values[col], np.greater_equal)
+        for col in self.max_inputs:
+            push_monotonic(self.maxs[col], t, values[col], np.less_equal)
+        if self.count_flags:
+            self.flag_counts += [np.count_nonzero(values["flags"] == f) for f in FX_FLAGS]
+        if self.grad_inputs and (self.anchor is None):
+            self.anchor = (int(t[0]), {c: float(values[c][0]) for c in self.grad_inputs})
+        for col in self.grad_inputs:
+            self.grad_sums[col] += self.get_grad_sums(t, values[col], col)
+
+    def remove(self, i0, i1):
+        """Remove the ticks that leave the window, see add."""
+        if i1 <= i0:
+            return
+        t, values = self.get_tick_values(i0, i1)
+        self.n -= i1 - i0
+        for col in self.sum_inputs:
+            self.sums[col] -= values[col].sum(dtype=np.float64)
+        for col in self.min_inputs:
+            pop_before(self.mins[col], self.t0)
+        for col in self.max_inputs:
+            pop_before(self.maxs[col], self.t0)
+        if self.count_flags:
+            self.flag_counts -= [np.count_nonzero(values["flags"] == f) for f in FX_FLAGS]
+        for col in self.grad_inputs:
+            self.grad_sums[col] -= self.get_grad_sums(t, values[col], col)
+
+    def get_grad_sums(self, t, y, col):
+        """Get grad sums.
+
+        Args:
+            t (np.array):
+                tick times in ns
+            y (np.array):
+                tick values
+            col (str):
+                name of the tick value column
+
+        Returns:
+            np.array
+                sum x, sum y, sum x^2 and sum xy, where x is in minutes and x and y
+                are relative to the anchor tick
+
+        """
+        t_a, y_a = self.anchor
+        x = (t - t_a) * 1e-9 / 60
+        y = y.astype(np.float64) - y_a[col]
+        return np.array([x.sum(), y.sum(), (x * x).sum(), (x * y).sum()])
+
+    def update(self, trade_time, resync=False):
+        """Move the window to end at trade_time.
+
+        Args:
+            trade_time (int):
+                time of the last tick of the window in ns from epoch
+            resync (bool):
+                if True, recalculate the running state from the ticks of the window
+
+        """
+        t0 = trade_time - self.timeframe
+        tb = self.tick_buffer
+        if (
+            resync
+            or (self.t1 is None)
+            or (t0 >= self.t1)
+            or (trade_time < self.t1)
+            or (len(tb) == 0)
+            or (tb.view("time_msc", 0, 1)[0] > self.t0)
+            # late ticks in the previous window are not in the running state
+            or (self.index(self.t1, side="right") - self.index(self.t0) != self.n)
+        ):
+            self.reset(trade_time)
+            return
+
+        i0 = self.index(self.t0)
+        i1 = self.index(t0)
+        prev_t1 = self.t1
+        self.t0 = t0
+        self.t1 = trade_time
+        self.remove(i0, i1)
+        self.add(self.index(prev_t1, side="right"), self.index(trade_time, side="right"))
+
+    def get_feature(self, fc, pip):
+        """Get feature.
+
+        Args:
+            fc (pydantic.BaseModel):
+                feature config, fc.name in INCREMENTAL_FEATURES
+            pip (float):
+                i.e. 1e-4
+
+        Returns:
+            np.array
+                values of the feature row, nan if the feature is missing
+
+        """
+        col = fc.inputs[0]
+        if fc.name == "one_hot":
+            counts = self.flag_counts
+            total = counts.sum()
+            if self.n == 0:
+                return np.full(len(FX_FLAGS), np.nan)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.array([counts[0] / total, counts[1] / total, total])
+        if self.n == 0:
+            return np.array([np.nan])
+        mean = np.float32(self.sums.get(col, 0.0) / self.n)
+        if fc.name in ["mean", "differencing"]:
+            return np.array([mean])
+        elif fc.name == "min":
+            return np.array([mean - np.float32(self.mins[col][0][1])])
+        elif fc.name == "max":
+            return np.array([np.float32(self.maxs[col][0][1]) - mean])
+        elif fc.name == "grad":
+            return np.array([self.get_grad(col, pip, fc.kwargs["min_num"])])
+        raise ValueError(f"{fc.name} is not an incremental feature")
+
+    def get_grad(self, col, pip, min_num):
+        """Gradient of the window, same as calc_rolling_grad.
+
+        Args:
+            col (str):
+                name of the tick value column
+            pip (float):
+                i.e. 1e-4
+            min_num (int):
+                minimum number of ticks to return a gradient
+
+        Returns:
+            float
+                gradient in degrees
+
+        """
+        n = self.n
+        if n <= 10:
+            return np.nan
+        i0 = self.index(self.t0)
+        i1 = self.index(self.t1, side="right")
+        t = self.tick_buffer.view("time_msc", i0, i1)
+        if (n < min_num) or (t[-1] == t[0]):
+            return 0.0
+        sx, sy, sxx, sxy = self.grad_sums[col]
+        var = sxx - sx * sx / n
+        cov = sxy - sx * sy / n
+        if var <= 0:
+            return 0.0
+        return math.atan(cov / var / pip) * 180 / math.pi
+
+
+def push_monotonic(q, t, y, is_dominated):
+    """Push ticks to a monotonic deque.
+
+    Args:
+        q (deque):
+            (time, value) of the ticks that can still be the min or max of the window,
+            the first is the min or max
+        t (np.array):
+            tick times in ns
+        y (np.array):
+            tick values
+        is_dominated (np.ufunc):
+            np.greater_equal for a min deque, np.less_equal for a max deque
+
+    """
+    # only the ticks that are the min or max of the ticks after them can be the min or
+    # max of a later window
+    if is_dominated is np.greater_equal:
+        suffix = np.minimum.accumulate(y[::-1])[::-1]
+    else:
+        suffix = np.maximum.accumulate(y[::-1])[::-1]
+    keep = np.flatnonzero(y == suffix)
+    first = y[keep[0]]
+    while q and is_dominated(q[-1][1], first):
+        q.pop()
+    q.extend(zip(t[keep].tolist(), y[keep].tolist()))
+
+
+def pop_before(q, t0):
+    """Pop the ticks before t0 from a monotonic deque.
+
+    Args:
+        q (deque):
+            see push_monotonic
+        t0 (int):
+            time of the start of the window in ns
+
+    """
+    while q and q[0][0] < t0:
+        q.popleft()
+
+
+class IncrementalFeatureEngine:
+    """Incremental feature engine.
+
+    Same output as update_feature_dict, from TickRingBuffer tick data.
+
+    """
+
+    def __init__(self, config, tick_data, feature_data, resync_steps=360):
+        """Init.
+
+        Args:
+            config (pydantic.BaseModel):
+                output of config builder
+            tick_data (dict[TickRingBuffer]):
+                key is the symbol, value is the tick data. The buffers are read at each
+                update, so new ticks are appended to the same buffers
+            feature_data (dict[pl.DataFrame]):
+                output of init_feature_dict
+            resync_steps (int):
+                number of updates between recalculations of the running state
+
+        """
+        self.config = config
+        self.tick_data = tick_data
+        self.resync_steps = resync_steps
+        self.num_steps = 0
+
+        self.rows = {}
+        self.windows = {}
+        for feat_group_ind, feat_group in enumerate(config.features):
+            self.rows[feat_group_ind] = {}
+            symbol_configs = {}
+            for feat_ind, fc in enumerate(feat_group.simple_features):
+                if fc.fillna not in FILL_STRATEGIES:
+                    raise ValueError(
+                        f"fillna {fc.fillna} is not supported, use update_feature_dict",
+                    )
+                self.rows[feat_group_ind][feat_ind] = FeatureRows(
+                    feature_data[feat_group_ind][feat_ind],
+                )
+                symbol_configs.setdefault(fc.symbol, [])
+                if fc.name in INCREMENTAL_FEATURES:
+                    symbol_configs[fc.symbol].append(fc)
+            for symbol, fcs in symbol_configs.items():
+                self.windows[(feat_group_ind, symbol)] = TickWindow(
+                    tick_data[symbol],
+                    feat_group.timeframe,
+                    fcs,
+                    config.raw_data.tick_time_diff_clip_val,
+                )
+
+    @property
+    def feature_data(self):
+        """Feature data.
+
+        Returns:
+            dict[pl.DataFrame]
+                key1 = feat_group_ind, key2 = feat_ind, same as init_feature_dict
+
+        """
+        return {
+            g: {f: rows.to_frame() for f, rows in feat_rows.items()}
+            for g, feat_rows in self.rows.items()
+        }
+
+    def get_window_features(self, feat_group_ind, symbol, trade_time):
+        """Calculate the features that do not use running state.
+
+        Args:
+            feat_group_ind (int):
+                index of the feature group
+            symbol (str):
+                trading instrument, i.e. EURUSD
+            trade_time (pd.Timestamp):
+                trade time
+
+        Returns:
+            dict[int, np.array]
+                values of the row by feat_ind
+
+        """
+        config = self.config
+        feat_group = config.features[feat_group_ind]
+        feat_inds = [
+            i
+            for i, fc in enumerate(feat_group.simple_features)
+            if (fc.symbol == symbol) and (fc.name not in INCREMENTAL_FEATURES)
+        ]
+        if len(feat_inds) == 0:
+            return {}
+
+        tick_buffer = self.tick_data[symbol]
+        dt0 = trade_time - pd.Timedelta(feat_group.timeframe.replace("m", "T"))
+        broker = feat_group.simple_features[feat_inds[0]].broker
+        df = tick_buffer.to_frame(t1=trade_time, i0=tick_buffer.index(dt0) - 1)
+        tick_df = load_raw_tick_data(config, broker, symbol, "inference", df=df)[1:]
+
+        out = {}
+        for feat_ind in feat_inds:
+            num_cols = len(self.rows[feat_group_ind][feat_ind].cols)
+            if len(tick_df) == 0:
+                out[feat_ind] = np.full(num_cols, np.nan)
+                continue
+            df_group = group_tick_data_by_time(
+                config,
+                feat_group_ind,
+                tick_df,
+                mode="inference",
+            )
+            df = make_feature(
+                df_group,
+                config,
+                feat_group_ind,
+                feat_ind,
+                fname="inference",
+                mode="inference",
+                tick_df=tick_df,
+            )
+            cols = self.rows[feat_group_ind][feat_ind].cols
+            out[feat_ind] = (
+                df[cols][-1].cast(pl.Float64).fill_null(np.nan).to_numpy().ravel()
+            )
+        return out
+
+    def update(self, trade_time):
+        """Append the row of trade_time to each feature.
+
+        Args:
+            trade_time (pd.Timestamp):
+                trade time that is a multiple of the trade_timeframe
+
+        """
+        t1 = to_ns(trade_time)
+        resync = self.num_steps % self.resync_steps == 0
+        self.num_steps += 1
+
+        for feat_group_ind, feat_group in enumerate(self.config.features):
+            symbols = {fc.symbol for fc in feat_group.simple_features}
+            for symbol in symbols:
+                window = self.windows.get((feat_group_ind, symbol))
+                if window is not None:
+                    window.update(t1, resync=resync)
+
+            rows = {}
+            for symbol in symbols:
+                rows.update(self.get_window_features(feat_group_ind, symbol, trade_time))
+
+            for feat_ind, fc in enumerate(feat_group.simple_features):
+                feat_rows = self.rows[feat_group_ind][feat_ind]
+                if t1 <= feat_rows.last_time():
+                    continue
+                row = rows.get(feat_ind)
+                if row is None:
+                    pip = self.config.symbol_info[
+                        self.config.symbol_info_index[fc.symbol]
+                    ].pip
+                    row = self.windows[(feat_group_ind, fc.symbol)].get_feature(fc, pip)
+                # same as the fill_nan(None).fill_null(strategy=fc.fillna) of
+                # update_feature_dict
+                is_nan = np.isnan(row)
+                if is_nan.any():
+                    fill = feat_rows.last_row() if fc.fillna == "forward" else 0.0
+                    row = np.where(is_nan, fill, row)
+                feat_rows.append(t1, row)
+
+    def last_time(self):
+        """Time of the last row.
+
+        Returns:
+            pd.Timestamp
+
+        """
+        return pd.Timestamp(self.rows[0][0].last_time())
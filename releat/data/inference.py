@@ -16,8 +16,8 @@ import polars as pl
 from releat.data.cleaning import group_tick_data_by_time
 from releat.data.cleaning import load_raw_tick_data
 from releat.data.pipeline import make_feature
-from releat.data.transformers import apply_transform
-from releat.data.transformers import enrich_transform_config
+from releat.data.tick_buffer import TickRingBuffer
+from releat.data.transformers import apply_transforms
 from releat.data.utils import split_timeframe
 from releat.utils.time import ceil_timestamp
 
@@ -79,7 +79,7 @@ def init_feature_dict(config, tick_data, now):
     Args:
         config (pydantic):
             output of config builder
-        tick_data (dict[polars.Datafrae]):
+        tick_data (dict[pd.DataFrame | TickRingBuffer]):
             key is the symbol, value is the tick data
         now (pd.Timestamp):
             inference time as pandas timestamp
@@ -128,12 +128,17 @@ def init_feature_dict(config, tick_data, now):
                 df = tick_data[symbol]
 
                 # Get the last timestamp of the previous feature timeframe
-                dt0 = df[df["time_msc"] < dt0]["time_msc"].iloc[-1] - pd.Timedelta(
-                    feat_time,
-                )
-                dt0 = df[df["time_msc"] < dt0]["time_msc"].iloc[-1]
+                if isinstance(df, TickRingBuffer):
+                    dt0 = df.last_time_before(dt0) - pd.Timedelta(feat_time)
+                    dt0 = df.last_time_before(dt0)
+                    df = df.to_frame(dt0, trade_time)
+                else:
+                    dt0 = df[df["time_msc"] < dt0]["time_msc"].iloc[-1] - pd.Timedelta(
+                        feat_time,
+                    )
+                    dt0 = df[df["time_msc"] < dt0]["time_msc"].iloc[-1]
 
-                df = df[(df["time_msc"] >= dt0) & (df["time_msc"] <= trade_time)]
+                    df = df[(df["time_msc"] >= dt0) & (df["time_msc"] <= trade_time)]
 
                 tick_df = load_raw_tick_data(config, broker, symbol, dt, df=df)
                 tick_df = tick_df[1:]
@@ -154,6 +159,7 @@ def init_feature_dict(config, tick_data, now):
                 feat_ind,
                 fname=dt,
                 mode="inference",
+                tick_df=tick_df,
             )
 
             df = df.filter(pl.col("time_msc") <= trade_time)
@@ -195,7 +201,7 @@ def update_feature_dict(config, tick_data, feature_data, trade_time):
     Args:
         config (pydantic):
             output from config builder
-        tick_data (dict[polars.Dataframe])
+        tick_data (dict[pd.DataFrame | TickRingBuffer])
             tick data
         feature_data (dict[polars.DataFrame])
             feature data
@@ -223,10 +229,14 @@ def update_feature_dict(config, tick_data, feature_data, trade_time):
                 df = tick_data[symbol]
 
                 dt0 = trade_time - pd.Timedelta(feat_group.timeframe.replace("m", "T"))
-                dt0 = df[df["time_msc"] < dt0]["time_msc"].index[-1]
+                if isinstance(df, TickRingBuffer):
+                    # from the last tick before dt0
+                    df = df.to_frame(t1=trade_time, i0=df.index(dt0) - 1)
+                else:
+                    dt0 = df[df["time_msc"] < dt0]["time_msc"].index[-1]
 
-                df = df[dt0:]
-                df = df[df["time_msc"] <= trade_time]
+                    df = df[dt0:]
+                    df = df[df["time_msc"] <= trade_time]
 
                 tick_df = load_raw_tick_data(config, broker, symbol, dt, df=df)
                 tick_df = tick_df[1:]
@@ -248,6 +258,7 @@ def update_feature_dict(config, tick_data, feature_data, trade_time):
                     feat_ind,
                     fname=dt,
                     mode="inference",
+                    tick_df=tick_df,
                 )
                 df = df.with_columns(
                     pl.lit(trade_time).dt.cast_time_unit("ns").alias("time_msc"),
@@ -318,23 +329,13 @@ def make_feature_obs(config, feature_data):
                 symbol_index = config.symbol_info_index[symbol]
                 pip = config.symbol_info[symbol_index].pip
                 feats = feats[:-1] / pip
+                # one transform parameter per row, see make_obs_transform_chains
+                feats = apply_transforms(feats.reshape((1, -1)), fc.transforms)
                 feats = feats.reshape((-1, 1))
-                for tc in fc.transforms:
-                    # tc = TransformerConfig(**tc)
-                    feats = apply_transform(feats, tc)
             else:
+                # transform parameters are loaded once by load_config
                 feats = feats[1:].astype("float32")
-                for t_ind in range(len(fc.transforms)):
-                    fc = enrich_transform_config(
-                        config,
-                        feat_group_ind,
-                        feat_ind,
-                        t_ind,
-                        feat_shape=feats.shape,
-                    )
-
-                for tc in fc.transforms:
-                    feats = apply_transform(feats, tc)
+                feats = apply_transforms(feats, fc.transforms)
 
             feat_group_obs.append(feats)
         feat_group_obs = np.hstack(feat_group_obs)
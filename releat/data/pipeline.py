@@ -10,20 +10,32 @@ from __future__ import annotations
 
 import json
 import os
+import shutil
+import sys
+from functools import partial
 from glob import glob
+from time import time
 
 import aerospike
 import numpy as np
 import pandas as pd
 import polars as pl
+from numpy.lib.format import open_memmap
 from tqdm import tqdm
 
+from releat.connectors.aerospike import batch_put_records
+from releat.connectors.aerospike import batch_select_records
 from releat.connectors.aerospike import get_records_in_aerospike
 from releat.connectors.aerospike import search_aerospike_for_dt
+from releat.data.cache import add_to_cache
+from releat.data.cache import get_cache_file
+from releat.data.cache import restore_from_cache
+from releat.data.cleaning import TickCache
 from releat.data.cleaning import fill_trade_interval
+from releat.data.cleaning import get_tick_file
 from releat.data.cleaning import get_trade_price
-from releat.data.cleaning import group_tick_data_by_time
-from releat.data.cleaning import load_raw_tick_data
+from releat.data.cleaning import prepare_tick_data
+from releat.data.scheduler import run_tasks
 from releat.data.simple.stats import calc_gradient_feature
 from releat.data.simple.stats import calc_inflection_feature
 from releat.data.simple.stats import calc_peak_trough_gradient_feature
@@ -32,17 +44,27 @@ from releat.data.simple.stats import get_mean
 from releat.data.simple.stats import get_min
 from releat.data.simple.stats import get_skew
 from releat.data.simple.stats import one_hot_fx_flag
-from releat.data.transformers import apply_transform
+from releat.data.transformers import apply_transforms
 from releat.data.transformers import enrich_transform_config
 from releat.data.transformers import get_transform_params_for_all_features
 from releat.data.utils import get_feature_dir
+from releat.data.utils import get_raw_feature_file
+from releat.gym_env.data_backend import get_obs_store_dir
 from releat.utils.configs.constants import trading_instruments
 from releat.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
 
-def make_feature(df_group, config, feat_group_ind, feat_ind, fname=None, mode="build"):
+def make_feature(
+    df_group,
+    config,
+    feat_group_ind,
+    feat_ind,
+    fname=None,
+    mode="build",
+    tick_df=None,
+):
     """Make a feature.
 
     Makes one simple feature for a series of tick data groups. These groups are
@@ -70,7 +92,10 @@ def make_feature(df_group, config, feat_group_ind, feat_ind, fname=None, mode="b
             uploaded to db, enabling faster rebuilds. Not necessary for inference
         mode (str):
             either 'inference' or some other string value
-
+        tick_df (pl.DataFrame | None):
+            tick data that was grouped into df_group, required by features that are
+            calculated over the tick arrays, i.e. skew, grad, grad_with_peak_trends
+            and inflection
 
     """
     feat_group = config.features[feat_group_ind]
@@ -79,14 +104,6 @@ def make_feature(df_group, config, feat_group_ind, feat_ind, fname=None, mode="b
     trade_timeframe = config.raw_data.trade_timeframe
     pip = config.symbol_info[config.symbol_info_index[fc.symbol]].pip
 
-    save_dir = get_feature_dir(config, feat_group_ind, feat_ind)
-    save_dir = f"{save_dir}/raw_data"
-    os.makedirs(save_dir, exist_ok=True)
-
-    save_f = f"{save_dir}/{fname}.parquet"
-    # if os.path.exists(save_f):
-    #     return
-
     match fc.name:
         case "differencing":
             df = get_mean(df_group, fc)
@@ -99,13 +116,25 @@ def make_feature(df_group, config, feat_group_ind, feat_ind, fname=None, mode="b
         case "max":
             df = get_max(df_group, fc)
         case "skew":
-            df = get_skew(df_group, fc, pip)
+            df = get_skew(df_group, fc, tick_df)
         case "grad":
-            df = calc_gradient_feature(df_group, fc, pip)
+            df = calc_gradient_feature(df_group, fc, pip, tick_df)
         case "grad_with_peak_trends":
-            df = calc_peak_trough_gradient_feature(df_group, fc, pip)
+            df = calc_peak_trough_gradient_feature(
+                df_group,
+                fc,
+                pip,
+                tick_df,
+                config.feature_build,
+            )
         case "inflection":
-            df = calc_inflection_feature(df_group, fc, pip)
+            df = calc_inflection_feature(
+                df_group,
+                fc,
+                pip,
+                tick_df,
+                config.feature_build,
+            )
 
     df = df.with_columns(pl.col("time_msc").dt.cast_time_unit("ns"))
 
@@ -118,12 +147,10 @@ def make_feature(df_group, config, feat_group_ind, feat_ind, fname=None, mode="b
         return df
     else:
         # save as raw data
-        save_dir = get_feature_dir(config, feat_group_ind, feat_ind)
-        save_dir = f"{save_dir}/raw_data"
+        save_f = get_raw_feature_file(config, feat_group_ind, feat_ind, fname)
+        save_dir = os.path.dirname(save_f)
         os.makedirs(save_dir, exist_ok=True)
 
-        save_f = f"{save_dir}/{fname}.parquet"
-
         df = df.filter(
             pl.col("time_msc")
             <= pl.col("time_msc").max().dt.offset_by("-" + feature_timeframe),
@@ -131,63 +158,147 @@ def make_feature(df_group, config, feat_group_ind, feat_ind, fname=None, mode="b
             pl.col("time_msc")
             >= pl.col("time_msc").min().dt.offset_by(feature_timeframe),
         )
-        df.write_parquet(save_f, use_pyarrow=True)
+        # replace rather than overwrite, the file may be hard linked to the cache
+        tmp_f = f"{save_dir}/.{fname}.parquet.tmp"
+        df.write_parquet(tmp_f, use_pyarrow=True)
+        os.replace(tmp_f, save_f)
 
         return df
 
 
-def build_features_by_dt(config, dts):
-    """Build features by dt.
+def build_symbol_features(config, dt, broker, symbol, feat_inds, tick_cache=None):
+    """Build symbol features.
+
+    Builds the features of one symbol for one month. The tick data is loaded once
+    and grouped once for each feature timeframe.
+
+    Args:
+        config (pydantic.BaseModel):
+            defined in 'agent_config.py'
+        dt (str):
+            date in the format (%Y-%m-01')
+        broker (str):
+            broker name
+        symbol (str):
+            symbol name
+        feat_inds (list[tuple]):
+            feat_group_ind and feat_ind of each feature of the symbol
+        tick_cache (TickCache | None):
+            tick data cache shared with other tasks in the same process
+
+    Returns:
+        dict
+            number of ticks and features built, for reporting throughput
+
+    """
+    if tick_cache is None:
+        tick_cache = TickCache(config)
+    tick_df = tick_cache.get(broker, symbol, dt)
+
+    for feat_group_ind, feat_ind in feat_inds:
+        fc = config.features[feat_group_ind].simple_features[feat_ind]
+        lazy = fc.name in ["grad", "fft"]
+        df_group = tick_cache.get_group(feat_group_ind, broker, symbol, dt, lazy=lazy)
+
+        logger.info(f"{dt} - making feature {feat_group_ind}-{feat_ind}")
+
+        _ = make_feature(
+            df_group,
+            config,
+            feat_group_ind,
+            feat_ind,
+            fname=dt,
+            mode="build",
+            tick_df=tick_df,
+        )
 
-    #TODO improve parallelisation?
+        if config.feature_build.use_cache:
+            _ = add_to_cache(
+                get_raw_feature_file(config, feat_group_ind, feat_ind, dt),
+                get_cache_file(config, feat_group_ind, feat_ind, dt),
+            )
+
+    return {"ticks": len(tick_df), "features": len(feat_inds)}
+
+
+def build_features_by_dt(config, dts, tick_cache=None):
+    """Build features by dt.
 
     When the dataset is initially being built, features are built month by month to
-    conserve RAM
+    conserve RAM. Each month and symbol is a task, tasks are run on
+    feature_build.num_workers processes as long as their estimated memory is within
+    feature_build.max_memory_gb, see releat.data.scheduler.run_tasks. Features that
+    are unchanged since a previous build are restored from the cache, see
+    releat.data.cache
 
     Args:
         config (pydantic.BaseModel):
             defined in 'agent_config.py'
         dts (List(str)):
             list of dates in the format (%Y-%m-01')
+        tick_cache (TickCache | None):
+            tick data cache, only used if features are built in this process
 
     Returns:
         None
 
     """
-    for dt in tqdm(list(sorted(dts))):
+    feature_build = config.feature_build
+
+    tasks = {}
+    for dt in list(sorted(dts)):
         for feat_group_ind in range(len(config.features)):
             feat_group = config.features[feat_group_ind]
-            prev_symbol = ""
             for feat_ind in range(len(feat_group.simple_features)):
                 fc = feat_group.simple_features[feat_ind]
-                symbol = fc.symbol
-                broker = fc.broker
-                if symbol != prev_symbol:
-                    tick_df = load_raw_tick_data(config, broker, symbol, dt)
-                    if fc.name in ["grad", "fft"]:
-                        df_group = group_tick_data_by_time(
-                            config,
-                            feat_group_ind,
-                            tick_df,
-                            lazy=True,
-                        )
-                    else:
-                        df_group = group_tick_data_by_time(
-                            config,
-                            feat_group_ind,
-                            tick_df,
-                        )
-
-                logger.info(f"{dt} - making feature {feat_group_ind}-{feat_ind}")
-
-                _ = make_feature(
-                    df_group,
-                    config,
-                    feat_group_ind,
-                    feat_ind,
-                    fname=dt,
-                    mode="build",
-                )
+                k = (dt, fc.broker, fc.symbol)
+                tasks[k] = tasks.get(k, []) + [(feat_group_ind, feat_ind)]
+
+    # download and ingest missing tick files before starting the workers, so that 2
+    # workers do not write the same file
+    for dt, broker, symbol in tasks:
+        _ = prepare_tick_data(config, broker, symbol, dt)
+
+    # only build the features that are not in the cache
+    if feature_build.use_cache:
+        num_cached = 0
+        for (dt, broker, symbol), feat_inds in tasks.items():
+            tasks[(dt, broker, symbol)] = []
+            for feat_group_ind, feat_ind in feat_inds:
+                if restore_from_cache(
+                    get_cache_file(config, feat_group_ind, feat_ind, dt),
+                    get_raw_feature_file(config, feat_group_ind, feat_ind, dt),
+                ):
+                    num_cached += 1
+                else:
+                    tasks[(dt, broker, symbol)].append((feat_group_ind, feat_ind))
+        tasks = {k: v for k, v in tasks.items() if len(v) > 0}
+        logger.info(f"{num_cached} features restored from cache")
+
+    task_memory = [
+        os.path.getsize(get_tick_file(config, broker, symbol, dt))
+        * feature_build.memory_factor
+        for dt, broker, symbol in tasks
+    ]
+    max_memory = None
+    if feature_build.max_memory_gb is not None:
+        max_memory = feature_build.max_memory_gb * 1024**3
+
+    if feature_build.num_workers != 1:
+        # features are built within the worker rather than starting their own pools
+        config = config.copy(deep=True)
+        config.feature_build = config.feature_build.copy(
+            update={"pool_threshold": sys.maxsize},
+        )
+        tick_cache = None
+
+    _ = run_tasks(
+        partial(build_symbol_features, config, tick_cache=tick_cache),
+        [(*k, v) for k, v in tasks.items()],
+        task_memory,
+        feature_build.num_workers,
+        max_memory,
+    )
 
 
 def upload_trade_data(config, client, dt, start_val=None):
@@ -196,7 +307,9 @@ def upload_trade_data(config, client, dt, start_val=None):
     # TODO make it work better for multi symbol
     # TODO decouple from aerospike
 
-    Upload trade data from local file to database.
+    Upload trade data from local file to database. Records are written in chunks of
+    config.aerospike.batch_size, so that one month of data takes a few hundred round
+    trips rather than one per record.
 
     Args:
         config (pydantic.BaseModel):
@@ -226,46 +339,55 @@ def upload_trade_data(config, client, dt, start_val=None):
         else:
             dfs = dfs.join(df, on="time_msc", how="inner")
 
-    df = dfs.to_numpy()
-    dt = pd.to_datetime(df[0, 0][:19])
-    dt = int(dt.timestamp())
-    ind_offset = search_aerospike_for_dt(config, client, dt, start_val)
-
-    # cols = [x for x in df.columns if x != 'time_msc']
-    for i in tqdm(range(len(df))):
-        key = (
-            config.aerospike.namespace,
-            config.aerospike.set_name,
-            int(i + ind_offset),
-        )
-
-        dt = df[i, 0][:19]
-        date_arr = [
-            np.round(float(dt[11:13]) / 23, decimals=6),
-            np.round(float(dt[14:16]) / 59, decimals=6),
-            np.round(float(dt[17:19]) / 59, decimals=6),
+    # dates are truncated to the second, i.e. '%Y-%m-%d %H:%M:%S'
+    dates = dfs.select(
+        pl.col("time_msc")
+        .str.slice(0, 19)
+        .str.strptime(pl.Datetime("us"), "%Y-%m-%d %H:%M:%S")
+        .alias("date"),
+    )["date"]
+    date_arr = np.round(
+        np.stack(
+            [
+                dates.dt.hour().to_numpy() / 23,
+                dates.dt.minute().to_numpy() / 59,
+                dates.dt.second().to_numpy() / 59,
+            ],
+            axis=1,
+        ),
+        decimals=6,
+    ).tolist()
+    prices = dfs.drop("time_msc").to_numpy().astype(float)
+    prices = np.round(prices, decimals=6).tolist()
+    dates = dates.dt.epoch("s").to_list()
+
+    ind_offset = search_aerospike_for_dt(config, client, dates[0], start_val)
+
+    t0 = time()
+    batch_size = config.aerospike.batch_size
+    for i0 in tqdm(range(0, len(dates), batch_size)):
+        i1 = min(i0 + batch_size, len(dates))
+        records = [
+            {
+                "date": dates[i],
+                "trade_price": prices[i],
+                "date_arr": date_arr[i],
+            }
+            for i in range(i0, i1)
         ]
+        batch_put_records(
+            config,
+            client,
+            range(i0 + ind_offset, i1 + ind_offset),
+            records,
+        )
 
-        dt = pd.to_datetime(dt)
-        dt = int(dt.timestamp())
-        # try:
-        #     client.remove(key)
-        # except:
-        #     pass
-
-        data = df[i, 1:]
-        data = np.round(data.astype(float), decimals=6).tolist()
-
-        bins = {
-            "date": dt,
-            "trade_price": data,
-            "date_arr": date_arr,
-        }
-        client.put(key, bins)
-
-    dt0 = df[0, 0][:19]
-    dt1 = df[-1, 0][:19]
-    logger.info(f"trade data updated for {dt0} - {dt1}")
+    dt0 = dfs["time_msc"][0][:19]
+    dt1 = dfs["time_msc"][-1][:19]
+    rate = len(dates) / max(time() - t0, 1e-6)
+    logger.info(
+        f"trade data updated for {dt0} - {dt1} | {len(dates)} rows at {rate:.0f} rows/s",
+    )
 
 
 def upload_feature_group(config, client, feat_group_ind, dt, start_val):
@@ -276,6 +398,10 @@ def upload_feature_group(config, client, feat_group_ind, dt, start_val):
     different feature groups that are of 10m timeframes because the key that is
     used for each record is the timeframe
 
+    Records are read and written in chunks of config.aerospike.batch_size. The dates
+    of each chunk are checked against the records that already exist in the database
+    (created by upload_trade_data) before any of the chunk is written.
+
     #TODO decouple from aerospike
 
     Args:
@@ -305,17 +431,10 @@ def upload_feature_group(config, client, feat_group_ind, dt, start_val):
 
         if fc.name != "differencing":
             for t_ind in range(len(fc.transforms)):
-                fc = enrich_transform_config(
-                    config,
-                    feat_group_ind,
-                    feat_ind,
-                    t_ind,
-                    feat_shape=df.shape,
-                )
+                fc = enrich_transform_config(config, feat_group_ind, feat_ind, t_ind)
 
             feats = df.values.astype("float32")
-            for tc in fc.transforms:
-                feats = apply_transform(feats, tc)
+            feats = apply_transforms(feats, fc.transforms, parallel=True)
             df = pd.DataFrame(feats, index=df.index, columns=df.columns)
 
         if dfs is None:
@@ -335,40 +454,54 @@ def upload_feature_group(config, client, feat_group_ind, dt, start_val):
     (_, _, old_bins) = client.get(key)
     df = df[df.index > pd.to_datetime(old_bins["date"], unit="s")]
 
-    # dt = df.index[0].strftime("%Y-%m-%d %H:%M:%S")
-    # dt = datetime.datetime.strptime(dt,'%Y-%m-%d %H:%M:%S')
-    dt = int(df.index[0].timestamp())
-    ind_offset = search_aerospike_for_dt(config, client, dt, start_val)
-
-    for i in tqdm(range(len(df))):
-        # dt = df.index[i].strftime("%Y-%m-%d %H:%M:%S")
-        dt = int(df.index[i].timestamp())
-        arr = np.round(df.iloc[i].values.astype(float), decimals=6).tolist()
-
-        key = (
-            config.aerospike.namespace,
-            config.aerospike.set_name,
-            int(i + ind_offset),
+    dates = df.index.values.astype("datetime64[s]").astype("int64")
+    feats = np.round(df.values.astype(float), decimals=6).tolist()
+    ind_offset = search_aerospike_for_dt(config, client, int(dates[0]), start_val)
+
+    t0 = time()
+    num_recs = 0
+    batch_size = config.aerospike.batch_size
+    for i0 in tqdm(range(0, len(df), batch_size)):
+        i1 = min(i0 + batch_size, len(df))
+        inds = list(range(i0 + ind_offset, i1 + ind_offset))
+        old_records = batch_select_records(config, client, inds, ["date"])
+
+        # check that the dates of the whole chunk line up with the existing records
+        old_dates = np.array(
+            [
+                -1 if (x is None) or ("date" not in x) else x["date"]
+                for x in old_records
+            ],
+            dtype="int64",
         )
-
-        bins = {
-            "date": dt,
-            str(feat_group_ind): arr,
-        }
-
-        _, meta = client.exists(key)
-        if meta is not None:
-            (_, _, old_bins) = client.get(key)
-
-            if "date" in old_bins:
-                assert old_bins["date"] == dt, (
-                    f"current date {old_bins['date']} ",
+        misaligned = np.where((old_dates != -1) & (old_dates != dates[i0:i1]))[0]
+        if len(misaligned) > 0:
+            i = misaligned[0]
+            raise AssertionError(
+                (
+                    f"current date {old_dates[i]} ",
                     "new data dates: ",
-                    df.index[i].strftime("%Y-%m-%d %H:%M:%S"),
-                    int(df.index[i].timestamp()),
-                )
+                    df.index[i0 + i].strftime("%Y-%m-%d %H:%M:%S"),
+                    int(dates[i0 + i]),
+                ),
+            )
+
+        # only update records that have already been created by the trade data
+        exists = [i for i in range(i1 - i0) if old_records[i] is not None]
+        records = [
+            {
+                "date": int(dates[i0 + i]),
+                str(feat_group_ind): feats[i0 + i],
+            }
+            for i in exists
+        ]
+        batch_put_records(config, client, [inds[i] for i in exists], records)
+        num_recs += len(exists)
 
-            client.put(key, bins)
+    rate = num_recs / max(time() - t0, 1e-6)
+    logger.info(
+        f"feature group {feat_group_ind} updated | {num_recs} rows at {rate:.0f} rows/s",
+    )
 
 
 def upload_scaled_obs(config, client, dt, ind):
@@ -435,6 +568,90 @@ def update_gym_env_hparam(config, client, overwrite_max_samples=False):
     logger.info(f"gym config and hparams updated - total recs: {max_data_ind}")
 
 
+def export_obs_store(config, client):
+    """Export obs store.
+
+    Copies the records used by the gym environment from aerospike into one memory
+    mapped .npy array per bin, so that the environment can slice observations
+    locally (see releat.gym_env.data_backend.MemmapDataBackend). Records after the
+    last complete record are excluded.
+
+    The arrays are written to a temporary folder that replaces the existing store
+    once complete, so environments that have the old arrays open are not affected.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        client (aerospike.Client):
+            aerospike client used to download records
+
+    Returns:
+        None
+
+    """
+    store_dir = get_obs_store_dir(config.obs_store, config.paths)
+    feat_bins = [str(i) for i in range(len(config.features))]
+    bins = ["date", "trade_price", "date_arr"] + feat_bins
+    dtypes = {"date": "int64", "trade_price": "float64", "date_arr": "float32"}
+
+    # last record with all bins, used to get the width of each array
+    max_data_ind = get_records_in_aerospike(config, client)
+    while max_data_ind >= 0:
+        last_record = batch_select_records(config, client, [max_data_ind], bins)[0]
+        if (last_record is not None) and all(k in last_record for k in bins):
+            break
+        max_data_ind -= 1
+    if max_data_ind < 0:
+        raise ValueError(f"no record with all of {bins} to export")
+    num_recs = max_data_ind + 1
+
+    tmp_dir = f"{store_dir}_tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    _ = os.makedirs(tmp_dir)
+
+    arrs = {}
+    for k in bins:
+        shape = (num_recs,) if k == "date" else (num_recs, len(last_record[k]))
+        arrs[k] = open_memmap(
+            f"{tmp_dir}/{k}.npy",
+            mode="w+",
+            dtype=dtypes.get(k, "float32"),
+            shape=shape,
+        )
+
+    t0 = time()
+    batch_size = config.aerospike.batch_size
+    for i0 in tqdm(range(0, num_recs, batch_size)):
+        i1 = min(i0 + batch_size, num_recs)
+        records = batch_select_records(config, client, range(i0, i1), bins)
+        for k in bins:
+            # missing values, i.e. before the first feature, are filled with zeros
+            fill = 0 if k == "date" else [0.0] * arrs[k].shape[1]
+            arrs[k][i0:i1] = np.array(
+                [fill if (x is None) or (k not in x) else x[k] for x in records],
+                dtype=arrs[k].dtype,
+            )
+
+    for k in bins:
+        arrs[k].flush()
+    del arrs
+
+    with open(f"{tmp_dir}/meta.json", "w") as f:
+        json.dump({"columns": bins, "max_data_ind": int(max_data_ind)}, f)
+
+    old_dir = f"{store_dir}_old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(store_dir):
+        os.rename(store_dir, old_dir)
+    os.rename(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    rate = num_recs / max(time() - t0, 1e-6)
+    logger.info(
+        f"obs store exported to {store_dir} | {num_recs} rows at {rate:.0f} rows/s",
+    )
+
+
 def populate_train_data(config, mode="update"):
     """Populate train data.
 
@@ -456,6 +673,11 @@ def populate_train_data(config, mode="update"):
     """
     client = aerospike.client(config.aerospike.connection).connect()
 
+    max_bytes = None
+    if config.feature_build.tick_cache_gb is not None:
+        max_bytes = config.feature_build.tick_cache_gb * 1024**3
+    tick_cache = TickCache(config, max_bytes)
+
     if mode == "update":
         dts = ["update"]
         dt = dts[0]
@@ -469,8 +691,9 @@ def populate_train_data(config, mode="update"):
                 symbol = fc.symbol
                 broker = fc.broker
                 if symbol != prev_symbol:
-                    tick_df = load_raw_tick_data(config, broker, symbol, dt)
-                    df_group = group_tick_data_by_time(config, feat_group_ind, tick_df)
+                    tick_df = tick_cache.get(broker, symbol, dt)
+                    df_group = tick_cache.get_group(feat_group_ind, broker, symbol, dt)
+                    prev_symbol = symbol
 
                 _ = make_feature(
                     df_group,
@@ -479,6 +702,7 @@ def populate_train_data(config, mode="update"):
                     feat_ind,
                     fname=dt,
                     mode="build",
+                    tick_df=tick_df,
                 )
 
     elif mode == "initialise":
@@ -493,14 +717,20 @@ def populate_train_data(config, mode="update"):
                     dts += [x.split("/")[-1].split("_")[0] for x in files]
             dts = list(set(dts))
         dts = list(sorted(dts))
-        _ = build_features_by_dt(config, dts)
+        _ = build_features_by_dt(config, dts, tick_cache)
         _ = get_transform_params_for_all_features(config)
 
     for i in tqdm(range(len(dts))):
         dt = dts[i]
 
         for symbol_info in config.symbol_info:
-            _ = get_trade_price(config, symbol_info.broker, symbol_info.symbol, dt)
+            _ = get_trade_price(
+                config,
+                symbol_info.broker,
+                symbol_info.symbol,
+                dt,
+                tick_cache,
+            )
 
         start_val = None
         _ = upload_trade_data(config, client, dt, start_val)
@@ -509,6 +739,9 @@ def populate_train_data(config, mode="update"):
 
     _ = update_gym_env_hparam(config, client)
 
+    if config.obs_store.backend == "memmap":
+        _ = export_obs_store(config, client)
+
     max_data_ind = get_records_in_aerospike(config, client)
     key = (
         config.aerospike.namespace,
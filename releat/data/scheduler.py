@@ -0,0 +1,135 @@
+"""Task scheduler.
+
+Runs independent tasks on a process pool, i.e. building the features of each month
+and symbol. Tasks are submitted in order while the estimated memory of the running
+tasks is within the memory budget, so that months that would not fit in RAM
+together are built one after the other.
+
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from time import time
+
+import numba
+
+from releat.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def init_worker(num_threads):
+    """Init worker process.
+
+    Args:
+        num_threads (int):
+            number of numba threads of each worker, so that the workers do not
+            oversubscribe the cpus
+
+    """
+    numba.set_num_threads(max(min(num_threads, numba.config.NUMBA_NUM_THREADS), 1))
+
+
+def log_throughput(results, num_tasks, t0):
+    """Log throughput.
+
+    Args:
+        results (list[dict]):
+            output of each finished task, numeric values are summed and reported
+            per second, i.e. number of ticks
+        num_tasks (int):
+            total number of tasks
+        t0 (float):
+            start time in seconds
+
+    """
+    elapsed = max(time() - t0, 1e-9)
+    msg = f"{len(results)}/{num_tasks} tasks in {elapsed:.0f}s"
+    msg += f", {len(results) / elapsed * 60:.2f} tasks/min"
+    totals = {}
+    for result in results:
+        for k, v in (result or {}).items():
+            if isinstance(v, (int, float)):
+                totals[k] = totals.get(k, 0) + v
+    for k, v in totals.items():
+        msg += f", {v / elapsed:.0f} {k}/s"
+    logger.info(msg)
+
+
+def run_tasks(func, tasks, task_memory=None, num_workers=1, max_memory=None):
+    """Run tasks.
+
+    If a single task is estimated to be larger than the memory budget, it is run
+    on its own.
+
+    Args:
+        func (callable):
+            picklable function, called as func(*task)
+        tasks (list[tuple]):
+            arguments of each task
+        task_memory (list[float] | None):
+            estimated memory of each task in bytes
+        num_workers (int | None):
+            number of worker processes, if 1 tasks are run in this process, if None
+            all cpus
+        max_memory (float | None):
+            memory budget in bytes of the tasks that run at the same time, no limit
+            if None
+
+    Returns:
+        list
+            output of each task
+
+    """
+    num_workers = num_workers or os.cpu_count()
+    task_memory = task_memory or [0] * len(tasks)
+    results = [None] * len(tasks)
+    finished = []
+    t0 = time()
+
+    if num_workers == 1:
+        for i, task in enumerate(tasks):
+            results[i] = func(*task)
+            finished.append(results[i])
+            log_throughput(finished, len(tasks), t0)
+        return results
+
+    pending = deque(range(len(tasks)))
+    running = {}
+    memory = 0
+
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=init_worker,
+        initargs=(os.cpu_count() // num_workers,),
+        # polars is not fork safe once its thread pool has been used in this process
+        mp_context=mp.get_context("spawn"),
+    ) as executor:
+        while pending or running:
+            # submit in order while within the memory budget
+            while pending and (len(running) < num_workers):
+                i = pending[0]
+                if (
+                    running
+                    and (max_memory is not None)
+                    and (memory + task_memory[i] > max_memory)
+                ):
+                    break
+                pending.popleft()
+                running[executor.submit(func, *tasks[i])] = i
+                memory += task_memory[i]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                memory -= task_memory[i]
+                results[i] = future.result()
+                finished.append(results[i])
+                log_throughput(finished, len(tasks), t0)
+
+    return results
@@ -0,0 +1,250 @@
+"""Tick segments.
+
+Tick windows as offsets into the sorted tick arrays rather than polars lists. The
+windows are the groups of group_tick_data_by_time, each window is described by the
+index of its first tick and the index after its last tick, so that the ticks of a
+window are zero copy views of the tick arrays.
+
+Features are then calculated by:
+- reduce_windows: an njit kernel run over all windows in parallel
+- apply_windows: a python function run over the views of each window, for features
+  that use scipy
+- apply_windows_shared: same as apply_windows using worker processes. The tick arrays
+  and offsets are copied into shared memory once and each worker reads its windows
+  by index, rather than pickling the ticks of every window
+
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import polars as pl
+from numba import njit
+from numba import prange
+from tqdm import tqdm
+
+# arrays and function of a shared memory worker process, see _init_shared_worker
+_worker_state = {}
+
+
+def get_window_offsets(df_group):
+    """Get window offsets.
+
+    Args:
+        df_group (pl.GroupBy):
+            ticks grouped by the feature timeframe, see group_tick_data_by_time
+
+    Returns:
+        pl.DataFrame
+            columns: time_msc (window label), start (index of the first tick) and end
+            (index after the last tick)
+
+    """
+    df = df_group.agg(
+        [
+            pl.col("tick_ind").first().cast(pl.Int64).alias("start"),
+            pl.count().cast(pl.Int64).alias("end"),
+        ],
+    )
+    if isinstance(df, pl.LazyFrame):
+        df = df.collect()
+    return df.with_columns((pl.col("start") + pl.col("end")).alias("end"))
+
+
+def get_tick_arrays(tick_df, col, dtype=pl.Float32):
+    """Get tick arrays.
+
+    Args:
+        tick_df (pl.DataFrame):
+            tick data that was grouped, see group_tick_data_by_time
+        col (str):
+            name of the tick value column
+        dtype (pl.DataType):
+            dtype of the tick values
+
+    Returns:
+        t (np.array)
+            tick times in nanoseconds
+        y (np.array)
+            tick values as dtype
+
+    """
+    t = tick_df["time_msc"].dt.cast_time_unit("ns").cast(pl.Int64).to_numpy()
+    y = tick_df[col].cast(dtype).to_numpy()
+    return t, y
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def reduce_windows(kernel, t, y, starts, ends, params, num_outputs):
+    """Reduce windows.
+
+    Runs kernel over the ticks of every window in parallel.
+
+    Args:
+        kernel (numba.core.registry.CPUDispatcher):
+            njit function with the signature kernel(t, y, params, out), where t and y
+            are views of the ticks of one window, params are the feature parameters
+            and out is the output row of the window. out is nan by default
+        t (np.array)
+            tick times in nanoseconds
+        y (np.array)
+            tick values
+        starts (np.array)
+            index of the first tick of each window
+        ends (np.array)
+            index after the last tick of each window
+        params (np.array)
+            float64 array of feature parameters
+        num_outputs (int)
+            number of values of the feature
+
+    Returns:
+        np.array
+            float32 array with shape of (number of windows, num_outputs)
+
+    """
+    out = np.full((len(starts), num_outputs), np.nan, dtype=np.float32)
+    for w in prange(len(starts)):
+        i0 = starts[w]
+        i1 = ends[w]
+        kernel(t[i0:i1], y[i0:i1], params, out[w])
+    return out
+
+
+def apply_windows(func, t, y, starts, ends):
+    """Apply function to windows.
+
+    Args:
+        func (callable):
+            function with the signature func(t, y) that returns the values of the
+            feature for one window
+        t (np.array)
+            tick times in nanoseconds
+        y (np.array)
+            tick values
+        starts (np.array)
+            index of the first tick of each window
+        ends (np.array)
+            index after the last tick of each window
+
+    Returns:
+        list
+            output of func for each window
+
+    """
+    return [func(t[i0:i1], y[i0:i1]) for i0, i1 in zip(starts, ends)]
+
+
+def _init_shared_worker(func, specs):
+    """Attach a worker process to the shared arrays.
+
+    Args:
+        func (callable):
+            see apply_windows
+        specs (dict):
+            shared memory name, shape and dtype of each array
+
+    """
+    _worker_state["func"] = func
+    _worker_state["shms"] = []
+    for k, (name, shape, dtype) in specs.items():
+        shm = SharedMemory(name=name)
+        _worker_state["shms"].append(shm)
+        _worker_state[k] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _apply_shared_chunk(w0, w1):
+    """Apply the worker function to windows w0 to w1 (exclusive)."""
+    s = _worker_state
+    return apply_windows(
+        s["func"],
+        s["t"],
+        s["y"],
+        s["starts"][w0:w1],
+        s["ends"][w0:w1],
+    )
+
+
+def apply_windows_shared(func, t, y, starts, ends, num_cpus=None, chunks_per_cpu=4):
+    """Apply function to windows using worker processes.
+
+    Args:
+        func (callable):
+            see apply_windows, must be picklable, i.e. a module level function or a
+            partial of one
+        t (np.array)
+            tick times in nanoseconds
+        y (np.array)
+            tick values
+        starts (np.array)
+            index of the first tick of each window
+        ends (np.array)
+            index after the last tick of each window
+        num_cpus (int | None)
+            number of worker processes, defaults to all cpus
+        chunks_per_cpu (int)
+            number of chunks of windows per worker, for load balancing
+
+    Returns:
+        list
+            output of func for each window
+
+    """
+    num_cpus = num_cpus or os.cpu_count()
+    arrs = {"t": t, "y": y, "starts": starts, "ends": ends}
+    shms = []
+    specs = {}
+    try:
+        for k, arr in arrs.items():
+            arr = np.ascontiguousarray(arr)
+            shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+            shms.append(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+            specs[k] = (shm.name, arr.shape, arr.dtype.str)
+
+        with ProcessPoolExecutor(
+            max_workers=num_cpus,
+            initializer=_init_shared_worker,
+            initargs=(func, specs),
+            # polars is not fork safe once its thread pool has been used in this process
+            mp_context=mp.get_context("spawn"),
+        ) as executor:
+            bounds = np.linspace(0, len(starts), num_cpus * chunks_per_cpu + 1)
+            bounds = bounds.astype(int)
+            bounds = np.unique(bounds)
+            results = executor.map(_apply_shared_chunk, bounds[:-1], bounds[1:])
+            vals = []
+            for chunk in tqdm(results, total=len(bounds) - 1):
+                vals.extend(chunk)
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    return vals
+
+
+def windows_to_df(time_msc, vals):
+    """Windows to dataframe.
+
+    Args:
+        time_msc (pl.Series):
+            label of each window
+        vals (np.array):
+            shape of (number of windows, number of values)
+
+    Returns:
+        pl.DataFrame
+            columns: time_msc and field_0, field_1, ... for each value, i.e. the same
+            columns as an unnested list of values
+
+    """
+    vals = np.asarray(vals, dtype="float32").reshape((len(time_msc), -1))
+    return pl.DataFrame(
+        [time_msc]
+        + [pl.Series(f"field_{i}", vals[:, i]) for i in range(vals.shape[1])],
+    )
@@ -7,16 +7,25 @@ Simple statistical calculations for tick groups
 from __future__ import annotations
 
 import math
+import os
 from functools import partial
 
 import numpy as np
 import polars as pl
 import scipy.signal as signal
 from numba import njit
+from numba import prange
 from p_tqdm import p_map
 from scipy import optimize
 from scipy.ndimage import gaussian_filter1d
 
+from releat.data.simple.segments import apply_windows
+from releat.data.simple.segments import apply_windows_shared
+from releat.data.simple.segments import get_tick_arrays
+from releat.data.simple.segments import get_window_offsets
+from releat.data.simple.segments import reduce_windows
+from releat.data.simple.segments import windows_to_df
+
 
 def get_last(df_group, fc):
     """Last value in group.
@@ -112,40 +121,76 @@ def get_max(df_group, fc):
     return df
 
 
-def get_skew(df_group, fc, pip):
+@njit(cache=True, nogil=True, fastmath=True)
+def skew_kernel(t, y, params, out):
+    """Skew kernel.
+
+    Biased sample skew of the ticks of one window, see reduce_windows.
+
+    Args:
+        t (np.array)
+            tick times of the window in nanoseconds
+        y (np.array)
+            tick values of the window
+        params (np.array)
+            min_num, the window needs more than min_num ticks, otherwise the skew is 0
+        out (np.array)
+            output row of the window, nan if all the ticks have the same value
+
+    """
+    n = len(y)
+    if n <= params[0]:
+        out[0] = 0.0
+        return
+
+    # relative to the first tick, so that the deviations of flat windows are exactly 0
+    mean = 0.0
+    for i in range(n):
+        mean += y[i] - y[0]
+    mean /= n
+
+    m2 = 0.0
+    m3 = 0.0
+    for i in range(n):
+        d = (y[i] - y[0]) - mean
+        m2 += d * d
+        m3 += d * d * d
+    m2 /= n
+    m3 /= n
+    if m2 > 0:
+        out[0] = m3 / m2**1.5
+
+
+def get_skew(df_group, fc, tick_df):
     """Skew of group.
 
     Args:
         df_group (pl.GroupBy):
-            ticks grouped by the feature timeframe
+            ticks grouped by the feature timeframe, see group_tick_data_by_time
         fc (pydantic.BaseModel):
             feature config
-        pip (float):
-            pip value, i.e. 1e-4 for EURUSD
+        tick_df (pl.DataFrame):
+            tick data that was grouped into df_group
 
     Returns:
         pl.DataFrame:
-            skew of group if there are more than min_num tick in group.
-            #TODO scaling doesnt affect skew, remove pip input
+            skew of group if there are more than min_num tick in group, otherwise 0
 
     """
-    col = fc.inputs[0]
-    df = (
-        df_group.agg(
-            [
-                ((pl.col(col) - pl.col(col).first()) / pip).skew().alias("feat"),
-                pl.col(col).alias("raw"),
-            ],
-        )
-        .with_columns(
-            pl.when(pl.col("raw").list.lengths() > fc.kwargs["min_num"])
-            .then(pl.col("feat"))
-            .otherwise(0)
-            .alias("feat"),
-        )
-        .select(["time_msc", "feat"])
+    # float64, skew is calculated from differences of the tick values
+    t, y = get_tick_arrays(tick_df, fc.inputs[0], dtype=pl.Float64)
+    df = get_window_offsets(df_group)
+
+    vals = reduce_windows(
+        skew_kernel,
+        t,
+        y,
+        df["start"].to_numpy(),
+        df["end"].to_numpy(),
+        np.array([fc.kwargs["min_num"]], dtype=np.float64),
+        1,
     )
-    return df
+    return df.with_columns(pl.Series("feat", vals[:, 0])).select(["time_msc", "feat"])
 
 
 def one_hot_fx_flag(df_group, fc):
@@ -260,55 +305,153 @@ def calc_grad(x, y, pip=1e-4, min_num=10):
     return grad[0]
 
 
-def calc_gradient_feature(df_group, fc, pip):
+@njit(cache=True, nogil=True, fastmath=True)
+def calc_block_prefix_sums(t, y, block_size):
+    """Calc block prefix sums.
+
+    Cumulative sums of x, y, x^2 and xy that restart every block_size ticks. Within
+    a block, x and y are relative to the first tick of the block so that the sums
+    stay small and the window sums can be differenced without losing precision.
+
+    Args:
+        t (np.array)
+            tick times in nanoseconds, sorted
+        y (np.array)
+            tick values
+        block_size (int)
+            number of ticks per block
+
+    Returns:
+        np.array
+            shape of (len(t), 4), columns: sum x, sum y, sum x^2, sum xy, where x is
+            in minutes
+
+    """
+    sums = np.zeros((len(t), 4), dtype=np.float64)
+    for i in range(len(t)):
+        b0 = i - i % block_size
+        x_i = (t[i] - t[b0]) * 1e-9 / 60
+        y_i = np.float64(y[i]) - np.float64(y[b0])
+        if i > b0:
+            sums[i] = sums[i - 1]
+        sums[i, 0] += x_i
+        sums[i, 1] += y_i
+        sums[i, 2] += x_i * x_i
+        sums[i, 3] += x_i * y_i
+    return sums
+
+
+@njit(cache=True, nogil=True, fastmath=True, parallel=True)
+def calc_rolling_grad(t, y, starts, ends, pip, min_num, block_size=4096):
+    """Calc rolling gradient.
+
+    Closed form least squares slope of each window from the block prefix sums, i.e.
+    O(1) per window rather than a lstsq over every tick of every window. Same output
+    as calc_grad, with x in minutes since the first tick of the window and y in pips.
+
+    Args:
+        t (np.array)
+            tick times in nanoseconds, sorted
+        y (np.array)
+            tick values
+        starts (np.array)
+            index of the first tick of each window
+        ends (np.array)
+            index after the last tick of each window
+        pip (float)
+            pip value
+        min_num (int)
+            minimum required to return gradient
+        block_size (int)
+            number of ticks per block of prefix sums
+
+    Returns:
+        np.array
+            gradient in degrees of each window, nan if there are 10 or fewer ticks,
+            0 if there are fewer than min_num ticks
+
+    """
+    sums = calc_block_prefix_sums(t, y, block_size)
+    grads = np.full(len(starts), np.nan, dtype=np.float32)
+
+    for w in prange(len(starts)):
+        i0 = starts[w]
+        i1 = ends[w]
+        n = i1 - i0
+        if n <= 10:
+            continue
+        # all ticks at the same time, lstsq returns a gradient of 0
+        if (n < min_num) or (t[i1 - 1] == t[i0]):
+            grads[w] = 0.0
+            continue
+
+        # sums relative to the first tick of the window, combined over the blocks
+        # that the window spans
+        sx = 0.0
+        sy = 0.0
+        sxx = 0.0
+        sxy = 0.0
+        a = i0
+        while a < i1:
+            b0 = a - a % block_size
+            e = min(i1, b0 + block_size) - 1
+            px, py, pxx, pxy = sums[e]
+            if a > b0:
+                px -= sums[a - 1, 0]
+                py -= sums[a - 1, 1]
+                pxx -= sums[a - 1, 2]
+                pxy -= sums[a - 1, 3]
+            k = e - a + 1
+            dx = (t[b0] - t[i0]) * 1e-9 / 60
+            dy = np.float64(y[b0]) - np.float64(y[i0])
+            sxx += pxx + 2 * dx * px + k * dx * dx
+            sxy += pxy + dy * px + dx * py + k * dx * dy
+            sx += px + k * dx
+            sy += py + k * dy
+            a = e + 1
+
+        var = sxx - sx * sx / n
+        cov = sxy - sx * sy / n
+        if var <= 0:
+            grads[w] = 0.0
+        else:
+            grads[w] = np.arctan(cov / var / pip) * 180 / math.pi
+
+    return grads
+
+
+def calc_gradient_feature(df_group, fc, pip, tick_df):
     """Apply gradient to group.
 
     Args:
         df_group (pl.GroupBy):
-            ticks grouped by the feature timeframe
+            ticks grouped by the feature timeframe, see group_tick_data_by_time
         fc (dict):
             feature configuration
         pip (float):
             i.e. 1e-4
+        tick_df (pl.DataFrame):
+            tick data that was grouped into df_group
 
     Returns:
         pl.DataFrame:
             Gradient for tick group if there are more than min_num ticks
 
     """
-    col = fc.inputs[0]
-
-    def get_grad(pip: float, min_num: int, struct: dict) -> pl.Series:
-        """Gradient of series."""
-        x = np.array(struct["x"], dtype=np.float32)
-        y = np.array(struct["y"], dtype=np.float32)
-
-        if len(y) > 10:
-            try:
-                val = calc_grad(x, y, pip, min_num)
-                return tuple([val])
-            except Exception:
-                return tuple([0.0])
-
-    p_get_grad = partial(get_grad, pip, fc.kwargs["min_num"])
-
-    df = (
-        df_group.agg(
-            [
-                pl.col(col).alias("y"),
-                (
-                    (pl.col("time_msc") - pl.col("time_msc").first()).cast(pl.Int64)
-                    * 1e-9
-                    / 60
-                ).alias("x"),
-            ],
-        )
-        .with_columns(pl.struct(["x", "y"]).apply(p_get_grad).alias("feat"))
-        .with_columns(pl.col("feat").cast(pl.List(pl.Float32)))
-        .with_columns(pl.col("feat").list.get(0))
-        .select(["time_msc", "feat"])
-        .collect(streaming=True)
+    t, y = get_tick_arrays(tick_df, fc.inputs[0])
+    df = get_window_offsets(df_group)
+
+    grads = calc_rolling_grad(
+        t,
+        y,
+        df["start"].to_numpy(),
+        df["end"].to_numpy(),
+        pip,
+        fc.kwargs["min_num"],
     )
+    df = df.with_columns(
+        pl.Series("feat", grads, dtype=pl.Float32).fill_nan(None),
+    ).select(["time_msc", "feat"])
 
     return df
 
@@ -380,12 +523,67 @@ def calc_grad_and_peak_trends(x, y, pip=1e-4, fs_factor=10, w1=0.2, w2=2.5, min_
     return tuple([grad[0], t_grad[0] - grad[0], p_grad[0] - grad[0]])
 
 
-def calc_peak_trough_gradient_feature(df_group, fc, pip):
-    """Calculate peak and trough.
+def apply_windows_parallel(func, t, y, starts, ends, feature_build):
+    """Apply function to windows using worker processes.
 
-    TODO clean up hacky batch logic - the apply function polars groups is single
-    threaded making it much faster to convert to numpy, build feature using
-    multiprocessing and then convert back to polars
+    Args:
+        func (callable):
+            see releat.data.simple.segments.apply_windows
+        t (np.array)
+            tick times in nanoseconds
+        y (np.array)
+            tick values
+        starts (np.array)
+            index of the first tick of each window
+        ends (np.array)
+            index after the last tick of each window
+        feature_build (pydantic.BaseModel):
+            feature build config
+
+    Returns:
+        list
+            output of func for each window
+
+    """
+    if feature_build.executor == "shared_memory":
+        return apply_windows_shared(func, t, y, starts, ends, feature_build.num_cpus)
+    elif feature_build.executor == "p_map":
+        return p_map(
+            func,
+            [t[i0:i1] for i0, i1 in zip(starts, ends)],
+            [y[i0:i1] for i0, i1 in zip(starts, ends)],
+            num_cpus=feature_build.num_cpus or os.cpu_count(),
+        )
+    else:
+        raise ValueError(f"executor {feature_build.executor} not implemented")
+
+
+def get_peak_trough(pip, fs_factor, w1, w2, min_num, t, y):
+    """Get peak and trough gradients of one window.
+
+    Args:
+        pip (float):
+            value of one pip
+        fs_factor (int)
+        w1 (np.float)
+        w2 (np.float)
+        min_num (int)
+        t (np.array):
+            tick times in nanoseconds
+        y (np.array):
+            tick values
+
+    Returns:
+        tuple
+            see calc_grad_and_peak_trends
+
+    """
+    x = ((t - t[0]) * 1e-9).astype("float32")
+    return calc_grad_and_peak_trends(x, y, pip, fs_factor, w1, w2, min_num)
+
+
+def calc_peak_trough_gradient_feature(df_group, fc, pip, tick_df, feature_build):
+    """Calculate peak and trough.
 
     Args:
         df_group (pl.GroupBy)
@@ -395,91 +593,48 @@ def calc_peak_trough_gradient_feature(df_group, fc, pip):
             feature config
         pip (float):
             value of one pip
+        tick_df (pl.DataFrame):
+            tick data that was grouped into df_group
+        feature_build (pydantic.BaseModel):
+            feature build config, i.e. number of worker processes
 
     Returns:
         pl.DataFrame
             a feature (3 outputs) for each trade timeframe
 
     """
-    col = fc.inputs[0]
-
     args = fc.kwargs
 
-    df = df_group.agg(
-        [
-            pl.col(col).alias("y") * 10,
-            (
-                (pl.col("time_msc") - pl.col("time_msc").first()).cast(pl.Int64) * 1e-9
-            ).alias("x"),
-        ],
+    t, y = get_tick_arrays(tick_df, fc.inputs[0])
+    y = y * np.float32(10)
+    df = get_window_offsets(df_group)
+    starts = df["start"].to_numpy()
+    ends = df["end"].to_numpy()
+
+    p_get_peak_trough = partial(
+        get_peak_trough,
+        pip,
+        args["fs_factor"],
+        args["w1"],
+        args["w2"],
+        args["min_num"],
     )
 
     # if running a small sample or at inference, performance is negligble
-    if len(df) < 20_000:
-
-        def get_peak_trough(
-            pip: float,
-            fs_factor: int,
-            w1: float,
-            w2: float,
-            min_num: int,
-            struct,
-        ):
-            """Calculate trough and peak."""
-            x = np.array(struct["x"], dtype=np.float32)
-            y = np.array(struct["y"], dtype=np.float32)
-            val = calc_grad_and_peak_trends(x, y, pip, fs_factor, w1, w2, min_num)
-            return pl.Series(val, dtype=pl.Float32)
-
-        p_get_peak_trough = partial(
-            get_peak_trough,
-            pip,
-            args["fs_factor"],
-            args["w1"],
-            args["w2"],
-            args["min_num"],
-        )
-        df = df.with_columns(
-            pl.struct(["x", "y"]).apply(p_get_peak_trough).alias("feat"),
-        )
-
+    if len(df) < feature_build.pool_threshold:
+        vals = apply_windows(p_get_peak_trough, t, y, starts, ends)
     # for large tick data sets, faster to run using multiple processes
     else:
-        df_np = df.to_numpy()
-
-        def get_peak_trough(
-            pip: float,
-            fs_factor: int,
-            w1: float,
-            w2: float,
-            min_num: int,
-            vals,
-        ):
-            """Calculate trough and peak."""
-            x = vals[2]
-            y = vals[1]
-            val = calc_grad_and_peak_trends(x, y, pip, fs_factor, w1, w2, min_num)
-            return val
-
-        p_get_peak_trough = partial(
-            get_peak_trough,
-            pip,
-            args["fs_factor"],
-            args["w1"],
-            args["w2"],
-            args["min_num"],
+        vals = apply_windows_parallel(
+            p_get_peak_trough,
+            t,
+            y,
+            starts,
+            ends,
+            feature_build,
         )
-        df_np = p_map(p_get_peak_trough, df_np, num_cpus=13)
-        df = df.with_columns(pl.Series(df_np).alias("feat"))
 
-    df = (
-        df.select(["time_msc", "feat"])
-        .with_columns(pl.col("feat").cast(pl.List(pl.Float32)))
-        .with_columns(pl.col("feat").list.to_struct())
-        .unnest("feat")
-    )
-
-    return df
+    return windows_to_df(df["time_msc"], vals)
 
 
 def guess_initial_sine_param(tt, yy):
@@ -575,12 +730,32 @@ def get_inflection_point(x, y, pip=1e-4, min_num=5, sigma=20):
         return np.zeros((4,), dtype="float32")
 
 
-def calc_inflection_feature(df_group, fc, pip):
-    """Calculate inflection.
+def get_inflection(pip, min_num, sigma, t, y):
+    """Get inflection of one window.
 
-    TODO clean up hacky batch logic - the apply function polars groups is single
-    threaded making it much faster to convert to numpy, build feature using
-    multiprocessing and then convert back to polars
+    Args:
+        pip (float):
+            value of one pip
+        min_num (int):
+            minimum number of ticks required to calculate the inflection
+        sigma (int):
+            controls spread around the mean of the gaussian filter
+        t (np.array):
+            tick times in nanoseconds
+        y (np.array):
+            tick values
+
+    Returns:
+        np.array
+            see get_inflection_point
+
+    """
+    x = ((t - t[0]) * 1e-9).astype("float32")
+    return get_inflection_point(x, y, pip, min_num, sigma)
+
+
+def calc_inflection_feature(df_group, fc, pip, tick_df, feature_build):
+    """Calculate inflection.
 
     Args:
         df_group (pl.GroupBy)
@@ -590,64 +765,39 @@ def calc_inflection_feature(df_group, fc, pip):
             feature config
         pip (float):
             value of one pip
+        tick_df (pl.DataFrame):
+            tick data that was grouped into df_group
+        feature_build (pydantic.BaseModel):
+            feature build config, i.e. number of worker processes
 
     Returns:
         pl.DataFrame
-            a feature (3 outputs) for each trade timeframe
+            a feature (4 outputs) for each trade timeframe
 
     """
-    col = fc.inputs[0]
-
     args = fc.kwargs
 
-    df = df_group.agg(
-        [
-            pl.col(col).alias("y") * 10,
-            (
-                (pl.col("time_msc") - pl.col("time_msc").first()).cast(pl.Int64) * 1e-9
-            ).alias("x"),
-        ],
-    )
-
-    if len(df) < 20_000:
-
-        def get_inflection(
-            pip: float,
-            min_num: int,
-            sigma: int,
-            struct: dict,
-        ) -> pl.Series:
-            """Get inflection."""
-            x = np.array(struct["x"], dtype=np.float32)
-            y = np.array(struct["y"], dtype=np.float32)
-            val = get_inflection_point(x, y, pip, min_num, sigma)
-            return pl.Series(val, dtype=pl.Float32)
-
-        p_get_inflection = partial(get_inflection, pip, args["min_num"], args["sigma"])
+    t, y = get_tick_arrays(tick_df, fc.inputs[0])
+    y = y * np.float32(10)
+    df = get_window_offsets(df_group)
+    starts = df["start"].to_numpy()
+    ends = df["end"].to_numpy()
 
-        df = df.with_columns(pl.struct(["x", "y"]).apply(p_get_inflection).alias("feat"))
+    p_get_inflection = partial(get_inflection, pip, args["min_num"], args["sigma"])
 
+    if len(df) < feature_build.pool_threshold:
+        vals = apply_windows(p_get_inflection, t, y, starts, ends)
     else:
-        df_np = df.to_numpy()
-
-        def get_inflection(pip: float, min_num: int, sigma: int, vals):
-            """Calculate inflection."""
-            x = vals[2]
-            y = vals[1]
-            val = get_inflection_point(x, y, pip, min_num, sigma)
-            return val.tolist()
-
-        p_get_inflection = partial(get_inflection, pip, args["min_num"], args["sigma"])
-        df_np = p_map(p_get_inflection, df_np, num_cpus=13)
-        df = df.with_columns(pl.Series(df_np).alias("feat"))
-
-    df = (
-        df.select(["time_msc", "feat"])
-        .with_columns(pl.col("feat").list.to_struct())
-        .unnest("feat")
-    )
+        vals = apply_windows_parallel(
+            p_get_inflection,
+            t,
+            y,
+            starts,
+            ends,
+            feature_build,
+        )
 
-    return df
+    return windows_to_df(df["time_msc"], vals)
 
 
 @njit("int32(int32, int32)",cache=True, nogil=True, fastmath=True)
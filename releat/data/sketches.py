@@ -0,0 +1,177 @@
+"""Sketches.
+
+Bounded memory summaries of feature values that are updated one month at a time,
+so that transform parameters can be fitted without holding every month in memory,
+see releat.data.transformers.fit_feature_transform_params.
+
+- QuantileSketch: approximate percentiles of each column, a stack of compactors
+  where each level holds items that stand for 2**level values. When a level is
+  full it is sorted and every other item, from a random offset, moves up a level.
+  The rank error is about n / k, and percentiles are exact until the first
+  compaction
+- ReservoirSample: uniform sample of rows, for fitting transforms that need the
+  values themselves, i.e. PowerTransformer
+
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+class QuantileSketch:
+    """Quantile sketch of each column."""
+
+    def __init__(self, num_cols, k=32_768, seed=0):
+        """Init.
+
+        Args:
+            num_cols (int):
+                number of columns
+            k (int):
+                number of items per level, the rank error is about n / k
+            seed (int):
+                seed of the compaction offsets
+
+        """
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.levels = [[np.empty(0, dtype=np.float64)] for _ in range(num_cols)]
+        self.n = np.zeros(num_cols, dtype=np.int64)
+
+    def update(self, arr):
+        """Add values.
+
+        Args:
+            arr (np.array):
+                2d array, nan values are ignored
+
+        """
+        for j in range(arr.shape[1]):
+            col = arr[:, j].astype(np.float64)
+            col = col[~np.isnan(col)]
+            self.n[j] += len(col)
+            levels = self.levels[j]
+            levels[0] = np.concatenate([levels[0], col])
+            h = 0
+            while h < len(levels):
+                if len(levels[h]) >= self.k:
+                    if h + 1 == len(levels):
+                        levels.append(np.empty(0, dtype=np.float64))
+                    items = np.sort(levels[h])
+                    # an odd item stays, so that the weight of the level is kept
+                    num = len(items) - len(items) % 2
+                    offset = self.rng.integers(2)
+                    levels[h + 1] = np.concatenate(
+                        [levels[h + 1], items[offset:num:2]],
+                    )
+                    levels[h] = items[num:]
+                h += 1
+
+    def is_exact(self):
+        """Is exact.
+
+        Returns:
+            bool
+                True if no values have been compacted, so percentiles are exact
+
+        """
+        return all(len(levels) == 1 for levels in self.levels)
+
+    def percentile(self, q):
+        """Percentile of each column.
+
+        Same interpolation as np.percentile, over the ranks of the weighted items.
+
+        Args:
+            q (float):
+                percentile between 0 and 100
+
+        Returns:
+            np.array
+                percentile of each column, nan for a column without values
+
+        """
+        out = np.full(len(self.levels), np.nan, dtype=np.float64)
+        for j, levels in enumerate(self.levels):
+            if self.n[j] == 0:
+                continue
+            items = np.concatenate(levels)
+            weights = np.concatenate(
+                [np.full(len(x), 2**h, dtype=np.int64) for h, x in enumerate(levels)],
+            )
+            order = np.argsort(items, kind="stable")
+            items = items[order]
+            cum_weights = np.cumsum(weights[order])
+
+            rank = q / 100 * (cum_weights[-1] - 1)
+            lo = int(np.floor(rank))
+            i0 = np.searchsorted(cum_weights, lo, side="right")
+            i1 = np.searchsorted(cum_weights, min(lo + 1, cum_weights[-1] - 1), "right")
+            out[j] = items[i0] + (rank - lo) * (items[i1] - items[i0])
+        return out
+
+
+class ReservoirSample:
+    """Uniform sample of rows."""
+
+    def __init__(self, size, seed=0):
+        """Init.
+
+        The rows are allocated at the first update, with the number of columns and
+        dtype of the added rows.
+
+        Args:
+            size (int):
+                maximum number of rows
+            seed (int):
+                seed of the sample
+
+        """
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.rows = None
+        self.n = 0
+
+    def update(self, arr):
+        """Add rows.
+
+        Each row seen so far is in the sample with probability size / n.
+
+        Args:
+            arr (np.array):
+                2d array of rows
+
+        """
+        if self.rows is None:
+            self.rows = np.empty((self.size, arr.shape[1]), dtype=arr.dtype)
+        # fill the sample first, in order
+        num_fill = max(min(self.size - self.n, len(arr)), 0)
+        self.rows[self.n : self.n + num_fill] = arr[:num_fill]
+        arr = arr[num_fill:]
+        if len(arr) > 0:
+            # row i replaces a random row with probability size / (i + 1)
+            inds = self.n + num_fill + np.arange(len(arr))
+            slots = (self.rng.random(len(arr)) * (inds + 1)).astype(np.int64)
+            is_kept = slots < self.size
+            self.rows[slots[is_kept]] = arr[is_kept]
+        self.n += num_fill + len(arr)
+
+    def is_complete(self):
+        """Is complete.
+
+        Returns:
+            bool
+                True if every row is in the sample
+
+        """
+        return self.n <= self.size
+
+    def sample(self):
+        """Sample.
+
+        Returns:
+            np.array
+                rows of the sample, in the order they were added if complete
+
+        """
+        return self.rows[: min(self.n, self.size)]
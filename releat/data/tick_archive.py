@@ -0,0 +1,201 @@
+"""Tick archive.
+
+Compact encoding of the monthly MT5 tick files:
+- bid as int32 points, where a point is the smallest price increment, i.e. 1e-5 for
+  EURUSD
+- spread (ask - bid) as int32 points
+- time_msc as int64 milliseconds, delta encoded from the previous tick, and decoded
+  as datetime64[ns] as MT5 downloads are
+- flags as uint8
+
+The columns that are not used to build features, i.e. time, last, volume and
+volume_real, are dropped. The number of digits of a point is saved in the file
+metadata so that a file can be decoded on its own. Prices are decoded as
+points / 10**digits, which is exactly the float that MT5 returns, so the encoding
+is lossless. Ticks that can not be encoded, i.e. a symbol without a pip in
+trading_instruments, are saved as plain parquet as before.
+
+"""
+from __future__ import annotations
+
+import math
+import os
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from releat.utils.configs.constants import trading_instruments
+from releat.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+TICK_ENCODING = b"releat-tick-v1"
+
+
+def get_price_digits(broker, symbol):
+    """Get price digits.
+
+    Args:
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+
+    Returns:
+        int | None
+            number of decimals of a price, one more than the pip, i.e. 5 for EURUSD.
+            None if the symbol is not in trading_instruments
+
+    """
+    symbol_info = trading_instruments.get(broker, {}).get(symbol)
+    if symbol_info is None:
+        return None
+    return round(-math.log10(symbol_info["pip"])) + 1
+
+
+def encode_ticks(df, digits):
+    """Encode ticks.
+
+    Args:
+        df (pd.DataFrame | pl.DataFrame):
+            raw tick data with columns bid, ask, time_msc and flags
+        digits (int):
+            number of decimals of a price, see get_price_digits
+
+    Returns:
+        pa.Table
+            encoded tick data
+
+    Raises:
+        ValueError:
+            if the ticks can not be encoded without loss
+
+    """
+    if not isinstance(df, pl.DataFrame):
+        df = pl.from_pandas(df[["bid", "ask", "time_msc", "flags"]])
+    scale = 10.0**digits
+
+    points = {}
+    for col in ["bid", "ask"]:
+        price = df[col].cast(pl.Float64).to_numpy()
+        pts = np.rint(price * scale)
+        if np.abs(pts).max(initial=0) >= 2**31:
+            raise ValueError(f"{col} does not fit in int32 points of 1e-{digits}")
+        if not np.array_equal(pts / scale, price):
+            raise ValueError(f"{col} is not a multiple of 1e-{digits}")
+        points[col] = pts.astype(np.int64)
+
+    flags = df["flags"].to_numpy()
+    if (flags.min(initial=0) < 0) or (flags.max(initial=0) > 255):
+        raise ValueError("flags do not fit in uint8")
+
+    time_msc = df["time_msc"].dt.cast_time_unit("ms").cast(pl.Int64).to_numpy()
+    table = pa.table(
+        {
+            "bid": points["bid"].astype(np.int32),
+            "spread": (points["ask"] - points["bid"]).astype(np.int32),
+            "time_msc": np.diff(time_msc, prepend=0),
+            "flags": flags.astype(np.uint8),
+        },
+    )
+    metadata = {b"encoding": TICK_ENCODING, b"digits": str(digits).encode()}
+    return table.replace_schema_metadata(metadata)
+
+
+def decode_ticks(table):
+    """Decode ticks.
+
+    Args:
+        table (pa.Table):
+            output of encode_ticks
+
+    Returns:
+        pl.DataFrame
+            raw tick data with columns bid, ask, time_msc (in ns, as downloaded)
+            and flags, in the format that clean_raw_tick_data takes
+
+    """
+    digits = int(table.schema.metadata[b"digits"])
+    scale = 10.0**digits
+    table = table.combine_chunks()
+
+    # single chunk integer columns without nulls are viewed without a copy
+    bid = table["bid"].to_numpy().astype(np.float64)
+    ask = bid + table["spread"].to_numpy()
+    time_msc = np.cumsum(table["time_msc"].to_numpy()) * 1_000_000
+    time_msc = time_msc.view("datetime64[ns]")
+
+    return pl.DataFrame(
+        {
+            "bid": bid / scale,
+            "ask": ask / scale,
+            "time_msc": time_msc,
+            "flags": table["flags"].to_numpy(),
+        },
+    )
+
+
+def is_tick_archive(f):
+    """Is tick archive.
+
+    Args:
+        f (str):
+            parquet file of tick data
+
+    Returns:
+        bool
+            True if the file was written by write_tick_archive
+
+    """
+    metadata = pq.read_schema(f).metadata or {}
+    return metadata.get(b"encoding") == TICK_ENCODING
+
+
+def write_tick_archive(df, f, broker, symbol):
+    """Write tick archive.
+
+    Args:
+        df (pd.DataFrame | pl.DataFrame):
+            tick data as downloaded by download_tick_data or download_ticks
+        f (str):
+            parquet file
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+
+    """
+    tmp_f = f"{os.path.dirname(f)}/.{os.path.basename(f)}.{os.getpid()}.tmp"
+    digits = get_price_digits(broker, symbol)
+    try:
+        if digits is None:
+            raise ValueError(f"no pip for {broker} {symbol} in trading_instruments")
+        table = encode_ticks(df, digits)
+        pq.write_table(table, tmp_f, compression="zstd")
+    except ValueError as e:
+        logger.warning(f"{broker} {symbol} saving ticks without encoding: {e}")
+        if isinstance(df, pl.DataFrame):
+            df.write_parquet(tmp_f)
+        else:
+            df.to_parquet(tmp_f, engine="pyarrow")
+    os.replace(tmp_f, f)
+
+
+def read_tick_archive(f):
+    """Read tick archive.
+
+    Args:
+        f (str):
+            parquet file written by write_tick_archive, or a plain parquet file of
+            tick data
+
+    Returns:
+        pl.DataFrame
+            raw tick data
+
+    """
+    if is_tick_archive(f):
+        return decode_ticks(pq.read_table(f))
+    return pl.read_parquet(f, use_pyarrow=True)
@@ -0,0 +1,228 @@
+"""Tick buffer.
+
+Fixed capacity buffer of the most recent ticks of a symbol, used at inference
+instead of a pandas dataframe that is concatenated and copied at each trade timestep.
+
+The columns are preallocated numpy arrays of twice the capacity. Ticks are appended
+at the end, and once the end of the arrays is reached the ticks that are kept are
+moved to the front, so that appends are amortized O(new ticks) and the ticks are
+always contiguous. Time ranges are found by binary search on time_msc and returned
+as views, without copying the ticks. Views are only valid until the next append.
+
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+
+# time_msc is saved as ns from epoch
+TICK_BUFFER_DTYPES = {
+    "time_msc": np.int64,
+    "bid": np.float64,
+    "ask": np.float64,
+    "flags": np.int32,
+}
+
+
+def to_ns(t):
+    """To ns.
+
+    Args:
+        t (pd.Timestamp | datetime.datetime | np.datetime64 | str):
+            naive time
+
+    Returns:
+        int
+            ns from epoch
+
+    """
+    return pd.Timestamp(t).value
+
+
+class TickRingBuffer:
+    """Tick ring buffer."""
+
+    def __init__(self, capacity):
+        """Init.
+
+        Args:
+            capacity (int):
+                maximum number of ticks, the oldest ticks are dropped when full
+
+        """
+        self.capacity = capacity
+        self.arrays = {
+            col: np.zeros(2 * capacity, dtype=dtype)
+            for col, dtype in TICK_BUFFER_DTYPES.items()
+        }
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        """Number of ticks."""
+        return self.end - self.start
+
+    def view(self, col, i0=0, i1=None):
+        """View of a column.
+
+        Args:
+            col (str):
+                column name, see TICK_BUFFER_DTYPES
+            i0 (int):
+                first tick, relative to the oldest tick
+            i1 (int | None):
+                end tick (exclusive), relative to the oldest tick, all if None
+
+        Returns:
+            np.array
+                view of the column, not a copy
+
+        """
+        i1 = len(self) if i1 is None else i1
+        return self.arrays[col][self.start + i0 : self.start + i1]
+
+    def append(self, df):
+        """Append ticks.
+
+        Args:
+            df (pd.DataFrame | pl.DataFrame):
+                new ticks with columns time_msc, bid, ask and flags, sorted by
+                time_msc and after the ticks in the buffer
+
+        """
+        cols = {c: df[c].to_numpy() for c in ["bid", "ask", "flags"]}
+        if isinstance(df, pl.DataFrame):
+            time_msc = df["time_msc"].dt.cast_time_unit("ns").cast(pl.Int64).to_numpy()
+        else:
+            time_msc = df["time_msc"].to_numpy().astype("datetime64[ns]").view(np.int64)
+        cols["time_msc"] = time_msc
+
+        n = len(time_msc)
+        if n > self.capacity:
+            cols = {c: v[n - self.capacity :] for c, v in cols.items()}
+            n = self.capacity
+
+        if self.end + n > 2 * self.capacity:
+            # move the ticks that are kept to the front
+            keep = min(len(self), self.capacity - n)
+            for arr in self.arrays.values():
+                arr[:keep] = arr[self.end - keep : self.end]
+            self.start = 0
+            self.end = keep
+        elif len(self) + n > self.capacity:
+            self.start = self.end + n - self.capacity
+
+        for col, arr in self.arrays.items():
+            arr[self.end : self.end + n] = cols[col]
+        self.end += n
+
+    def index(self, t, side="left"):
+        """Index of a time.
+
+        Args:
+            t (pd.Timestamp | datetime.datetime | np.datetime64):
+                time
+            side (str):
+                'left' for the first tick at or after t, 'right' for the first tick
+                after t
+
+        Returns:
+            int
+                index relative to the oldest tick
+
+        """
+        return int(np.searchsorted(self.view("time_msc"), to_ns(t), side=side))
+
+    def last_time_before(self, t):
+        """Time of the last tick before t.
+
+        Args:
+            t (pd.Timestamp | datetime.datetime | np.datetime64):
+                time
+
+        Returns:
+            pd.Timestamp
+
+        """
+        i = self.index(t) - 1
+        if i < 0:
+            raise IndexError(f"no ticks before {t}")
+        return pd.Timestamp(self.view("time_msc")[i])
+
+    def last_time(self):
+        """Time of the last tick.
+
+        Returns:
+            pd.Timestamp
+
+        """
+        return pd.Timestamp(self.view("time_msc")[-1])
+
+    def drop_before(self, t):
+        """Drop the ticks before t.
+
+        Args:
+            t (pd.Timestamp | datetime.datetime | np.datetime64):
+                time of the oldest tick that is kept
+
+        """
+        self.start += self.index(t)
+
+    def drop_from(self, t):
+        """Drop the ticks at or after t.
+
+        Args:
+            t (pd.Timestamp | datetime.datetime | np.datetime64):
+                time of the first tick that is dropped
+
+        """
+        self.end = self.start + self.index(t)
+
+    def trim(self):
+        """Keeps the last 24 hours of ticks, or 72 hours over the weekend."""
+        if len(self) == 0:
+            return
+        last = self.last_time()
+        hours = 24
+        if (last - pd.Timedelta(hours=24)).dayofweek > 4:
+            hours += 48
+        t0 = last - pd.Timedelta(hours=hours)
+        self.start += self.index(t0, side="right")
+
+    def to_frame(self, t0=None, t1=None, i0=None):
+        """Ticks in a time range.
+
+        Args:
+            t0 (pd.Timestamp | datetime.datetime | np.datetime64 | None):
+                first time, inclusive
+            t1 (pd.Timestamp | datetime.datetime | np.datetime64 | None):
+                last time, inclusive
+            i0 (int | None):
+                first tick, relative to the oldest tick, instead of t0
+
+        Returns:
+            pl.DataFrame
+                ticks with columns time_msc, bid, ask and flags, backed by the buffer
+                without a copy, i.e. for load_raw_tick_data(..., dt="inference"). Only
+                valid until the next append
+
+        """
+        if i0 is None:
+            i0 = 0 if t0 is None else self.index(t0)
+        i1 = len(self) if t1 is None else self.index(t1, side="right")
+        i0 = max(i0, 0)
+        i1 = max(i1, i0)
+
+        time_msc = self.view("time_msc", i0, i1)
+        columns = {
+            "time_msc": pa.Array.from_buffers(
+                pa.timestamp("ns"),
+                len(time_msc),
+                [None, pa.py_buffer(time_msc)],
+            ),
+        }
+        for col in ["bid", "ask", "flags"]:
+            columns[col] = pa.array(self.view(col, i0, i1))
+        return pl.from_arrow(pa.table(columns))
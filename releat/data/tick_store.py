@@ -0,0 +1,251 @@
+"""Tick store.
+
+Cleaned tick data partitioned by broker, symbol and day:
+
+    {tick_store_dir}/broker={broker}/symbol={symbol}/date={%Y-%m-%d}/{month}.parquet
+
+where month is the monthly tick file that the ticks were cleaned from, so that a
+month and its lookback are read exactly as they were downloaded. The files are
+written with row group statistics, so that time range filters of scan_tick_files
+skip row groups that are out of range.
+
+Months are ingested by releat.data.cleaning.ingest_tick_month. The size and
+modified time of the monthly tick file are saved with the month, so that a month is
+ingested again when its tick file is downloaded again.
+
+"""
+from __future__ import annotations
+
+import json
+import os
+from glob import glob
+
+import polars as pl
+
+# columns of the cleaned ticks in the store, see releat.data.cleaning.select_tick_columns
+TICK_SCHEMA = {
+    "bid": pl.Float32,
+    "ask": pl.Float32,
+    "time_msc": pl.Datetime("ns"),
+    "avg_price": pl.Float32,
+    "spread": pl.Float32,
+    "time_diff": pl.Float32,
+    "flags": pl.Int32,
+}
+
+
+def get_tick_store_dir(config):
+    """Get tick store dir.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+
+    Returns:
+        str
+            root of the tick store, defaults to {tick_data_dir}/store
+
+    """
+    store_dir = config.raw_data.tick_store_dir
+    if store_dir is None:
+        store_dir = f"{config.paths.tick_data_dir}/store"
+    return store_dir
+
+
+def get_symbol_store_dir(config, broker, symbol):
+    """Get symbol store dir.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+
+    Returns:
+        str
+            folder of the day partitions of the symbol
+
+    """
+    return f"{get_tick_store_dir(config)}/broker={broker}/symbol={symbol}"
+
+
+def get_file_fingerprint(f):
+    """Get file fingerprint.
+
+    Args:
+        f (str):
+            file path
+
+    Returns:
+        list | None
+            size and modified time in ns of the file, None if it does not exist
+
+    """
+    if not os.path.exists(f):
+        return None
+    stat = os.stat(f)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def is_month_ingested(config, broker, symbol, dt, source_f=None):
+    """Is month ingested.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        dt (str):
+            first day of the month in the format '%Y-%m-%d'
+        source_f (str | None):
+            monthly tick file that the month is cleaned from. If given and it
+            exists, the month is only ingested if it was cleaned from the same
+            version of the file
+
+    Returns:
+        bool
+
+    """
+    symbol_dir = get_symbol_store_dir(config, broker, symbol)
+    marker_f = f"{symbol_dir}/_ingested/{dt}"
+    if not os.path.exists(marker_f):
+        return False
+    if (source_f is None) or (not os.path.exists(source_f)):
+        return True
+    with open(marker_f) as f:
+        marker = json.loads(f.read() or "null")
+    # markers without a source were written before the source was saved
+    if not isinstance(marker, dict):
+        return False
+    return marker.get("source") == get_file_fingerprint(source_f)
+
+
+def write_tick_month(
+    config,
+    broker,
+    symbol,
+    dt,
+    df,
+    source=None,
+    row_group_size=100_000,
+):
+    """Write tick month.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        dt (str):
+            first day of the month of the tick file, in the format '%Y-%m-%d'
+        df (pl.DataFrame):
+            cleaned tick data of the month, sorted by time_msc
+        source (list | None):
+            fingerprint of the monthly tick file that df is cleaned from, see
+            get_file_fingerprint
+        row_group_size (int):
+            number of ticks per row group
+
+    """
+    symbol_dir = get_symbol_store_dir(config, broker, symbol)
+    marker_f = f"{symbol_dir}/_ingested/{dt}"
+    if os.path.exists(marker_f):
+        os.remove(marker_f)
+
+    df = df.with_columns(pl.col("time_msc").dt.strftime("%Y-%m-%d").alias("date"))
+    df_days = df.partition_by("date", as_dict=True, maintain_order=True)
+    # polars 0.19 uses the value as key for a single partition column
+    df_days = {(k[0] if isinstance(k, tuple) else k): v for k, v in df_days.items()}
+
+    # days of a previous version of the month that are not in this version
+    for f in get_month_files(config, broker, symbol, dt):
+        if f.split("/date=")[-1].split("/")[0] not in df_days:
+            os.remove(f)
+
+    for date, df_day in df_days.items():
+        day_dir = f"{symbol_dir}/date={date}"
+        os.makedirs(day_dir, exist_ok=True)
+        tmp_f = f"{day_dir}/.{dt}.{os.getpid()}.tmp"
+        df_day.drop("date").write_parquet(
+            tmp_f,
+            statistics=True,
+            row_group_size=row_group_size,
+        )
+        os.replace(tmp_f, f"{day_dir}/{dt}.parquet")
+
+    # marker is written last, so that a partially written month is ingested again
+    os.makedirs(f"{symbol_dir}/_ingested", exist_ok=True)
+    with open(marker_f, "w") as f:
+        json.dump({"num_ticks": len(df), "source": source}, f)
+
+
+def get_month_files(config, broker, symbol, dt, start_date=None, end_date=None):
+    """Get month files.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        dt (str):
+            first day of the month of the tick file, in the format '%Y-%m-%d'
+        start_date (str | None):
+            first day partition to include, in the format '%Y-%m-%d'
+        end_date (str | None):
+            last day partition to include, in the format '%Y-%m-%d'
+
+    Returns:
+        list[str]
+            day files of the month, sorted by day
+
+    """
+    symbol_dir = get_symbol_store_dir(config, broker, symbol)
+    files = []
+    for f in sorted(glob(f"{symbol_dir}/date=*/{dt}.parquet")):
+        date = f.split("/date=")[-1].split("/")[0]
+        if (start_date is not None) and (date < start_date):
+            continue
+        if (end_date is not None) and (date > end_date):
+            continue
+        files.append(f)
+    return files
+
+
+def scan_tick_files(files, t0=None, t1=None):
+    """Scan tick files.
+
+    Args:
+        files (list[str]):
+            day files, see get_month_files
+        t0 (datetime | None):
+            only ticks at or after t0
+        t1 (datetime | None):
+            only ticks before t1
+
+    Returns:
+        pl.LazyFrame
+            ticks of the files in the time range, empty if there are no files, i.e.
+            a month without ticks
+
+    """
+    if len(files) == 0:
+        return pl.LazyFrame(schema=TICK_SCHEMA)
+
+    # the partition values are not read as columns, time_msc already has the day
+    df = pl.concat(
+        [pl.scan_parquet(f, hive_partitioning=False) for f in files],
+        how="vertical",
+    )
+    if t0 is not None:
+        df = df.filter(pl.col("time_msc") >= t0)
+    if t1 is not None:
+        df = df.filter(pl.col("time_msc") < t1)
+    return df
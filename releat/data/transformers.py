@@ -10,7 +10,6 @@ from __future__ import annotations
 
 import _pickle as cPickle
 import os
-import pickle
 from copy import deepcopy
 from glob import glob
 
@@ -18,15 +17,30 @@ import numpy as np
 import pandas as pd
 import polars as pl
 from numba import njit
+from numba import prange
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import PowerTransformer
 from tqdm import tqdm
 
+from releat.data.scheduler import run_tasks
+from releat.data.sketches import QuantileSketch
+from releat.data.sketches import ReservoirSample
 from releat.data.utils import get_feature_dir
 from releat.data.utils import split_timeframe
 from releat.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# transform parameters by transform file, see load_transform_params
+_transform_params = {}
+
+# codes of the transforms in a transform chain, see make_transform_chain
+TRANSFORM_OPS = {"clip": 0, "PowerTransformer": 1, "PiecewiseLinear": 2}
+
+# lambda within this of 0 or 2 uses the log form of yeo-johnson, same as
+# yeo_johnson_transform_vec
+YJ_SPACING = float(np.float32(np.spacing(1.0)))
+
 
 @njit(cache=True, nogil=True, fastmath=True)
 def find_clip_values(arr, lower_lim, upper_lim, method):
@@ -95,6 +109,27 @@ def clip_by_value(arr, clip_min, clip_max, scale_factor):
     return arr
 
 
+def broadcast_param(param, arr):
+    """Broadcast param.
+
+    Args:
+        param (np.array):
+            transform parameter, either one value per column of arr or the same shape
+            as arr
+        arr (np.array):
+            2d array that is transformed
+
+    Returns:
+        np.array
+            param with the same shape as arr, a view that repeats the values of each
+            column rather than a copy
+
+    """
+    if param.ndim < arr.ndim:
+        return np.broadcast_to(param, arr.shape)
+    return param
+
+
 def apply_clip(arr, tc):
     """Apply clip.
 
@@ -109,7 +144,12 @@ def apply_clip(arr, tc):
             clipped array
 
     """
-    arr = clip_by_value(arr, tc.clip_min, tc.clip_max, tc.scale_factor)
+    arr = clip_by_value(
+        arr,
+        broadcast_param(tc.clip_min, arr),
+        broadcast_param(tc.clip_max, arr),
+        tc.scale_factor,
+    )
     return arr
 
 
@@ -260,7 +300,12 @@ def apply_scaling(arr, tc):
 
     """
     if tc.method == "PowerTransformer":
-        return yeo_johnson_transform(tc.lam, tc.mean, tc.std, arr)
+        return yeo_johnson_transform(
+            broadcast_param(tc.lam, arr),
+            broadcast_param(tc.mean, arr),
+            broadcast_param(tc.std, arr),
+            arr,
+        )
     elif tc.method == "PiecewiseLinear":
         return linear_scaling(arr)
 
@@ -286,7 +331,164 @@ def apply_transform(arr, tc):
     return func(arr, tc)
 
 
-def get_one_transform_param(config, feat_group_ind, feat_ind, t_ind, feats):
+def make_transform_chain(transforms, num_cols):
+    """Make transform chain.
+
+    Packs the transform configs of a feature into arrays for apply_transform_chain.
+
+    Args:
+        transforms (list[pydantic.BaseModel]):
+            enriched transform configs, see enrich_transform_config. Parameters must
+            have one value per column
+        num_cols (int):
+            number of columns of the arrays that are transformed
+
+    Returns:
+        ops (np.array)
+            TRANSFORM_OPS code of each transform
+        params (np.array)
+            shape of (len(transforms), 3, num_cols), clip_min, clip_max and
+            scale_factor for clip, lambda, mean and std for PowerTransformer
+
+    """
+    ops = np.zeros(len(transforms), dtype=np.int64)
+    params = np.zeros((len(transforms), 3, num_cols), dtype=np.float64)
+    for i, tc in enumerate(transforms):
+        if tc.name == "clip":
+            ops[i] = TRANSFORM_OPS["clip"]
+            values = [tc.clip_min, tc.clip_max, tc.scale_factor]
+        else:
+            ops[i] = TRANSFORM_OPS[tc.method]
+            values = [tc.lam, tc.mean, tc.std] if tc.method == "PowerTransformer" else []
+        for k, v in enumerate(values):
+            params[i, k] = np.broadcast_to(np.ravel(v), (num_cols,))
+    return ops, params
+
+
+@njit(cache=True, nogil=True, fastmath=True)
+def transform_value(x, ops, params, j):
+    """Transform value.
+
+    Same as apply_transform of each transform in turn, for one value.
+
+    Args:
+        x (float):
+            value
+        ops (np.array):
+            see make_transform_chain
+        params (np.array):
+            see make_transform_chain
+        j (int):
+            column of the value
+
+    Returns:
+        float
+            transformed value
+
+    """
+    for i in range(len(ops)):
+        op = ops[i]
+        if op == 0:
+            # clip
+            if x < params[i, 0, j]:
+                x = params[i, 0, j]
+            elif x > params[i, 1, j]:
+                x = params[i, 1, j]
+            x *= params[i, 2, j]
+        elif op == 1:
+            # yeo-johnson
+            lmbda = params[i, 0, j]
+            if x >= 0:
+                if abs(lmbda) < YJ_SPACING:
+                    x = np.log1p(x)
+                else:
+                    x = ((x + 1) ** lmbda - 1) / lmbda
+            else:
+                if abs(lmbda - 2) > YJ_SPACING:
+                    x = -((-x + 1) ** (2 - lmbda) - 1) / (2 - lmbda)
+                else:
+                    x = -np.log1p(-x)
+            x = (x - params[i, 1, j]) / params[i, 2, j]
+        elif op == 2:
+            # piecewise linear
+            if x > 2:
+                x = 2 + (x - 2) / 2
+            if x > 3:
+                x = 3 + (x - 3) / 2
+            if x < -2:
+                x = -2 + (x + 2) / 2
+            if x < -3:
+                x = -3 + (x + 3) / 2
+    return x
+
+
+@njit(cache=True, nogil=True, fastmath=True)
+def apply_transform_chain(arr, ops, params):
+    """Apply transform chain.
+
+    One pass over arr for all the transforms of a feature, i.e. for the small arrays
+    of one observation at inference.
+
+    Args:
+        arr (np.array):
+            2d array, transformed in place
+        ops (np.array):
+            see make_transform_chain
+        params (np.array):
+            see make_transform_chain
+
+    Returns:
+        np.array
+            arr
+
+    """
+    for r in range(arr.shape[0]):
+        for j in range(arr.shape[1]):
+            arr[r, j] = transform_value(arr[r, j], ops, params, j)
+    return arr
+
+
+@njit(cache=True, nogil=True, fastmath=True, parallel=True)
+def apply_transform_chain_parallel(arr, ops, params):
+    """Apply transform chain over rows in parallel, see apply_transform_chain."""
+    for r in prange(arr.shape[0]):
+        for j in range(arr.shape[1]):
+            arr[r, j] = transform_value(arr[r, j], ops, params, j)
+    return arr
+
+
+def apply_transforms(arr, transforms, parallel=False):
+    """Apply transforms.
+
+    Same as apply_transform of each transform in turn, in one pass over arr.
+
+    Args:
+        arr (np.array):
+            2d array, transformed in place
+        transforms (list[pydantic.BaseModel]):
+            enriched transform configs, see make_transform_chain
+        parallel (bool):
+            if True, transform rows in parallel, i.e. for the features of a month
+
+    Returns:
+        np.array
+            transformed array
+
+    """
+    ops, params = make_transform_chain(transforms, arr.shape[1])
+    if parallel:
+        return apply_transform_chain_parallel(arr, ops, params)
+    return apply_transform_chain(arr, ops, params)
+
+
+def get_one_transform_param(
+    config,
+    feat_group_ind,
+    feat_ind,
+    t_ind,
+    feats,
+    clip_vals=None,
+):
     """Get one transform param.
 
     Calculates the transform parameters of one config
@@ -300,6 +502,9 @@ def get_one_transform_param(config, feat_group_ind, feat_ind, t_ind, feats):
         t_ind (int)
         feats (np.array)
             note we overwrite feats each time we call this function
+        clip_vals (dict[np.array] | None):
+            clip_min and clip_max of a clip transform that are already known, i.e.
+            percentiles from a QuantileSketch, otherwise they are found from feats
 
     Returns:
         np.array
@@ -310,14 +515,10 @@ def get_one_transform_param(config, feat_group_ind, feat_ind, t_ind, feats):
     fc = feat_group.simple_features[feat_ind]
     tc = fc.transforms[t_ind]
 
-    folder = get_feature_dir(config, feat_group_ind, feat_ind)
-    folder = f"{folder}/transforms"
-    _ = os.makedirs(folder, exist_ok=True)
-    transform_f = f"{folder}/{t_ind}_{tc.name}_{tc.method}.cpkl"
-
-    ones = np.ones(feats.shape)
+    transform_f = get_transform_file(config, feat_group_ind, feat_ind, t_ind)
+    _ = os.makedirs(os.path.dirname(transform_f), exist_ok=True)
 
-    if tc.name == "clip":
+    if (tc.name == "clip") and (clip_vals is None):
         clip_vals = find_clip_values(
             feats,
             tc.lower_lim,
@@ -325,11 +526,14 @@ def get_one_transform_param(config, feat_group_ind, feat_ind, t_ind, feats):
             tc.method,
         )
 
+    if tc.name == "clip":
+
         with open(transform_f, "wb") as fobj:
             cPickle.dump(dict(clip_vals), fobj)
+        _transform_params[transform_f] = dict(clip_vals)
 
-        tc.clip_min = clip_vals["clip_min"] * ones
-        tc.clip_max = clip_vals["clip_max"] * ones
+        tc.clip_min = clip_vals["clip_min"].astype("float64")
+        tc.clip_max = clip_vals["clip_max"].astype("float64")
 
     if tc.name == "scale":
         if tc.method == "PowerTransformer":
@@ -337,17 +541,18 @@ def get_one_transform_param(config, feat_group_ind, feat_ind, t_ind, feats):
 
             with open(transform_f, "wb") as fobj:
                 cPickle.dump(scaler, fobj)
+            _transform_params[transform_f] = scaler
 
-            tc.lam = scaler["lambda"] * ones
-            tc.mean = scaler["mean"] * ones
-            tc.std = scaler["std"] * ones
+            tc.lam = scaler["lambda"].astype("float64")
+            tc.mean = scaler["mean"].astype("float64")
+            tc.std = scaler["std"].astype("float64")
 
     feats = apply_transform(feats, tc)
 
     return feats
 
 
-def get_transform_params(config, feat_group_ind, feat_ind, feats):
+def get_transform_params(config, feat_group_ind, feat_ind, feats, clip_vals=None):
     """Get transform params.
 
     Calculates all the transform parameters for a config and returns the transformed
@@ -360,6 +565,9 @@ def get_transform_params(config, feat_group_ind, feat_ind, feats):
         feats (np.array)
         ft (np.array)
             data of full timeframe (not partial)
+        clip_vals (dict[np.array] | None):
+            clip values of the first transform if it is a clip, see
+            get_one_transform_param
 
     Returns:
         np.array
@@ -374,7 +582,14 @@ def get_transform_params(config, feat_group_ind, feat_ind, feats):
 
     for t_ind in range(len(fc.transforms)):
         # print(f'transform {t_ind}')
-        feats = get_one_transform_param(config, feat_group_ind, feat_ind, t_ind, feats)
+        feats = get_one_transform_param(
+            config,
+            feat_group_ind,
+            feat_ind,
+            t_ind,
+            feats,
+            clip_vals if t_ind == 0 else None,
+        )
         # print('transform done')
 
     assert not np.isnan(feats).all(), "some nans in feat"
@@ -384,6 +599,158 @@ def get_transform_params(config, feat_group_ind, feat_ind, feats):
     return feats
 
 
+def difference_windows(x, obs_len, step, pip):
+    """Difference windows.
+
+    Each row is a window of obs_len + 1 values that are step rows apart, as a
+    difference to the last value of the window in pips. The last value is left out
+    because its difference is always 0. Same as the differencing observation of
+    releat.data.inference.make_feature_obs, which is the window that ends at the
+    current time.
+
+    Args:
+        x (np.array):
+            1d array of the feature, i.e. the mean price of each row
+        obs_len (int):
+            number of differences in each window
+        step (int):
+            number of rows between the values of a window
+        pip (float):
+            pip size of the symbol
+
+    Returns:
+        np.array
+            float32 array of shape (len(x) - obs_len * step, obs_len), row i is the
+            window that starts at x[i]
+
+    """
+    if len(x) <= obs_len * step:
+        return np.zeros((0, obs_len), dtype="float32")
+    windows = sliding_window_view(x, obs_len * step + 1)[:, ::step]
+    out = (windows[:, :obs_len] - windows[:, -1:]) / pip
+    return out.astype("float32")
+
+
+def get_month_feats(config, feat_group_ind, feat_ind, f, last_dt=None):
+    """Get the raw features of one month.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of the feature group
+        feat_ind (int):
+            index of the feature within the feature group
+        f (str):
+            raw data parquet file of the month
+        last_dt (datetime | None):
+            time of the last row of the previous month, rows up to this time are
+            dropped because months overlap
+
+    Returns:
+        np.array
+            2d array of the features, one row per time
+        datetime
+            time of the last row
+
+    """
+    fc = config.features[feat_group_ind].simple_features[feat_ind]
+    df = pl.read_parquet(f)
+    if fc.name == "differencing":
+        symbol_index = config.symbol_info_index[fc.symbol]
+        pip = config.symbol_info[symbol_index].pip
+
+        obs_len = fc.output_shape[0]
+        num, unit = split_timeframe(fc.timeframe)
+        # TODO instead of 6 it should be 60seconds / trade timeframe
+        # rows are at 10s intervals
+        step = int(num * 6) if unit == "m" else int(num / 10)
+
+        # for now differencing is only for the dataframes with one feature
+        feats = difference_windows(df["feat"].to_numpy(), obs_len, step, pip)
+        times = df["time_msc"].head(len(feats))
+    else:
+        cols = [x for x in df.columns if x != "time_msc"]
+        feats = df.select(cols).to_numpy()
+        times = df["time_msc"]
+
+    if last_dt is not None:
+        assert last_dt > times[0]
+        feats = feats[(times > last_dt).to_numpy()]
+        times = times.filter(times > last_dt)
+    last_dt = times[-1] if len(times) > 0 else last_dt
+
+    return feats, last_dt
+
+
+def fit_feature_transform_params(config, feat_group_ind, feat_ind):
+    """Fit the transform parameters of one feature.
+
+    Makes one pass over the months, so only one month of raw features is in memory
+    at a time. Each month updates a ReservoirSample of
+    feature_build.transform_sample_size rows and, if the first transform is a
+    percentile clip, a QuantileSketch of each column. If every row fits in the
+    sample the parameters are the same as fitting on all the months. Otherwise the
+    first percentile clip uses the percentiles of the sketch and the remaining
+    transforms are fitted on the sample.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of the feature group
+        feat_ind (int):
+            index of the feature within the feature group
+
+    Returns:
+        dict[dict[np.array]]
+            parameters of each transform by transform file
+
+    """
+    logger.info(f"Scaling feature {feat_group_ind}-{feat_ind}")
+    fc = config.features[feat_group_ind].simple_features[feat_ind]
+    tc = fc.transforms[0] if fc.transforms else None
+    use_sketch = (tc is not None) and (tc.name == "clip") and (tc.method == "percentile")
+
+    feature_dir = get_feature_dir(config, feat_group_ind, feat_ind)
+    files = list(sorted(glob(f"{feature_dir}/raw_data/*")))
+    sample = ReservoirSample(config.feature_build.transform_sample_size)
+    sketch = None
+    last_dt = None
+    for f in tqdm(files):
+        feats, last_dt = get_month_feats(config, feat_group_ind, feat_ind, f, last_dt)
+        sample.update(feats)
+        if use_sketch:
+            sketch = sketch or QuantileSketch(feats.shape[1])
+            sketch.update(feats)
+
+    clip_vals = None
+    if use_sketch and not sample.is_complete():
+        clip_vals = {
+            "clip_min": sketch.percentile(tc.lower_lim).astype("float32"),
+            "clip_max": sketch.percentile(tc.upper_lim).astype("float32"),
+        }
+        logger.info(
+            f"Feature {feat_group_ind}-{feat_ind} fitted on {len(sample.sample())}"
+            f" of {sample.n} rows",
+        )
+
+    _ = get_transform_params(
+        config,
+        feat_group_ind,
+        feat_ind,
+        sample.sample().copy(),
+        clip_vals,
+    )
+
+    params = {}
+    for t_ind in range(len(fc.transforms)):
+        transform_f = get_transform_file(config, feat_group_ind, feat_ind, t_ind)
+        if transform_f in _transform_params:
+            params[transform_f] = _transform_params[transform_f]
+    return params
+
+
 def get_transform_params_for_one_feature_group(config, feat_group_ind):
     """Get transform param for one group.
 
@@ -402,143 +769,136 @@ def get_transform_params_for_one_feature_group(config, feat_group_ind):
     """
     feat_group = config.features[feat_group_ind]
     for feat_ind in range(len(feat_group.simple_features)):
-        logger.info(f"Scaling feature {feat_group_ind}-{feat_ind}")
-        feature_dir = get_feature_dir(config, feat_group_ind, feat_ind)
-        files = list(sorted(glob(f"{feature_dir}/raw_data/*")))
-        dfs = None
-        for f in tqdm(files):
-            df_raw = pl.read_parquet(f)
-            if feat_group.simple_features[feat_ind].name == "differencing":
-                df = df_raw.with_columns(
-                    pl.Series(list(range(len(df_raw)))).alias("group_ind"),
-                )
-
-                feat_group = config.features[feat_group_ind]
-                fc = feat_group.simple_features[feat_ind]
-                symbol_index = config.symbol_info_index[fc.symbol]
-                pip = config.symbol_info[symbol_index].pip
-
-                obs_len = fc.output_shape[0]
-                num, unit = split_timeframe(fc.timeframe)
-                # TODO clean up this logic
-                # if the unit is seconds divide by 10 (because 10s intervals) otherwise
-                # divide by 1 - note its 0.1 because we have 10s intervals
-                mult = 6 if unit == "m" else 0.1
-                obs_timeframe = str(int(obs_len * num * mult)) + "i"
-                # for now differencing is only for the dataframes with one feature
-                col = "feat"
-
-                if unit == "s":
-                    take_every_num = int(num / 10)
-                elif unit == "m":
-                    # TODO instead of 6 it should be 60seconds / trade timeframe
-                    take_every_num = int(num * 60 / 10)
-
-                df_obs_group = df.set_sorted("group_ind").groupby_dynamic(
-                    "group_ind",
-                    every="1i",
-                    period=obs_timeframe,
-                    closed="both",
-                )
-
-                df = (
-                    df_obs_group.agg(
-                        [
-                            ((pl.col(col) - pl.col(col).last()) / pip).alias(col),
-                        ],
-                    )
-                    .with_columns(
-                        pl.col(col).apply(
-                            lambda x: x.take_every(take_every_num).head(obs_len),
-                        ),
-                    )
-                    .filter(pl.col("group_ind" >= 0))
-                    .with_columns(pl.lit(df_raw["time_msc"]).alias("time_msc"))
-                )
-                df = df.head(len(df) - int(obs_len * num * mult))
+        _ = fit_feature_transform_params(config, feat_group_ind, feat_ind)
 
-            else:
-                df = df_raw
 
-            if dfs is None:
-                dfs = df
-            else:
-                last_dt = dfs["time_msc"][-1]
-                assert last_dt > df["time_msc"][0]
-                df = df.filter(pl.col("time_msc") > last_dt)
-                dfs = pl.concat([dfs, df], how="vertical")
+def get_transform_params_for_all_features(config):
+    """Get transforms for groups.
 
-        if feat_group.simple_features[feat_ind].name == "differencing":
-            feats = dfs.select(pl.col("feat").list.to_struct()).unnest("feat").to_numpy()
-        else:
-            cols = [x for x in dfs.columns if x != "time_msc"]
-            feats = dfs.select(cols).to_numpy()
+    Features are fitted on feature_build.num_workers processes.
 
-        _ = get_transform_params(config, feat_group_ind, feat_ind, feats)
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
 
+    Returns:
+        None
 
+    """
+    tasks = []
+    for feat_group_ind, feat_group in enumerate(config.features):
+        for feat_ind in range(len(feat_group.simple_features)):
+            tasks.append((config, feat_group_ind, feat_ind))
 
-def get_transform_params_for_all_features(config):
-    """Get transforms for groups."""
-    for feat_group_ind in range(len(config.features)):
-        _ = get_transform_params_for_one_feature_group(config, feat_group_ind)
+    results = run_tasks(
+        fit_feature_transform_params,
+        tasks,
+        num_workers=config.feature_build.num_workers,
+    )
+    # parameters that are fitted in worker processes are kept in memory here
+    for params in results:
+        _transform_params.update(params)
 
 
-def enrich_transform_config(config, feat_group_ind, feat_ind, t_ind, feat_shape=None):
+def get_transform_file(config, feat_group_ind, feat_ind, t_ind):
+    """Get transform file.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of the feature group
+        feat_ind (int):
+            index of the feature within the feature group
+        t_ind (int):
+            index of the transform of the feature
+
+    Returns:
+        str
+            pickle file of the fitted transform parameters
+
+    """
+    fc = config.features[feat_group_ind].simple_features[feat_ind]
+    tc = fc.transforms[t_ind]
+    folder = get_feature_dir(config, feat_group_ind, feat_ind)
+    return f"{folder}/transforms/{t_ind}_{tc.name}_{tc.method}.cpkl"
+
+
+def load_transform_params(config, feat_group_ind, feat_ind, t_ind):
+    """Load transform params.
+
+    The file is only read the first time, afterwards the parameters are returned
+    from memory. Parameters that are fitted by get_one_transform_param replace the
+    loaded parameters.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of the feature group
+        feat_ind (int):
+            index of the feature within the feature group
+        t_ind (int):
+            index of the transform of the feature
+
+    Returns:
+        dict[np.array]
+            one value per column for each parameter, i.e. clip_min and clip_max or
+            lambda, mean and std
+
+    """
+    transform_f = get_transform_file(config, feat_group_ind, feat_ind, t_ind)
+    if transform_f not in _transform_params:
+        with open(transform_f, "rb") as fobj:
+            _transform_params[transform_f] = cPickle.load(fobj)
+    return _transform_params[transform_f]
+
+
+def enrich_transform_config(config, feat_group_ind, feat_ind, t_ind):
     """Enrich one transform config.
 
-    Loads transform configs into dict
-    # when doing batch transforms, we need the feature size
-    # when in real time, we can pass through just the dimension of 1 batch
-    # enrich transform
+    Sets the fitted parameters of the transform config. Parameters are kept as one
+    value per column and broadcast to the shape of the features when the transform
+    is applied, so the same config is used for one observation or a batch. The
+    parameters of differencing features are one value per row of the observation,
+    so they are reshaped to the output shape.
 
     Args:
-        folder (str)
-        fc (dict)
-        feat_ind (int)
-        t_ind (int)
-        feat_size (tuple())
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of the feature group
+        feat_ind (int):
+            index of the feature within the feature group
+        t_ind (int):
+            index of the transform of the feature
 
     Returns:
-        dict
-            one tc with scaled params
+        pydantic.BaseModel
+            feature config with the parameters of the transform
 
     """
     feat_group = config.features[feat_group_ind]
     fc = feat_group.simple_features[feat_ind]
 
-    folder = get_feature_dir(config, feat_group_ind, feat_ind)
-
     tc = fc.transforms[t_ind]
-    transform_f = f"{folder}/transforms/{t_ind}_{tc.name}_{tc.method}.cpkl"
 
     if not tc.method == "PiecewiseLinear":
-        with open(transform_f, "rb") as fobj:
-            scaler = cPickle.load(fobj)
+        scaler = load_transform_params(config, feat_group_ind, feat_ind, t_ind)
 
-        if feat_shape is None:
-            feat_shape = np.ones(fc.output_shape)
+        if fc.name == "differencing":
+            params = {k: v.reshape(fc.output_shape) for k, v in scaler.items()}
         else:
-            feat_shape = np.ones(feat_shape)
+            params = {k: v.astype("float64") for k, v in scaler.items()}
 
         match tc.name:
             case "clip":
-                if fc.name == "differencing":
-                    tc.clip_min = scaler["clip_min"].reshape(fc.output_shape)
-                    tc.clip_max = scaler["clip_max"].reshape(fc.output_shape)
-
-                else:
-                    tc.clip_min = scaler["clip_min"] * feat_shape
-                    tc.clip_max = scaler["clip_max"] * feat_shape
+                tc.clip_min = params["clip_min"]
+                tc.clip_max = params["clip_max"]
             case "scale":
-                if fc.name == "differencing":
-                    tc.lam = scaler["lambda"].reshape(fc.output_shape)
-                    tc.mean = scaler["mean"].reshape(fc.output_shape)
-                    tc.std = scaler["std"].reshape(fc.output_shape)
-                else:
-                    tc.lam = scaler["lambda"] * feat_shape
-                    tc.mean = scaler["mean"] * feat_shape
-                    tc.std = scaler["std"] * feat_shape
+                tc.lam = params["lambda"]
+                tc.mean = params["mean"]
+                tc.std = params["std"]
 
         fc.transforms[t_ind] = tc
     return fc
@@ -573,11 +933,38 @@ def enrich_all_feature_configs(config):
     return config
 
 
+def get_scaled_data_files(config, feat_group_ind, feat_ind, dt):
+    """Get scaled data files.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of feature group
+        feat_ind (int):
+            index of feature within feature group
+        dt (pd.DateTime):
+            datetime of the month, usually in the format of '%Y-%m-01'
+
+    Returns:
+        str
+            .npy file of the scaled features
+        str
+            .npy file of the time of each row of the scaled features
+
+    """
+    feature_dir = get_feature_dir(config, feat_group_ind, feat_ind)
+    scaled_obs_dir = f"{feature_dir}/scaled_data"
+    return f"{scaled_obs_dir}/{dt}.npy", f"{scaled_obs_dir}/{dt}_time_msc.npy"
+
+
 def scale_feature(config, feat_group_ind, feat_ind, dt):
     """Scale feature.
 
     Make sure enrich config is called before this function. Apply the transforms
-    to the raw features
+    to the raw features and save them as one float32 array of shape
+    (num_rows, *row_shape) with a sidecar array of the time of each row, see
+    load_scaled_feature. Transform parameters must be one value per column.
 
     Args:
         config (pydantic.BaseModel):
@@ -593,29 +980,59 @@ def scale_feature(config, feat_group_ind, feat_ind, dt):
     """
     feature_dir = get_feature_dir(config, feat_group_ind, feat_ind)
     df_raw = pd.read_parquet(f"{feature_dir}/raw_data/{dt}.parquet", engine="pyarrow")
-
     fc = config.features[feat_group_ind].simple_features[feat_ind]
-    scaled_obs_dir = get_feature_dir(config, feat_group_ind, feat_ind)
-    scaled_obs_dir = f"{scaled_obs_dir}/scaled_data"
-    os.makedirs(scaled_obs_dir, exist_ok=True)
 
     feat = df_raw.drop("time_msc", axis=1).to_numpy()
+    if feat.dtype == object:
+        # one array per cell, rows are stacked to (num_rows, cell_len, num_cols)
+        feat = np.stack([np.stack(feat[:, j]) for j in range(feat.shape[1])], axis=-1)
+    feat = feat.astype("float32")
 
-    def flatten_polar_array(arr):
-        return np.stack(arr).T
+    row_shape = feat.shape[1:]
+    feat = feat.reshape((-1, row_shape[-1]))
+    feat = apply_transforms(feat, fc.transforms, parallel=True)
+    feat = feat.reshape((-1, *row_shape))
 
-    fc = config.features[feat_group_ind].simple_features[feat_ind]
+    feat_f, time_f = get_scaled_data_files(config, feat_group_ind, feat_ind, dt)
+    os.makedirs(os.path.dirname(feat_f), exist_ok=True)
+    np.save(feat_f, feat)
+    np.save(time_f, df_raw["time_msc"].to_numpy().astype("datetime64[ns]"))
 
-    feat = np.apply_along_axis(flatten_polar_array, 0, feat).astype("float32")
-    feat = np.moveaxis(feat, 0, 1)
 
-    for i in range(len(feat)):
-        for tc in fc.transforms:
-            feat[i] = apply_transform(feat[i], tc)
+def load_scaled_feature(config, feat_group_ind, feat_ind, dt, dt0=None, dt1=None):
+    """Load scaled feature.
 
-    feat = pd.Series(list(feat), name=str(feat_ind)).to_frame()
-    feat.index = df_raw["time_msc"].tolist()
+    The arrays are memory mapped, so only the rows between dt0 and dt1 are read from
+    disk when they are used.
 
-    feat[str(feat_ind)] = feat[str(feat_ind)].apply(pickle.dumps)
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of feature group
+        feat_ind (int):
+            index of feature within feature group
+        dt (pd.DateTime):
+            datetime of the month, usually in the format of '%Y-%m-01'
+        dt0 (pd.Timestamp | None):
+            time of the first row, from the first row if None
+        dt1 (pd.Timestamp | None):
+            rows before this time, to the last row if None
+
+    Returns:
+        np.array
+            datetime64[ns] time of each row
+        np.array
+            float32 scaled features, read only
 
-    feat.to_parquet(f"{scaled_obs_dir}/{dt}.parquet")
+    """
+    feat_f, time_f = get_scaled_data_files(config, feat_group_ind, feat_ind, dt)
+    time_msc = np.load(time_f, mmap_mode="r")
+    feat = np.load(feat_f, mmap_mode="r")
+
+    i0, i1 = 0, len(time_msc)
+    if dt0 is not None:
+        i0 = np.searchsorted(time_msc, pd.Timestamp(dt0).to_datetime64())
+    if dt1 is not None:
+        i1 = np.searchsorted(time_msc, pd.Timestamp(dt1).to_datetime64())
+    return time_msc[i0:i1], feat[i0:i1]
@@ -5,7 +5,6 @@ Random function that need to find a better place to belong in
 """
 from __future__ import annotations
 
-import pandas as pd
 import polars as pl
 
 from releat.utils.logging import get_logger
@@ -40,6 +39,27 @@ def get_feature_dir(config, feat_group_ind, feat_ind):
     return feature_dir
 
 
+def get_raw_feature_file(config, feat_group_ind, feat_ind, fname):
+    """Get raw feature file.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+        feat_group_ind (int):
+            index of feature group
+        feat_ind (int):
+            index of feature within its feature group
+        fname (str):
+            name of the feature file, i.e. the month
+
+    Returns:
+        str:
+            path
+    """
+    feature_dir = get_feature_dir(config, feat_group_ind, feat_ind)
+    return f"{feature_dir}/raw_data/{fname}.parquet"
+
+
 def split_timeframe(timeframe):
     """Split timeframe.
 
@@ -83,31 +103,3 @@ def tick_polars_df_to_list(df):
         if df[col].dtype.str[1] == "M":
             df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S.%f")
     return df.to_dict(orient="records")
-
-
-def update_tick_data(data, new_data):
-    """Update tick data.
-
-    Args:
-        data (dict[pd.DataFrame]):
-            dictionary of dataframes with tick data
-        new_data (dict[pd.DataFrame]):
-            dictionary if dataframes with tick data
-
-    Returns:
-        dict[pd.DataFrame]
-            up to date tick data
-
-    """
-    for broker_symbol in data.keys():
-        df = data[broker_symbol]
-        df = df[df["time_msc"] < df["time_msc"].iloc[-1].replace(microsecond=0)]
-        # df = df[df["time_msc"] < now.replace(microsecond=0).replace(tzinfo=None)]
-        df = pd.concat([df, new_data[broker_symbol]], axis=0)
-        hours = 24
-        if (df["time_msc"].max() - pd.Timedelta(hours=24)).dayofweek > 4:
-            hours += 48
-        df = df[df["time_msc"] > (df["time_msc"].max() - pd.Timedelta(hours=hours))]
-        df.reset_index(inplace=True, drop=True)
-        data[broker_symbol] = df
-    return data
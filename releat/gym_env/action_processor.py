@@ -212,6 +212,59 @@ def exec_action(action_map, portfolio, action, curr_price, time_int, comm):
     return portfolio, reward, trade_journal_entry
 
 
+@njit(nogil=True, cache=True, fastmath=True)
+def batch_exec_action(action_map, portfolios, actions, curr_prices, time_ints, comms):
+    """Execute gym actions for a batch of portfolios.
+
+    Calls exec_action for each sub environment of a vector env in one jit call.
+    Portfolios are modified in place.
+
+    Args
+        action_map (np.array)
+            columns: index , pos_dir: short (-1) or long (1),
+            order_type: open (1) or close (-1), pos_size
+        portfolios (np.array)
+            shape of (number of envs, number of positions, 13), see exec_action
+        actions (np.array)
+            action of each env
+        curr_prices (np.array)
+            shape of (number of envs, number of symbols, 2)
+        time_ints (np.array)
+            current time in seconds of each env
+        comms (np.array)
+            commission of each env
+
+    Returns
+        portfolios (np.array)
+        rewards (np.array)
+        trade_journal_entries (np.array)
+            closed position of each env, only valid where has_entry is true
+        has_entry (np.array)
+            whether a position was closed in each env
+
+    """
+    num_envs = portfolios.shape[0]
+    rewards = np.zeros(num_envs, dtype="float64")
+    trade_journal_entries = np.zeros((num_envs, portfolios.shape[2]), dtype="float64")
+    has_entry = np.zeros(num_envs, dtype=np.bool_)
+
+    for i in range(num_envs):
+        _, reward, trade_journal_entry = exec_action(
+            action_map,
+            portfolios[i],
+            actions[i],
+            curr_prices[i],
+            time_ints[i],
+            comms[i],
+        )
+        rewards[i] = reward
+        if trade_journal_entry is not None:
+            trade_journal_entries[i] = trade_journal_entry
+            has_entry[i] = True
+
+    return portfolios, rewards, trade_journal_entries, has_entry
+
+
 def format_portfolio(symbol_info, portfolio):
     """Format portfolio.
 
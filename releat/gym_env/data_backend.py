@@ -0,0 +1,414 @@
+"""Data backend.
+
+Sources of raw data for the gym environment:
+- aerospike: records are read from the database at every step
+- memmap: records are sliced from memory mapped arrays that are exported from the
+database, see releat.data.pipeline.export_obs_store
+
+The memmap arrays are read only, so every rollout worker on a node shares the same
+pages in the os page cache. Both backends return views, so the raw data must not be
+modified, see obs_processor.get_obs.
+
+"""
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from releat.gym_env.obs_processor import get_raw_data
+
+
+def get_obs_store_dir(obs_store, paths):
+    """Get obs store dir.
+
+    Args:
+        obs_store (pydantic.BaseModel):
+            obs store config
+        paths (pydantic.BaseModel):
+            paths config
+
+    Returns:
+        str
+            folder of the exported arrays
+
+    """
+    store_dir = obs_store.store_dir
+    if store_dir is None:
+        store_dir = f"{paths.feature_dir}/obs_store"
+    return store_dir
+
+
+def get_batch_table_inds(raw_data_shape, obs_interval, inds):
+    """Get batch table indexes.
+
+    Args:
+        raw_data_shape (dict):
+            number of feature timesteps in the observation for each feature group
+        obs_interval (dict[int]):
+            number of trade_timesteps between each sample of feature
+        inds (np.array):
+            table index of each observation
+
+    Returns:
+        dict[np.array]
+            for each feature group, the table indexes of shape (len(inds), num + 1),
+            i.e. ind - i * obs_interval for i in num, ..., 0
+
+    """
+    inds = np.asarray(inds, dtype="int64")
+    table_inds = {}
+    for feat_group_ind, num in raw_data_shape.items():
+        if feat_group_ind != "max":
+            k = str(feat_group_ind)
+            offsets = np.arange(num, -1, -1, dtype="int64") * obs_interval[k]
+            table_inds[k] = inds[:, None] - offsets[None, :]
+    return table_inds
+
+
+class ObsRingBuffer:
+    """Observation ring buffer.
+
+    Holds the most recent num * interval + 1 records of one feature group, so that
+    the observation (every interval-th record up to the current record) is a strided
+    view of the buffer. Each record is written twice, at slot i and i + size, so that
+    the window is always contiguous in memory.
+
+    """
+
+    def __init__(self, num, interval, width):
+        """Init.
+
+        Args:
+            num (int):
+                number of feature timesteps in the observation, the view has num + 1
+                records because the last record is used for differencing
+            interval (int):
+                number of trade_timesteps between each sample of feature
+            width (int):
+                number of values in each record
+
+        """
+        self.interval = interval
+        self.size = num * interval + 1
+        self.buf = np.zeros((2 * self.size, width), dtype="float32")
+        self.last_ind = None
+
+    def get_start_ind(self, ind):
+        """Get start index.
+
+        Args:
+            ind (int):
+                table index of the current observation
+
+        Returns:
+            int
+                first table index that needs to be written to the buffer before the
+                window ending at ind can be viewed
+
+        """
+        if (self.last_ind is None) or (ind < self.last_ind):
+            return ind - self.size + 1
+        return max(self.last_ind + 1, ind - self.size + 1)
+
+    def write(self, i0, rows):
+        """Write records.
+
+        Args:
+            i0 (int):
+                table index of the first row
+            rows (np.array):
+                records with table indexes i0, i0 + 1, ...
+
+        """
+        slots = np.arange(i0, i0 + len(rows)) % self.size
+        self.buf[slots] = rows
+        self.buf[slots + self.size] = rows
+        self.last_ind = i0 + len(rows) - 1
+
+    def view(self):
+        """View observation.
+
+        Returns:
+            np.array
+                records last_ind - i * interval for i in num, ..., 0
+
+        """
+        start = (self.last_ind + 1) % self.size
+        return self.buf[start : start + self.size : self.interval]
+
+
+class AerospikeDataBackend:
+    """Reads raw data from aerospike.
+
+    With the ring buffer enabled, each call only reads the records that are not
+    already held from the previous call, i.e. 1 + skip_step records per step rather
+    than the whole lookback window of every feature group.
+
+    """
+
+    def __init__(self, config, client):
+        """Init.
+
+        Args:
+            config (Dict(pydantic.BaseModel|dict|Any)):
+                as defined in 'agent_config.py'
+            client (aerospike.Client):
+                client object for downloading records
+
+        """
+        self.config = config
+        self.client = client
+        self.max_data_ind = None
+        self.use_ring_buffer = config["obs_store"].ring_buffer
+        self.buffers = {}
+        self.static_data = {}
+
+    def select_records(self, i0, i1, bins):
+        """Select records.
+
+        Args:
+            i0 (int):
+                first table index
+            i1 (int):
+                last table index (inclusive)
+            bins (list[str]):
+                bin names
+
+        Returns:
+            list[dict]
+                bins of each record
+
+        """
+        ks = [
+            (
+                self.config["aerospike"].namespace,
+                self.config["aerospike"].set_name,
+                i,
+            )
+            for i in range(i0, i1 + 1)
+        ]
+        return [x[2] for x in self.client.select_many(ks, bins)]
+
+    def get_raw_data(self, raw_data_shape, obs_interval, ind):
+        """Get raw data.
+
+        Args:
+            raw_data_shape (dict):
+                number of feature timesteps in the observation for each feature group
+            obs_interval (dict[int]):
+                number of trade_timesteps between each sample of feature
+            ind (int):
+                database table index of the current observation
+
+        Returns:
+            dict
+                raw_data from which the observation can be build
+
+        """
+        if not self.use_ring_buffer:
+            return get_raw_data(
+                self.config,
+                self.client,
+                raw_data_shape,
+                obs_interval,
+                ind,
+            )
+
+        # first table index to read for each feature group
+        start_inds = {}
+        for feat_group_ind, num in raw_data_shape.items():
+            if feat_group_ind != "max":
+                k = str(feat_group_ind)
+                if k in self.buffers:
+                    start_inds[k] = self.buffers[k].get_start_ind(ind)
+                else:
+                    start_inds[k] = ind - num * obs_interval[k]
+
+        # groups that share a start index, i.e. all groups after the first step, are
+        # read in one call
+        static_bins = ["date", "trade_price", "date_arr"]
+        for i0 in sorted(set(start_inds.values())):
+            if i0 > ind:
+                continue
+            feat_bins = [k for k, v in start_inds.items() if v == i0]
+            bins = feat_bins + static_bins
+            records = self.select_records(i0, ind, bins)
+            for k in feat_bins:
+                rows = np.array([x[k] for x in records], dtype="float32")
+                if k not in self.buffers:
+                    self.buffers[k] = ObsRingBuffer(
+                        raw_data_shape[int(k)],
+                        obs_interval[k],
+                        rows.shape[1],
+                    )
+                self.buffers[k].write(i0, rows)
+            self.static_data = {b: records[-1][b] for b in static_bins}
+
+        raw_data = {**self.static_data}
+        for k, buffer in self.buffers.items():
+            raw_data[k] = buffer.view()
+        return raw_data
+
+    def get_raw_data_batch(self, raw_data_shape, obs_interval, inds):
+        """Get raw data for a batch of observations.
+
+        All the records of all the feature groups are read in one call.
+
+        Args:
+            raw_data_shape (dict):
+                number of feature timesteps in the observation for each feature group
+            obs_interval (dict[int]):
+                number of trade_timesteps between each sample of feature
+            inds (np.array):
+                database table index of each observation
+
+        Returns:
+            dict
+                same as get_raw_data but each value has an extra first dimension for
+                the batch
+
+        """
+        table_inds = get_batch_table_inds(raw_data_shape, obs_interval, inds)
+        static_bins = ["date", "trade_price", "date_arr"]
+        bins = list(table_inds.keys()) + static_bins
+
+        unique_inds = np.unique(np.concatenate([x.ravel() for x in table_inds.values()]))
+        ks = [
+            (
+                self.config["aerospike"].namespace,
+                self.config["aerospike"].set_name,
+                int(i),
+            )
+            for i in unique_inds
+        ]
+        records = {
+            int(i): x[2] for i, x in zip(unique_inds, self.client.select_many(ks, bins))
+        }
+
+        raw_data = {
+            "date": np.array([records[int(i)]["date"] for i in inds], dtype="int64"),
+            "trade_price": np.array(
+                [records[int(i)]["trade_price"] for i in inds],
+                dtype="float64",
+            ),
+            "date_arr": np.array(
+                [records[int(i)]["date_arr"] for i in inds],
+                dtype="float32",
+            ),
+        }
+        for k, group_inds in table_inds.items():
+            raw_data[k] = np.array(
+                [[records[int(i)][k] for i in row] for row in group_inds],
+                dtype="float32",
+            )
+        return raw_data
+
+
+class MemmapDataBackend:
+    """Reads raw data from memory mapped arrays."""
+
+    def __init__(self, config):
+        """Init.
+
+        Args:
+            config (Dict(pydantic.BaseModel|dict|Any)):
+                as defined in 'agent_config.py'
+
+        """
+        store_dir = get_obs_store_dir(config["obs_store"], config["paths"])
+        with open(f"{store_dir}/meta.json") as f:
+            meta = json.load(f)
+
+        self.columns = {}
+        for name in meta["columns"]:
+            self.columns[name] = np.load(f"{store_dir}/{name}.npy", mmap_mode="r")
+        self.max_data_ind = meta["max_data_ind"]
+
+    def get_raw_data(self, raw_data_shape, obs_interval, ind):
+        """Get raw data.
+
+        Same output as obs_processor.get_raw_data, i.e. for each feature group the
+        records ind - i * obs_interval for i in num, ..., 0
+
+        Args:
+            raw_data_shape (dict):
+                number of feature timesteps in the observation for each feature group
+            obs_interval (dict[int]):
+                number of trade_timesteps between each sample of feature
+            ind (int):
+                table index of the current observation
+
+        Returns:
+            dict
+                raw_data from which the observation can be build
+
+        """
+        raw_data = {
+            "date": int(self.columns["date"][ind]),
+            "trade_price": self.columns["trade_price"][ind].astype("float64"),
+            "date_arr": np.array(self.columns["date_arr"][ind], dtype="float32"),
+        }
+        for feat_group_ind, num in raw_data_shape.items():
+            if feat_group_ind != "max":
+                k = str(feat_group_ind)
+                interval = obs_interval[k]
+                i0 = ind - num * interval
+                assert i0 >= 0, f"index {ind} too small for feature group {k}"
+                raw_data[k] = self.columns[k][i0 : ind + 1 : interval]
+        return raw_data
+
+    def get_raw_data_batch(self, raw_data_shape, obs_interval, inds):
+        """Get raw data for a batch of observations.
+
+        Args:
+            raw_data_shape (dict):
+                number of feature timesteps in the observation for each feature group
+            obs_interval (dict[int]):
+                number of trade_timesteps between each sample of feature
+            inds (np.array):
+                table index of each observation
+
+        Returns:
+            dict
+                same as get_raw_data but each value has an extra first dimension for
+                the batch
+
+        """
+        raw_data = {
+            "date": self.columns["date"][inds].astype("int64"),
+            "trade_price": self.columns["trade_price"][inds].astype("float64"),
+            "date_arr": self.columns["date_arr"][inds].astype("float32"),
+        }
+        table_inds = get_batch_table_inds(raw_data_shape, obs_interval, inds)
+        for k, group_inds in table_inds.items():
+            assert group_inds.min() >= 0, f"index too small for feature group {k}"
+            raw_data[k] = self.columns[k][group_inds]
+        return raw_data
+
+
+def make_data_backend(config, client):
+    """Make data backend.
+
+    Args:
+        config (Dict(pydantic.BaseModel|dict|Any)):
+            as defined in 'agent_config.py'
+        client (aerospike.Client):
+            client object for downloading records
+
+    Returns:
+        AerospikeDataBackend | MemmapDataBackend
+
+    """
+    backend = config["obs_store"].backend
+    if backend == "aerospike":
+        return AerospikeDataBackend(config, client)
+    elif backend == "memmap":
+        store_dir = get_obs_store_dir(config["obs_store"], config["paths"])
+        assert os.path.exists(
+            f"{store_dir}/meta.json",
+        ), f"obs store not found in {store_dir}, run export_obs_store first"
+        return MemmapDataBackend(config)
+    else:
+        raise ValueError(f"data backend {backend} not implemented")
@@ -15,22 +15,28 @@ from releat.gym_env.action_processor import build_action_map
 from releat.gym_env.action_processor import build_pos_arrs
 from releat.gym_env.action_processor import exec_action
 from releat.gym_env.action_processor import format_portfolio
+from releat.gym_env.data_backend import make_data_backend
 from releat.gym_env.mask import assess_must_actions
 from releat.gym_env.mask import make_mask
 from releat.gym_env.metrics import TradingMetrics
 from releat.gym_env.obs_processor import get_curr_price
 from releat.gym_env.obs_processor import get_obs
-from releat.gym_env.obs_processor import get_raw_data
+from releat.gym_env.obs_processor import make_obs_transform_chains
 
 
 class FxEnv(gym.Env):
     """Forex gym env."""
 
-    def __init__(self, config):
+    def __init__(self, config, client=None, data_backend=None):
         """Init.
 
         Args:
             env_config (dict)
+            client (aerospike.Client):
+                optional client, i.e. shared by the sub environments of FxVectorEnv
+            data_backend (AerospikeDataBackend | MemmapDataBackend):
+                optional data backend, i.e. shared by the sub environments of
+                FxVectorEnv
 
         Returns:
             None
@@ -43,7 +49,14 @@ class FxEnv(gym.Env):
         for k, v in config.items():
             setattr(self, k, v)
 
-        self.client = aerospike.client(self.aerospike.connection).connect()
+        if client is None:
+            client = aerospike.client(self.aerospike.connection).connect()
+        self.client = client
+        # hyperparameters are always read from aerospike, raw data can be read from
+        # aerospike or a local memory mapped store
+        if data_backend is None:
+            data_backend = make_data_backend(self.config, self.client)
+        self.data_backend = data_backend
 
         self.meta_data_key = (
             self.aerospike.namespace,
@@ -85,6 +98,7 @@ class FxEnv(gym.Env):
         raw_data_shape["max"] = max(lens)
         self.raw_data_shape = raw_data_shape
         self.obs_interval = obs_interval
+        self.transform_chains = make_obs_transform_chains(self.config)
 
     def initialize(self):
         """Initialize env.
@@ -103,6 +117,13 @@ class FxEnv(gym.Env):
                 if k not in ["is_training", "log_actions"]:
                     setattr(self, k, v)
 
+            # the exported store may be older than the database
+            if self.data_backend.max_data_ind is not None:
+                self.max_data_ind = min(
+                    self.max_data_ind,
+                    self.data_backend.max_data_ind,
+                )
+
             self.trading_metrics.set_max_repeat_num(self.max_ep_repeats)
 
             if self.is_training:
@@ -131,6 +152,44 @@ class FxEnv(gym.Env):
 
     def reset(self, *, seed=None, options=None):
         """Reset env."""
+        _ = self.reset_episode(seed)
+
+        self.data = self.data_backend.get_raw_data(
+            self.raw_data_shape,
+            self.obs_interval,
+            self.data_ind,
+        )
+        obs = get_obs(
+            self.config,
+            self.obs_interval,
+            self.data,
+            self.transform_chains,
+        )
+        
+        price = self.data["trade_price"]
+        self.curr_price = get_curr_price(self.symbol_info, price)
+
+        self.time_int = self.data["date"]
+        obs["mask"] = make_mask(
+            self.action_map,
+            self.portfolio,
+            self.stop_val,
+            False,
+            False,
+            self.mask_pos_size,
+            self.mask_pos_dir,
+        )
+        obs["pos_val"] = np.array(self.raw_pos_vals, dtype="float32")
+        return obs, {}
+
+    def reset_episode(self, seed=None):
+        """Reset episode.
+
+        Resets counters and metrics, and samples the episode masks and starting index.
+        Everything in reset except reading the data, so that FxVectorEnv can read the
+        data of all sub environments at once.
+
+        """
         _ = self.initialize()
         _ = self.trading_metrics.decide_repeat(
             self.win_rate_t,
@@ -181,38 +240,15 @@ class FxEnv(gym.Env):
             self.mask_pos_dir = 0
 
         self.trading_metrics.reset_metrics(self.start_ind)
-        
-        self.data = get_raw_data(self.config,
-            self.client,
-            self.raw_data_shape,
-            self.obs_interval,
-            self.data_ind)
-        obs = get_obs(self.config, self.obs_interval, self.data)
-        
-        price = self.data["trade_price"]
-        self.curr_price = get_curr_price(self.symbol_info, price)
-
-        self.time_int = self.data["date"]
-        obs["mask"] = make_mask(
-            self.action_map,
-            self.portfolio,
-            self.stop_val,
-            False,
-            False,
-            self.mask_pos_size,
-            self.mask_pos_dir,
-        )
-        obs["pos_val"] = np.array(self.raw_pos_vals, dtype="float32")
-        return obs, {}
 
     def _next_observation(self):
         """Next observation."""
         self.data_ind += self.skip_step
-        self.data = get_raw_data(self.config,
-            self.client,
+        self.data = self.data_backend.get_raw_data(
             self.raw_data_shape,
             self.obs_interval,
-            self.data_ind)
+            self.data_ind,
+        )
         
         # potentially a bit dodgy because of leaking future data into current timestep
         price = self.data["trade_price"]
@@ -226,7 +262,12 @@ class FxEnv(gym.Env):
             self.time_int,
             self.commission,
         )
-        obs = get_obs(self.config, self.obs_interval, deepcopy(self.data))
+        obs = get_obs(
+            self.config,
+            self.obs_interval,
+            self.data,
+            self.transform_chains,
+        )
         
         self.raw_pos_vals = self.raw_pos_vals[-1:]
 
@@ -382,3 +382,85 @@ def make_mask(
         mask = mask.astype("float32")
 
     return mask
+
+
+@njit(cache=True, nogil=True, fastmath=True)
+def batch_assess_must_actions(
+    portfolios,
+    ep_times,
+    max_ep_steps,
+    min_hold_times,
+    max_hold_times,
+    curr_data_inds,
+    max_data_inds,
+):
+    """Return must close and must hold for a batch of portfolios.
+
+    Calls assess_must_actions for each sub environment of a vector env.
+
+    """
+    num_envs = portfolios.shape[0]
+    must_hold = np.zeros(num_envs, dtype=np.bool_)
+    must_close = np.zeros(num_envs, dtype=np.bool_)
+    for i in range(num_envs):
+        must_hold[i], must_close[i] = assess_must_actions(
+            portfolios[i],
+            ep_times[i],
+            max_ep_steps[i],
+            min_hold_times[i],
+            max_hold_times[i],
+            curr_data_inds[i],
+            max_data_inds[i],
+        )
+    return must_hold, must_close
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def batch_make_mask(
+    action_map,
+    portfolios,
+    stop_losses,
+    must_hold,
+    must_close,
+    mask_pos_size,
+    mask_pos_dir,
+):
+    """Make masks for a batch of portfolios.
+
+    Calls make_mask for each sub environment of a vector env.
+
+    Args:
+        action_map (np.array)
+            columns: index , pos_dir: short (-1) or long (1),
+            order_type: open (1) or close (-1), pos_size
+        portfolios (np.array)
+            shape of (number of envs, number of positions, 13)
+        stop_losses (np.array)
+            stop loss of each env
+        must_hold (np.array)
+            whether force hold position in each env
+        must_close (np.array)
+            whether force close a position in each env
+        mask_pos_size (np.array)
+            whether to limit position size in each env
+        mask_pos_dir (np.array)
+            -1, 0 or 1 position direction mask of each env
+
+    Returns:
+        action_mask (np.array)
+            shape of (number of envs, number of actions)
+
+    """
+    num_envs = portfolios.shape[0]
+    masks = np.zeros((num_envs, len(action_map)), dtype="float32")
+    for i in range(num_envs):
+        masks[i] = make_mask(
+            action_map,
+            portfolios[i],
+            stop_losses[i],
+            must_hold[i],
+            must_close[i],
+            mask_pos_size[i],
+            mask_pos_dir[i],
+        )
+    return masks
@@ -6,7 +6,8 @@ from numba import njit
 
 from releat.data.simple.stats import apply_log_tail
 from releat.data.simple.stats import randint
-from releat.data.transformers import apply_transform
+from releat.data.transformers import apply_transform_chain
+from releat.data.transformers import make_transform_chain
 
 
 def get_raw_data(config, client, raw_data_shape, obs_interval, ind):
@@ -67,13 +68,40 @@ def get_raw_data(config, client, raw_data_shape, obs_interval, ind):
 
     return raw_data
 
-def get_obs(config, obs_interval, raw_data):
+def make_obs_transform_chains(config):
+    """Make obs transform chains.
+
+    The differencing feature of each feature group has one transform parameter per
+    row of the observation, so the differenced values are transformed as one row
+    with a column per observation row.
+
+    Args:
+        config (Dict(pydantic.BaseModel|dict|Any)):
+            as defined in 'agent_config.py'
+
+    Returns:
+        dict[tuple]
+            transform chain of each feature group, see make_transform_chain
+
+    """
+    transform_chains = {}
+    for feat_group_ind in range(len(config["features"])):
+        fc = config["features"][feat_group_ind].simple_features[0]
+        transform_chains[str(feat_group_ind)] = make_transform_chain(
+            fc.transforms,
+            fc.output_shape[0],
+        )
+    return transform_chains
+
+
+def get_obs(config, obs_interval, raw_data, transform_chains=None):
     """Get obs.
 
     # TODO make this parametric for feats + pips + multi symbol
 
     Gets gym observation from raw data, i.e. gets every X records depending
-    on the feature timeframe
+    on the feature timeframe. raw_data is not modified, so it can be a view of a
+    buffer or memory map.
 
     Args:
         config (Dict(pydantic.BaseModel|dict|Any)):
@@ -82,22 +110,26 @@ def get_obs(config, obs_interval, raw_data):
             the timeframe of each feature group
         raw_data (dict):
             raw data
+        transform_chains (dict[tuple] | None):
+            see make_obs_transform_chains, made from config if None
 
     Returns:
         dict
             gym observation (without static data such as date, positiov value, etc.)
 
     """
+    if transform_chains is None:
+        transform_chains = make_obs_transform_chains(config)
+
     obs = {}
     feat_group_inds = [x for x in obs_interval.keys()]
-    for k in feat_group_inds:
-        obs[k] = raw_data[k]
 
     for feat_group_ind in range(len(feat_group_inds)):
         feat_ind = 0
         feat_group = config["features"][feat_group_ind]
         fc = feat_group.simple_features[feat_ind]
-        feats = obs[str(feat_group_ind)][:, 0]
+        raw_feats = raw_data[str(feat_group_ind)]
+        feats = raw_feats[:, 0]
         feats = feats - feats[-1]
 
         symbol = fc.symbol
@@ -105,18 +137,62 @@ def get_obs(config, obs_interval, raw_data):
         pip = config["symbol_info"][symbol_index].pip
 
         feats = feats[:-1] / pip
-        feats = feats.reshape((-1, 1))
-        for tc in fc.transforms:
-            feats = apply_transform(feats, tc)
+        feats = feats.reshape((1, -1))
+        feats = apply_transform_chain(feats, *transform_chains[str(feat_group_ind)])
 
-        obs[str(feat_group_ind)] = obs[str(feat_group_ind)][1:]
-        obs[str(feat_group_ind)][:, 0] = feats[:, 0]
-        obs[str(feat_group_ind)] = obs[str(feat_group_ind)].astype("float32")
+        # astype copies, so the raw data is left untouched
+        group_obs = raw_feats[1:].astype("float32")
+        group_obs[:, 0] = feats[0]
+        obs[str(feat_group_ind)] = group_obs
 
     obs["date_arr"] = np.array(raw_data["date_arr"], dtype="float32")
     return obs
 
 
+def get_obs_batch(config, obs_interval, raw_data, transform_chains):
+    """Get obs for a batch.
+
+    Same as get_obs, but for a batch of raw data as returned by
+    get_raw_data_batch, i.e. each array has an extra first dimension for the env.
+
+    Args:
+        config (Dict(pydantic.BaseModel|dict|Any)):
+            as defined in 'agent_config.py'
+        obs_interval (dict):
+            the timeframe of each feature group
+        raw_data (dict):
+            batch of raw data
+        transform_chains (dict[tuple]):
+            see make_obs_transform_chains
+
+    Returns:
+        dict
+            batch of gym observations (without static data such as position value)
+
+    """
+    obs = {}
+    for feat_group_ind in range(len(obs_interval)):
+        k = str(feat_group_ind)
+        feat_group = config["features"][feat_group_ind]
+        fc = feat_group.simple_features[0]
+        raw_feats = raw_data[k]
+
+        symbol_index = config["symbol_info_index"][fc.symbol]
+        pip = config["symbol_info"][symbol_index].pip
+
+        # one row per env
+        feats = raw_feats[:, :, 0] - raw_feats[:, -1:, 0]
+        feats = feats[:, :-1] / pip
+        feats = apply_transform_chain(feats, *transform_chains[k])
+
+        group_obs = raw_feats[:, 1:].astype("float32")
+        group_obs[:, :, 0] = feats
+        obs[k] = group_obs
+
+    obs["date_arr"] = np.asarray(raw_data["date_arr"], dtype="float32")
+    return obs
+
+
 @njit("float32[:](float32[:])", nogil=True, cache=True, fastmath=True)
 def scale_pos_val(pos_val):
     """Scale pos val.
@@ -198,3 +274,44 @@ def get_curr_price(symbol_info, price):
         curr_price[i, 1] = sample_price(price[i * 4 + 2], price[i * 4 + 3], pip)
 
     return curr_price
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def sample_prices(prices, pip):
+    """Sample prices for a batch.
+
+    Args:
+        prices (np.array)
+            shape of (number of envs, number of symbols x 4), min / max bid and ask
+            of each symbol in the action window
+        pip (np.float)
+
+    Returns:
+        np.array
+            shape of (number of envs, number of symbols, [bid, ask])
+
+    """
+    num_symbols = prices.shape[1] // 4
+    curr_prices = np.zeros((prices.shape[0], num_symbols, 2), dtype="float32")
+    for j in range(prices.shape[0]):
+        for i in range(num_symbols):
+            curr_prices[j, i, 0] = sample_price(
+                prices[j, i * 4],
+                prices[j, i * 4 + 1],
+                pip,
+            )
+            curr_prices[j, i, 1] = sample_price(
+                prices[j, i * 4 + 2],
+                prices[j, i * 4 + 3],
+                pip,
+            )
+    return curr_prices
+
+
+def get_curr_prices(symbol_info, prices):
+    """Get curr prices for a batch.
+
+    number of envs x number of symbols x [bid,ask]
+
+    """
+    return sample_prices(prices[:, : len(symbol_info) * 4], symbol_info[0].pip)
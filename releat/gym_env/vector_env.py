@@ -0,0 +1,268 @@
+"""Vector gym env.
+
+Steps all the sub environments of a rollout worker together:
+- portfolios of all envs are stored in one (num_envs, num_positions, 13) array
+- actions, must actions and masks are each calculated in one jit call
+- raw data of all envs is read in one batched read
+- observations of all envs are transformed in one call
+
+Episode logic that only runs on reset (sampling the start index, hyperparameter
+reloads, repeat decisions) is delegated to one FxEnv per sub environment.
+
+"""
+from __future__ import annotations
+
+import aerospike
+import numpy as np
+from ray.rllib.env.vector_env import VectorEnv
+
+from releat.gym_env.action_processor import batch_exec_action
+from releat.gym_env.data_backend import make_data_backend
+from releat.gym_env.gym_env import FxEnv
+from releat.gym_env.mask import batch_assess_must_actions
+from releat.gym_env.mask import batch_make_mask
+from releat.gym_env.obs_processor import get_curr_prices
+from releat.gym_env.obs_processor import get_obs_batch
+from releat.gym_env.obs_processor import make_obs_transform_chains
+
+
+class FxVectorEnv(VectorEnv):
+    """Forex vector gym env."""
+
+    def __init__(self, config):
+        """Init.
+
+        The number of sub environments is rl_rollouts.num_envs_per_worker, so that
+        RLlib uses this env as is rather than creating copies.
+
+        Args:
+            config (dict)
+
+        Returns:
+            None
+
+        """
+        num_envs = config["rl_rollouts"].get("num_envs_per_worker", 1)
+
+        client = aerospike.client(config["aerospike"].connection).connect()
+        data_backend = make_data_backend(config, client)
+        self.envs = [FxEnv(config, client, data_backend) for _ in range(num_envs)]
+        self.data_backend = data_backend
+
+        env = self.envs[0]
+        self.config = env.config
+        self.action_map = env.action_map
+        self.symbol_info = env.symbol_info
+        self.raw_data_shape = env.raw_data_shape
+        self.obs_interval = env.obs_interval
+        self.transform_chains = make_obs_transform_chains(self.config)
+
+        # sub env portfolios are views of the batch so that resets apply to both
+        self.portfolios = np.stack([x.portfolio for x in self.envs])
+        for i in range(num_envs):
+            self.envs[i].portfolio = self.portfolios[i]
+
+        # episode state
+        self.data_inds = np.zeros(num_envs, dtype="int64")
+        self.ep_times = np.zeros(num_envs, dtype="int64")
+        self.rewards = np.zeros(num_envs, dtype="float64")
+        self.trade_journal_inds = np.zeros(num_envs, dtype="int64")
+        self.curr_prices = np.zeros((num_envs, len(self.symbol_info), 2), "float32")
+        self.time_ints = np.zeros(num_envs, dtype="int64")
+
+        # hyperparameters of each sub env, set on reset
+        self.params = {
+            "commission": np.zeros(num_envs, dtype="float64"),
+            "stop_val": np.zeros(num_envs, dtype="float64"),
+            "step_penalty": np.zeros(num_envs, dtype="float64"),
+            "skip_step": np.zeros(num_envs, dtype="int64"),
+            "max_ep_step": np.zeros(num_envs, dtype="int64"),
+            "min_hold_t": np.zeros(num_envs, dtype="int64"),
+            "max_hold_t": np.zeros(num_envs, dtype="int64"),
+            "max_data_ind": np.zeros(num_envs, dtype="int64"),
+            "max_trades": np.zeros(num_envs, dtype="int64"),
+            "min_ep_r": np.zeros(num_envs, dtype="float64"),
+            "max_ep_r": np.zeros(num_envs, dtype="float64"),
+            "is_training": np.zeros(num_envs, dtype=np.bool_),
+            "mask_pos_size": np.zeros(num_envs, dtype=np.bool_),
+            "mask_pos_dir": np.zeros(num_envs, dtype="int64"),
+        }
+        self.pos_val = np.zeros((1, 2 * len(self.symbol_info)), dtype="float32")
+
+        super().__init__(config["observation_space"], config["action_space"], num_envs)
+
+    def _reset_episode(self, index, seed=None):
+        """Reset the episode of one sub env and copy its state to the batch."""
+        env = self.envs[index]
+        _ = env.reset_episode(seed)
+        for k, v in self.params.items():
+            v[index] = getattr(env, k)
+        self.data_inds[index] = env.data_ind
+        self.ep_times[index] = 0
+        self.rewards[index] = 0
+        self.trade_journal_inds[index] = 0
+
+    def _get_obs(self, inds, is_step=False):
+        """Get observations.
+
+        Reads the data at the current index of the sub envs in inds and builds their
+        observations.
+
+        Args:
+            inds (np.array):
+                indexes of the sub envs
+            is_step (bool):
+                if True, inds must be all the sub envs, and the portfolios are
+                updated to the new prices before the must actions and masks are
+                calculated (same as FxEnv._next_observation). Otherwise nothing is
+                forced, same as FxEnv.reset
+
+        Returns:
+            list[dict]
+                observation of each env in inds
+
+        """
+        raw_data = self.data_backend.get_raw_data_batch(
+            self.raw_data_shape,
+            self.obs_interval,
+            self.data_inds[inds],
+        )
+        self.curr_prices[inds] = get_curr_prices(
+            self.symbol_info,
+            raw_data["trade_price"],
+        )
+        self.time_ints[inds] = raw_data["date"]
+
+        if is_step:
+            # update portfolio values at the new prices, i.e. action 0 = hold
+            _ = batch_exec_action(
+                self.action_map,
+                self.portfolios,
+                np.zeros(self.num_envs, dtype="int64"),
+                self.curr_prices,
+                self.time_ints,
+                self.params["commission"],
+            )
+            must_hold, must_close = batch_assess_must_actions(
+                self.portfolios,
+                self.ep_times,
+                self.params["max_ep_step"],
+                self.params["min_hold_t"],
+                self.params["max_hold_t"],
+                self.data_inds,
+                self.params["max_data_ind"],
+            )
+        else:
+            must_hold = np.zeros(len(inds), dtype=np.bool_)
+            must_close = np.zeros(len(inds), dtype=np.bool_)
+
+        obs = get_obs_batch(
+            self.config,
+            self.obs_interval,
+            raw_data,
+            self.transform_chains,
+        )
+
+        obs["mask"] = batch_make_mask(
+            self.action_map,
+            self.portfolios[inds],
+            self.params["stop_val"][inds],
+            must_hold,
+            must_close,
+            self.params["mask_pos_size"][inds],
+            self.params["mask_pos_dir"][inds],
+        )
+
+        obs_list = []
+        for i in range(len(inds)):
+            env_obs = {k: v[i] for k, v in obs.items()}
+            env_obs["pos_val"] = self.pos_val.copy()
+            obs_list.append(env_obs)
+        return obs_list
+
+    def vector_reset(self, *, seeds=None, options=None):
+        """Reset all sub envs."""
+        seeds = seeds or [None] * self.num_envs
+        for i in range(self.num_envs):
+            self._reset_episode(i, seeds[i])
+        obs = self._get_obs(np.arange(self.num_envs))
+        return obs, [{} for _ in range(self.num_envs)]
+
+    def reset_at(self, index=None, *, seed=None, options=None):
+        """Reset one sub env."""
+        index = 0 if index is None else index
+        self._reset_episode(index, seed)
+        obs = self._get_obs(np.array([index]))
+        return obs[0], {}
+
+    def restart_at(self, index=None):
+        """Restart one sub env."""
+        index = 0 if index is None else index
+        self.envs[index] = FxEnv(self.config, self.envs[index].client, self.data_backend)
+        self.envs[index].portfolio = self.portfolios[index]
+
+    def vector_step(self, actions):
+        """Execute actions of all sub envs.
+
+        Same logic as FxEnv.step and FxEnv._next_observation.
+
+        Args:
+            actions (list[int])
+                action taken by the agent in each sub env
+
+        Returns:
+            tuple of lists
+                observations, rewards, terminateds, truncateds, infos
+
+        """
+        actions = np.asarray(actions, dtype="int64")
+        # portfolios are modified in place, so the sub env views stay valid
+        _, reward, _, has_entry = batch_exec_action(
+            self.action_map,
+            self.portfolios,
+            actions,
+            self.curr_prices,
+            self.time_ints,
+            self.params["commission"],
+        )
+        self.trade_journal_inds += has_entry
+
+        for i in range(self.num_envs):
+            _ = self.envs[i].trading_metrics.update_metrics(
+                reward[i],
+                self.rewards[i] + reward[i],
+            )
+
+        # TODO abstract reward function
+        # step penalty
+        reward -= self.params["step_penalty"]
+        reward = np.clip(reward / 30, -10.0, 10.0)
+
+        done = self.trade_journal_inds >= self.params["max_trades"]
+        done = done | (self.ep_times >= self.params["max_ep_step"])
+        done = done | (self.rewards < self.params["min_ep_r"])
+        done = done | (self.rewards > self.params["max_ep_r"])
+        done = done & self.params["is_training"]
+        # if end of available data
+        done = done | (self.data_inds >= self.params["max_data_ind"] - 10)
+        # no open positions (i.e. sum of pos_size = 0)
+        done = done & (self.portfolios[:, :, 5].sum(axis=1) == 0)
+
+        # update counters and state
+        self.ep_times += 1
+        self.data_inds += 1 + self.params["skip_step"]
+        self.rewards += reward
+
+        obs = self._get_obs(np.arange(self.num_envs), is_step=True)
+
+        return (
+            obs,
+            reward.tolist(),
+            done.tolist(),
+            [False] * self.num_envs,
+            [{} for _ in range(self.num_envs)],
+        )
+
+    def get_sub_environments(self):
+        """Get sub environments."""
+        return self.envs
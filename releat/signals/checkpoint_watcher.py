@@ -0,0 +1,186 @@
+"""Checkpoint watcher.
+
+Hot reload of the RL agent while it is being trained:
+
+- train_rl_agent writes a manifest after each checkpoint is completely saved, so a
+  checkpoint that is only in the manifest is never partially written
+- CheckpointWatcher polls the manifest in a daemon thread and loads the policy
+  weights of a new checkpoint, off the signal loop
+- RLActor swaps the loaded weights into its policy between predictions, see
+  releat.signals.rl_actor.RLActor.swap_policy
+
+"""
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import threading
+from time import sleep
+from time import time
+
+from releat.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# written in the algo_dir next to the checkpoint folders, so it must not match the
+# checkpoint* glob of train_rl_agent and RLActor.reload_checkpoint
+CHECKPOINT_MANIFEST = "latest_checkpoint.json"
+
+
+def write_checkpoint_manifest(algo_dir, checkpoint_dir):
+    """Write checkpoint manifest.
+
+    The manifest is replaced in one rename, so readers see either the old or the new
+    manifest.
+
+    Args:
+        algo_dir (str):
+            folder of the rl algo checkpoints
+        checkpoint_dir (str):
+            folder of the completely saved checkpoint, i.e. the path returned by
+            trainer.save(algo_dir)
+
+    """
+    manifest = {
+        "checkpoint_id": os.path.basename(os.path.normpath(checkpoint_dir)),
+        "path": checkpoint_dir,
+        "time": time(),
+    }
+    tmp_f = f"{algo_dir}/{CHECKPOINT_MANIFEST}.tmp"
+    with open(tmp_f, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_f, f"{algo_dir}/{CHECKPOINT_MANIFEST}")
+
+
+def read_checkpoint_manifest(algo_dir):
+    """Read checkpoint manifest.
+
+    Args:
+        algo_dir (str):
+            folder of the rl algo checkpoints
+
+    Returns:
+        dict | None
+            checkpoint_id, path and time of the latest checkpoint, None if no
+            checkpoint has been saved with a manifest
+
+    """
+    manifest_f = f"{algo_dir}/{CHECKPOINT_MANIFEST}"
+    if not os.path.exists(manifest_f):
+        return None
+    with open(manifest_f) as f:
+        return json.load(f)
+
+
+def load_policy_weights(checkpoint_dir, policy_id="default_policy"):
+    """Load policy weights.
+
+    Reads the weights from the policy state of an rllib checkpoint without building
+    a policy.
+
+    Args:
+        checkpoint_dir (str):
+            folder of the checkpoint
+        policy_id (str):
+            policy in the checkpoint
+
+    Returns:
+        dict[np.array]
+            weights of the model, see ray.rllib.policy.Policy.set_weights
+
+    """
+    with open(f"{checkpoint_dir}/policies/{policy_id}/policy_state.pkl", "rb") as f:
+        return pickle.load(f)["weights"]
+
+
+class CheckpointWatcher:
+    """Loads the weights of new checkpoints in the background."""
+
+    def __init__(self, algo_dir, checkpoint_id=None, load_weights=load_policy_weights):
+        """Init.
+
+        Args:
+            algo_dir (str):
+                folder of the rl algo checkpoints
+            checkpoint_id (str | None):
+                id of the checkpoint that is already active
+            load_weights (callable):
+                load_weights(checkpoint_dir) returns the weights of the checkpoint
+
+        """
+        self.algo_dir = algo_dir
+        self.load_weights = load_weights
+        # latest checkpoint that is loaded, whether or not it has been swapped in
+        self.checkpoint_id = checkpoint_id
+        self.standby = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def step(self):
+        """Load the latest checkpoint if it is new.
+
+        Returns:
+            bool
+                True if a new checkpoint is loaded
+
+        """
+        manifest = read_checkpoint_manifest(self.algo_dir)
+        if (manifest is None) or (manifest["checkpoint_id"] == self.checkpoint_id):
+            return False
+
+        t0 = time()
+        weights = self.load_weights(manifest["path"])
+        with self.lock:
+            # replaces a standby that has not been swapped in yet
+            self.standby = {**manifest, "weights": weights, "t0": t0}
+        self.checkpoint_id = manifest["checkpoint_id"]
+        logger.info(f"checkpoint {self.checkpoint_id} loaded in {time() - t0:.2f}s")
+        return True
+
+    def pop_standby(self):
+        """Pop standby.
+
+        Returns:
+            dict | None
+                checkpoint_id, path, weights and the time t0 when loading started of
+                the latest loaded checkpoint, None if there is no new checkpoint
+
+        """
+        with self.lock:
+            standby, self.standby = self.standby, None
+        return standby
+
+    def run(self, interval=5.0):
+        """Watch the manifest until stop is called.
+
+        Args:
+            interval (float):
+                seconds between reads of the manifest
+
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.warning(f"checkpoint reload failed {str(repr(e))}")
+            sleep(interval)
+
+    def start(self, interval=5.0):
+        """Run in a daemon thread.
+
+        Args:
+            interval (float):
+                seconds between reads of the manifest
+
+        Returns:
+            threading.Thread
+
+        """
+        thread = threading.Thread(target=self.run, args=(interval,), daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop run."""
+        self.stop_event.set()
@@ -13,9 +13,11 @@ from copy import deepcopy
 import numpy as np
 import pandas as pd
 
+from releat.data.incremental import IncrementalFeatureEngine
 from releat.data.inference import init_feature_dict
 from releat.data.inference import make_feature_obs
 from releat.data.inference import update_feature_dict
+from releat.data.tick_buffer import TickRingBuffer
 from releat.gym_env.action_processor import build_action_map
 from releat.gym_env.action_processor import build_pos_arrs
 from releat.gym_env.mask import make_mask
@@ -56,6 +58,9 @@ class FeatureBuilder:
         # feature data in intervals of the trade timeframe
         self.feature_data = None
 
+        # updates feature_data from the new ticks, see init_feature_engine
+        self.feature_engine = None
+
         # feature data in intervals of the interval timeframe
         self.gym_data = None
 
@@ -107,21 +112,46 @@ class FeatureBuilder:
 
             logger.info(f"updating tick feature: {self.now} > {next_feat_t}")
             # updates the last record of the feature data
-            self.feature_data = update_feature_dict(
-                self.config,
-                self.tick_data,
-                self.feature_data,
-                next_feat_t,
-            )
+            if self.feature_engine is not None:
+                self.feature_engine.update(next_feat_t)
+            else:
+                self.feature_data = update_feature_dict(
+                    self.config,
+                    self.tick_data,
+                    self.feature_data,
+                    next_feat_t,
+                )
             # a bit hacky but used to capture sparse records at the session open with
             # no tick data
             if next_feat_t > last_feature_t:
                 # prevent infinite loop if no tick data at session open
                 last_feature_t = next_feat_t
+            elif self.feature_engine is not None:
+                last_feature_t = self.feature_engine.last_time()
             else:
                 # updates last feature time
                 last_feature_t = pd.to_datetime(self.feature_data[0][0]["time_msc"][-1])
 
+        if self.feature_engine is not None:
+            self.feature_data = self.feature_engine.feature_data
+
+    def init_feature_engine(self):
+        """Initialise the incremental feature engine.
+
+        Only used if enabled in the tick_stream config and the tick data is held in
+        tick buffers, otherwise update_feature_dict is used.
+
+        """
+        self.feature_engine = None
+        is_buffer = all(isinstance(v, TickRingBuffer) for v in self.tick_data.values())
+        if self.config.tick_stream.incremental_features and is_buffer:
+            self.feature_engine = IncrementalFeatureEngine(
+                self.config,
+                self.tick_data,
+                self.feature_data,
+                resync_steps=self.config.tick_stream.resync_steps,
+            )
+
     def init_feature_data(self):
         """Initialise data.
 
@@ -141,6 +171,8 @@ class FeatureBuilder:
             with open(f, "wb") as fobj:
                 cPickle.dump(self.feature_data, fobj)
 
+        self.init_feature_engine()
+
         # update tick based feature data
         _ = self.partial_update_feature_data()
 
@@ -1,15 +1,27 @@
 """Predicts action."""
 from __future__ import annotations
 
+import os
 from glob import glob
+from time import time
 
+import numpy as np
 import ray
 from ray.rllib.algorithms.impala import ImpalaConfig as RLAlgorithmConfig
+from ray.rllib.connectors.agent.obs_preproc import ObsPreprocessorConnector
 from ray.rllib.models import ModelCatalog
+from ray.rllib.policy.sample_batch import DEFAULT_POLICY_ID
+from ray.rllib.policy.sample_batch import SampleBatch
+from ray.rllib.utils.typing import AgentConnectorDataType
 
 from releat.gym_env.action_processor import build_action_map
 from releat.gym_env.gym_env import FxEnv
+from releat.signals.checkpoint_watcher import CheckpointWatcher
+from releat.signals.checkpoint_watcher import read_checkpoint_manifest
 from releat.utils.configs.config_builder import load_config
+from releat.utils.logging import get_logger
+
+logger = get_logger(__name__)
 
 
 class RLActor:
@@ -79,19 +91,141 @@ class RLActor:
         self.config = config
         self.action_map = build_action_map(config.trader)
         self.checkpoint = ""
+        # id of the checkpoint whose weights are in the policy
+        self.checkpoint_id = None
+        # seconds from starting to load the active checkpoint to swapping it in
+        self.reload_latency = None
+        self.watcher = None
 
     def reload_checkpoint(self):
         """Reload checkpoint.
 
-        Looks for the latest RL checkpoint and loads it. This will fail sometimes when
-        the agent is being trained simultaneously and the predictor attempts to
-        load a partially saved files.
+        Loads the latest checkpoint in the manifest that is written by train_rl_agent.
+        Without a manifest it looks for the latest RL checkpoint, which will fail
+        sometimes when the agent is being trained simultaneously and the predictor
+        attempts to load a partially saved files.
 
         """
-        files = sorted(glob(f"{self.config.paths.algo_dir}/checkpoint*"))
-        checkpoint_f = sorted(glob(f"{files[-1]}/*"))
-        self.checkpoint = checkpoint_f[0]
+        t0 = time()
+        manifest = read_checkpoint_manifest(self.config.paths.algo_dir)
+        if manifest is not None:
+            self.checkpoint = manifest["path"]
+            self.checkpoint_id = manifest["checkpoint_id"]
+        else:
+            files = glob(f"{self.config.paths.algo_dir}/checkpoint*")
+            files = sorted(f for f in files if os.path.isdir(f))
+            checkpoint_f = sorted(glob(f"{files[-1]}/*"))
+            self.checkpoint = checkpoint_f[0]
+            self.checkpoint_id = files[-1].split("/")[-1]
         self.trainer.restore(self.checkpoint)
+        self.reload_latency = time() - t0
+
+    def start_checkpoint_watcher(self, interval=5.0):
+        """Start checkpoint watcher.
+
+        New checkpoints are loaded in a background thread and swapped in before the
+        next prediction, so that the signal loop is not stalled by trainer.restore.
+        See releat.signals.checkpoint_watcher.
+
+        Args:
+            interval (float):
+                seconds between checks for a new checkpoint
+
+        """
+        self.watcher = CheckpointWatcher(self.config.paths.algo_dir, self.checkpoint_id)
+        _ = self.watcher.start(interval)
+
+    def swap_policy(self):
+        """Swap policy.
+
+        Sets the weights of the latest checkpoint loaded by the watcher. Called
+        between predictions, so a prediction never uses a mix of two checkpoints.
+
+        Returns:
+            bool
+                True if a new checkpoint is swapped in
+
+        """
+        standby = None if self.watcher is None else self.watcher.pop_standby()
+        if standby is None:
+            return False
+
+        self.trainer.get_policy().set_weights(standby["weights"])
+        self.checkpoint = standby["path"]
+        self.checkpoint_id = standby["checkpoint_id"]
+        self.reload_latency = time() - standby["t0"]
+        logger.info(
+            f"checkpoint {self.checkpoint_id} active, reload {self.reload_latency:.2f}s",
+        )
+        return True
+
+    def get_obs_preprocessor(self, policy):
+        """Get obs preprocessor.
+
+        Only the observation preprocessor is applied to the observations, i.e. the
+        flattening of the dict observation. Other agent connectors, such as
+        observation filters, are not applied.
+
+        Args:
+            policy (ray.rllib.policy.Policy):
+                policy of the trainer
+
+        Returns:
+            callable
+                function that preprocesses the gym observation of one variant
+
+        Raises:
+            ValueError:
+                if neither the policy connectors nor the rollout worker have an
+                observation preprocessor
+
+        """
+        if policy.agent_connectors is not None:
+            connectors = policy.agent_connectors[ObsPreprocessorConnector]
+            if len(connectors) > 0:
+                obs_preproc = connectors[0]
+
+                def preprocess(gym_obs):
+                    ac_data = AgentConnectorDataType(0, 0, {SampleBatch.OBS: gym_obs})
+                    return obs_preproc.transform(ac_data).data[SampleBatch.OBS]
+
+                return preprocess
+
+        # without connectors, the preprocessors are set on the rollout worker
+        worker = self.trainer.workers.local_worker()
+        preprocessor = (worker.preprocessors or {}).get(DEFAULT_POLICY_ID)
+        if preprocessor is None:
+            raise ValueError("the policy has no observation preprocessor")
+        return preprocessor.transform
+
+    def predict_batch(self, obs_batch):
+        """Predict batch.
+
+        The observations are preprocessed and stacked into one batch, so the model
+        runs one forward pass for all of them. The observations are flattened by the
+        obs preprocessor connector of the policy, or by the preprocessor of the
+        rollout worker when connectors are disabled, see get_obs_preprocessor.
+
+        Args:
+            obs_batch (dict[dict]):
+                gym observation of each variant, i.e. the same features with the
+                pos_val and mask of different positions
+
+        Returns:
+            dict[tuple]
+                action and action distribution inputs of each variant
+
+        """
+        policy = self.trainer.get_policy()
+        preprocess = self.get_obs_preprocessor(policy)
+        obs = [preprocess(gym_obs) for gym_obs in obs_batch.values()]
+
+        actions, _, infos = policy.compute_actions_from_input_dict(
+            {SampleBatch.OBS: np.stack(obs)},
+            explore=False,
+        )
+        dists = infos["action_dist_inputs"]
+        return {k: (int(actions[i]), dists[i]) for i, k in enumerate(obs_batch)}
 
     def predict(self, gym_obs_data):
         """Predict.
@@ -110,44 +244,28 @@ class RLActor:
                 and hedge cases
 
         """
+        _ = self.swap_policy()
+
         pos_val_hedge = gym_obs_data.pop("pos_val_hedge")
         mask_hedge = gym_obs_data.pop("mask_hedge")
 
         pos_val_no_pos = gym_obs_data.pop("pos_val_no_pos")
         mask_no_pos = gym_obs_data.pop("mask_no_pos")
 
-        # with proper mask
-        act_pos, _, act_dist_pos = self.trainer.compute_single_action(
-            gym_obs_data,
-            explore=False,
-            full_fetch=True,
-        )
-
-        # no pos
-        gym_obs_data["mask"] = mask_no_pos
-        gym_obs_data["pos_val"] = pos_val_no_pos
-        act_no_pos, _, act_dist_no_pos = self.trainer.compute_single_action(
-            gym_obs_data,
-            explore=False,
-            full_fetch=True,
-        )
-
-        # hedge
-        gym_obs_data["mask"] = mask_hedge
-        gym_obs_data["pos_val"] = pos_val_hedge
-        act_hedge, _, act_dist_hedge = self.trainer.compute_single_action(
-            gym_obs_data,
-            explore=False,
-            full_fetch=True,
-        )
-
-        out = {
-            "action_pos": int(act_pos),
-            "action_no_pos": int(act_no_pos),
-            "action_hedge": int(act_hedge),
-            "action_dist_pos": act_dist_pos["action_dist_inputs"].tolist(),
-            "action_dist_no_pos": act_dist_no_pos["action_dist_inputs"].tolist(),
-            "action_dist_hedge": act_dist_hedge["action_dist_inputs"].tolist(),
-            "checkpoint": self.checkpoint,
+        # the variants share the features and differ in position and mask
+        obs_batch = {
+            "pos": gym_obs_data,
+            "no_pos": {**gym_obs_data, "mask": mask_no_pos, "pos_val": pos_val_no_pos},
+            "hedge": {**gym_obs_data, "mask": mask_hedge, "pos_val": pos_val_hedge},
         }
+        preds = self.predict_batch(obs_batch)
+
+        out = {}
+        for k, (action, _) in preds.items():
+            out[f"action_{k}"] = action
+        for k, (_, action_dist) in preds.items():
+            out[f"action_dist_{k}"] = action_dist.tolist()
+        out["checkpoint"] = self.checkpoint
+        out["checkpoint_id"] = self.checkpoint_id
+        out["reload_latency"] = self.reload_latency
         return out
@@ -43,9 +43,10 @@ class SignalGenerator:
             decode_responses=True,
         )
 
-        # load rl agent
+        # load rl agent, later checkpoints are loaded in the background
         self.rla = RLActor(agent_version, address="local")
         self.rla.reload_checkpoint()
+        self.rla.start_checkpoint_watcher()
 
         # tick handler extracts and aggregates data from mt5
         self.th = TickHandler(agent_version, symbol="general")
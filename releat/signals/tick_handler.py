@@ -18,15 +18,19 @@ from __future__ import annotations
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
+from time import time
 
 import pandas as pd
 import pytz
 import requests
 
 from releat.data.extractor import download_tick_data
-from releat.data.utils import update_tick_data
+from releat.data.tick_buffer import TickRingBuffer
 from releat.gym_env.action_processor import build_action_map
 from releat.gym_env.action_processor import build_pos_arrs
+from releat.signals.tick_stream import get_tick_channel
+from releat.signals.tick_stream import LocalTickChannel
+from releat.signals.tick_stream import TickSubscriber
 from releat.utils.configs.config_builder import load_config
 from releat.utils.configs.constants import mt5_api_port_map
 from releat.utils.configs.constants import mt5_creds
@@ -39,12 +43,16 @@ logger = get_logger(__name__)
 class TickHandler:
     """Tick data handler."""
 
-    def __init__(self, agent_version):
+    def __init__(self, agent_version, channel=None):
         """Init.
 
         Args:
             agent_version (str):
                 i.e. 't00001'
+            channel (RedisTickChannel | LocalTickChannel | None):
+                channel to read new ticks from, see releat.signals.tick_stream.
+                Defaults to the tick_stream config if it is enabled, otherwise new ticks
+                are requested from the mt5 api at each update
 
         """
         self.tick_data = None
@@ -76,6 +84,114 @@ class TickHandler:
             _ = requests.post(f"http://127.0.0.1:{port}/init", json=mt5_config)
 
         self.executor = ThreadPoolExecutor(len(self.config.symbol_info))
+        self.broker_symbols = {
+            f"{si.broker}_{si.symbol}": (si.broker, si.symbol)
+            for si in self.config.symbol_info
+        }
+
+        # subscribe before the tick data is initialised, so that no ticks are missed
+        # between the initial download and the stream
+        self.subscriber = None
+        if (channel is None) and self.config.tick_stream.enabled:
+            channel = get_tick_channel(self.config)
+        if channel is not None:
+            if not isinstance(channel, LocalTickChannel):
+                self.start_streams()
+            broker_symbols = [(si.broker, si.symbol) for si in self.config.symbol_info]
+            self.subscriber = TickSubscriber(channel, broker_symbols)
+        self.joined_streams = set()
+
+    def start_streams(self):
+        """Start publishing new ticks in the mt5 api of each symbol."""
+        for si in self.config.symbol_info:
+            port = mt5_api_port_map[si.broker][si.symbol]
+            payload = {
+                "broker": si.broker,
+                "symbol": si.symbol,
+                "host": self.config.redis.host,
+                "port": self.config.redis.port,
+                "maxlen": self.config.tick_stream.maxlen,
+                "interval": self.config.tick_stream.interval,
+            }
+            resp = requests.post(f"http://127.0.0.1:{port}/start_stream", json=payload)
+            logger.info(f"{si.broker} {si.symbol} tick stream {resp.json()}")
+
+    def append_stream_ticks(self, block_ms=0):
+        """Append new ticks from the tick stream.
+
+        Args:
+            block_ms (int):
+                time to wait if there are no new ticks
+
+        """
+        new_ticks = self.subscriber.poll(block_ms)
+        for broker_symbol, df in new_ticks.items():
+            tick_buffer = self.tick_data[broker_symbol]
+            if broker_symbol not in self.joined_streams:
+                # the initial download ends after the stream started, so the ticks
+                # from the first streamed tick onwards are taken from the stream
+                tick_buffer.drop_from(df["time_msc"][0])
+                self.joined_streams.add(broker_symbol)
+            i0 = 0
+            for i in self.subscriber.gaps.get(broker_symbol, []):
+                tick_buffer.append(df[i0:i])
+                self.backfill_gap(broker_symbol, df["time_msc"][i])
+                i0 = i
+            tick_buffer.append(df[i0:])
+            tick_buffer.trim()
+
+    def backfill_gap(self, broker_symbol, t1):
+        """Backfill ticks that are missing from the tick stream.
+
+        Downloads the ticks from the last tick in the buffer up to the first tick
+        after the gap.
+
+        Args:
+            broker_symbol (str):
+                '{broker}_{symbol}'
+            t1 (datetime.datetime):
+                time of the first streamed tick after the gap
+
+        """
+        tick_buffer = self.tick_data[broker_symbol]
+        if len(tick_buffer) == 0:
+            return
+        broker, symbol = self.broker_symbols[broker_symbol]
+        # mt5 ignores microseconds, so the ticks from the last second are replaced
+        dt0 = tick_buffer.last_time().floor("s")
+        result = download_tick_data(
+            broker,
+            symbol,
+            dt0,
+            pd.Timestamp(t1).ceil("s") + pd.Timedelta(seconds=1),
+            self.config.raw_data.data_mode,
+            False,
+        )
+        if "tick_df" not in result:
+            logger.warning(f"{broker_symbol} tick stream gap not backfilled {result}")
+            return
+        tick_df = result["tick_df"]
+        tick_df = tick_df[(tick_df["time_msc"] >= dt0) & (tick_df["time_msc"] < t1)]
+        tick_buffer.drop_from(dt0)
+        tick_buffer.append(tick_df)
+        logger.info(f"{broker_symbol} tick stream gap backfilled {len(tick_df)} ticks")
+
+    def is_stream_behind(self, dt1):
+        """Is stream behind.
+
+        Args:
+            dt1 (datetime.datetime):
+                trade time
+
+        Returns:
+            bool
+                True if a symbol has no tick at or after dt1
+
+        """
+        return any(
+            (len(tick_buffer) == 0) or (tick_buffer.last_time() < dt1)
+            for tick_buffer in self.tick_data.values()
+        )
 
     def init_tick_data(self, dt1, hour_delta=72):
         """Initialise tick data.
@@ -103,52 +219,57 @@ class TickHandler:
 
         args = []
         for si in self.config.symbol_info:
-            args = [si.broker, si.symbol]
             # TODO add in some broker timezone calculations
-            args += [dt0, dt1]
-            args += [self.config.raw_data.data_mode, False]
+            args.append([si.broker, si.symbol, dt0, dt1, self.config.raw_data.data_mode])
 
-        # TODO check that this is correct for futures
-        cols = ["ask", "bid", "flags", "last", "time_msc", "volume", "volume_real"]
-        for result in self.executor.map(lambda p: download_tick_data(*p), args):
-            tick_df = result["tick_df"][cols]
-            broker = result["broker"]
-            symbol = result["symbol"]
-            self.tick_data[f"{broker}_{symbol}"] = tick_df
+        capacity = self.config.tick_stream.buffer_capacity
+        for result in self.executor.map(lambda p: download_tick_data(*p, False), args):
+            tick_buffer = TickRingBuffer(capacity)
+            tick_buffer.append(result["tick_df"])
+            self.tick_data[f"{result['broker']}_{result['symbol']}"] = tick_buffer
 
     def update_tick_data(self, dt1):
         """Update tick data.
 
-        Download tick data delta between existing data and new datetime.
+        Download tick data delta between existing data and new datetime. If the tick
+        stream is used, the new ticks are appended from the stream instead, until
+        each symbol has a tick at or after dt1 or tick_stream.wait_timeout has passed.
 
         Args:
             dt1 (str):
                 new datetime for pulling data in the format "%Y-%m-%d %H:%M:%S.%f"
 
         """
-        new_data = {}
+        dt1 = datetime.strptime(dt1, "%Y-%m-%d %H:%M:%S.%f")
+        if self.subscriber is not None:
+            self.append_stream_ticks()
+            t_wait = time() + self.config.tick_stream.wait_timeout
+            while self.is_stream_behind(dt1) and (time() < t_wait):
+                self.append_stream_ticks(block_ms=max(int((t_wait - time()) * 1000), 1))
+            return
+
         dt0s = {}
         args = []
         for si in self.config.symbol_info:
-            old_df = self.tick_data[f"{si.broker}_{si.symbol}"]
-            dt0 = old_df["time_msc"].iloc[-1]
+            dt0 = self.tick_data[f"{si.broker}_{si.symbol}"].last_time()
             dt0s[f"{si.broker}_{si.symbol}"] = dt0
             dt0 = dt0.replace(microsecond=0)
 
-            args = [si.broker, si.symbol]
             # TODO add in some broker timezone calculations
-            args += [dt0, dt1]
-            args += [self.config.raw_data.data_mode, False]
-
-        # TODO check that this is correct for futures
-        cols = ["ask", "bid", "flags", "last", "time_msc", "volume", "volume_real"]
-        for result in self.executor.map(lambda p: download_tick_data(*p), args):
-            broker = result["broker"]
-            symbol = result["symbol"]
-            tick_df = result["tick_df"][cols]
-            dt0 = pd.to_datetime(dt0s[f"{broker}_{symbol}"]).replace(microsecond=0)
+            args.append([si.broker, si.symbol, dt0, dt1, self.config.raw_data.data_mode])
+
+        for result in self.executor.map(lambda p: download_tick_data(*p, False), args):
+            broker_symbol = f"{result['broker']}_{result['symbol']}"
+            if "tick_df" not in result:
+                continue
+            # mt5 ignores microseconds, so the ticks from the last second are replaced
+            dt0 = dt0s[broker_symbol].replace(microsecond=0)
+            tick_df = result["tick_df"]
             tick_df = tick_df[tick_df["time_msc"] >= dt0]
-            self.new_data[f"{broker}_{symbol}"] = tick_df
+            tick_buffer = self.tick_data[broker_symbol]
+            tick_buffer.drop_from(dt0)
+            tick_buffer.append(tick_df)
+            tick_buffer.trim()
 
         # for symbol in self.symbols:
         #     old_df = self.tick_data[f"{symbol}"]
@@ -169,14 +290,12 @@ class TickHandler:
 
         #     df = df[df["time_msc"] >= pd.to_datetime(dt0)]
         #     new_data[symbol] = df
-        self.tick_data = update_tick_data(self.tick_data, new_data)
 
         self.check_data = {}
-        for broker_symbol in self.tick_data.keys():
-            df = self.tick_data[broker_symbol]
-            idx = df[df["time_msc"] == dt0s[broker_symbol]].index.tolist()[0]
-            idx -= 10
-            self.check_data[broker_symbol] = self.tick_data[broker_symbol].loc[idx:]
+        for broker_symbol, tick_buffer in self.tick_data.items():
+            idx = tick_buffer.index(dt0s[broker_symbol]) - 10
+            df = tick_buffer.to_frame(i0=idx).to_pandas()
+            self.check_data[broker_symbol] = df
 
         # return self.tick_data
 
@@ -188,9 +307,17 @@ class TickHandler:
         ignored or there might be increased latency, leading to duplicate
         or missing data.
 
+        With the tick stream, duplicates and gaps are found by the sequence numbers of
+        the ticks instead.
+
         """
-        # TODO check that this is correct for futures
-        cols = ["ask", "bid", "flags", "last", "time_msc", "volume", "volume_real"]
+        if self.subscriber is not None:
+            logger.info(
+                f"tick stream duplicates: {self.subscriber.num_duplicates},"
+                f" missing: {self.subscriber.num_missing}",
+            )
+            return
+
         for si in self.config.symbol_info:
             # updated df
             udf = self.check_data[f"{si.broker}_{si.symbol}"]
@@ -208,7 +335,7 @@ class TickHandler:
                 False,
             )
 
-            tick_df = result["tick_df"][cols]
+            tick_df = result["tick_df"][udf.columns]
 
             # ignore leading and trailing records de to microseconds
             tick_df = tick_df[tick_df["time_msc"] > pd.to_datetime(dt0)]
@@ -220,7 +347,9 @@ class TickHandler:
             udf.reset_index(drop=True, inplace=True)
 
             # assert that the concatenated ticks are the same as the downloaded ticks
-            if not pd.testing.assert_frame_equal(udf, tick_df):
+            try:
+                pd.testing.assert_frame_equal(udf, tick_df, check_dtype=False)
+            except AssertionError:
                 dt0 = dt0.strftime("%Y-%m-%d %H:%M:%S.%f")
                 dt1 = dt1.strftime("%Y-%m-%d %H:%M:%S.%f")
                 print(f"Error data append error: {dt0} - {dt1}")
@@ -0,0 +1,451 @@
+"""Tick stream.
+
+Streams new ticks from the mt5 api to the signal generator, instead of polling
+the mt5 api for a time range at each trade timestep.
+
+- TickPublisher runs in the mt5 api process (see /start_stream in apis/mt5.py),
+  polls mt5 for new ticks and publishes them in batches to a channel
+- TickSubscriber reads the batches of each symbol, see TickHandler
+
+Each tick has a sequence number per broker and symbol. A batch holds consecutive
+sequence numbers, so that duplicates and gaps are found by comparing the first
+sequence number of a batch with the last one that was read.
+
+Channels:
+- RedisTickChannel, a redis stream per broker and symbol
+- LocalTickChannel, in memory, for tests. It can not be set in the config, since
+  the mt5 api runs in another process, and is passed to TickHandler instead
+
+Batches are sent as arrow ipc streams of tick_columns.
+
+"""
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from time import sleep
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import redis
+
+from releat.utils.configs.constants import tick_columns
+from releat.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def get_stream_key(broker, symbol):
+    """Get stream key.
+
+    Args:
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+
+    Returns:
+        str
+            name of the channel of the symbol
+
+    """
+    return f"ticks:{broker}:{symbol}"
+
+
+def table_to_ipc(table):
+    """Table to ipc.
+
+    Args:
+        table (pa.Table):
+            batch of ticks
+
+    Returns:
+        bytes
+            arrow ipc stream
+
+    """
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ipc_to_table(data):
+    """Ipc to table.
+
+    Args:
+        data (bytes):
+            arrow ipc stream
+
+    Returns:
+        pa.Table
+            batch of ticks
+
+    """
+    with pa.ipc.open_stream(data) as reader:
+        return reader.read_all()
+
+
+class LocalTickChannel:
+    """In memory tick channel.
+
+    Can be shared by threads of one process, i.e. a publisher replaying ticks in tests.
+
+    """
+
+    def __init__(self):
+        """Init."""
+        self.batches = defaultdict(list)
+        self.cond = threading.Condition()
+
+    def publish(self, key, first_seq, table):
+        """Publish a batch of ticks.
+
+        Args:
+            key (str):
+                see get_stream_key
+            first_seq (int):
+                sequence number of the first tick of the batch
+            table (pa.Table):
+                batch of ticks
+
+        """
+        with self.cond:
+            self.batches[key].append((first_seq, table))
+            self.cond.notify_all()
+
+    def last_seq(self, key):
+        """Last seq.
+
+        Args:
+            key (str):
+                see get_stream_key
+
+        Returns:
+            int
+                sequence number of the last published tick, -1 if there is none
+
+        """
+        with self.cond:
+            if len(self.batches[key]) == 0:
+                return -1
+            first_seq, table = self.batches[key][-1]
+            return first_seq + len(table) - 1
+
+    def latest_position(self, key):
+        """Latest position.
+
+        Args:
+            key (str):
+                see get_stream_key
+
+        Returns:
+            int
+                position to read from, so that only new batches are read
+
+        """
+        with self.cond:
+            return len(self.batches[key])
+
+    def read(self, positions, block_ms=0):
+        """Read batches.
+
+        Args:
+            positions (dict[str, int]):
+                position to read from by key
+            block_ms (int):
+                time to wait for a new batch if there are none
+
+        Returns:
+            list[tuple]
+                key, next position, first sequence number and table of each batch
+
+        """
+        with self.cond:
+            if not any(len(self.batches[k]) > p for k, p in positions.items()):
+                self.cond.wait(block_ms / 1000)
+            out = []
+            for key, pos in positions.items():
+                for i, (first_seq, table) in enumerate(self.batches[key][pos:]):
+                    out.append((key, pos + i + 1, first_seq, table))
+            return out
+
+
+class RedisTickChannel:
+    """Redis stream tick channel."""
+
+    def __init__(self, host, port, maxlen=100_000):
+        """Init.
+
+        Args:
+            host (str):
+                redis host
+            port (int):
+                redis port
+            maxlen (int):
+                approximate number of batches kept per stream
+
+        """
+        self.redis = redis.Redis(host=host, port=port, decode_responses=False)
+        self.maxlen = maxlen
+
+    def publish(self, key, first_seq, table):
+        """Publish a batch of ticks, see LocalTickChannel.publish."""
+        self.redis.xadd(
+            key,
+            {"seq": first_seq, "num": len(table), "data": table_to_ipc(table)},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    def last_seq(self, key):
+        """Last seq, see LocalTickChannel.last_seq."""
+        msgs = self.redis.xrevrange(key, count=1)
+        if len(msgs) == 0:
+            return -1
+        fields = msgs[0][1]
+        return int(fields[b"seq"]) + int(fields[b"num"]) - 1
+
+    def latest_position(self, key):
+        """Latest position, see LocalTickChannel.latest_position."""
+        msgs = self.redis.xrevrange(key, count=1)
+        if len(msgs) == 0:
+            return b"0-0"
+        return msgs[0][0]
+
+    def read(self, positions, block_ms=0):
+        """Read batches, see LocalTickChannel.read."""
+        resp = self.redis.xread(positions, block=block_ms or None)
+        out = []
+        for key, msgs in resp or []:
+            key = key.decode() if isinstance(key, bytes) else key
+            for msg_id, fields in msgs:
+                table = ipc_to_table(fields[b"data"])
+                out.append((key, msg_id, int(fields[b"seq"]), table))
+        return out
+
+
+def get_tick_channel(config):
+    """Get tick channel.
+
+    Args:
+        config (pydantic.BaseModel):
+            as defined in 'agent_config.py'
+
+    Returns:
+        RedisTickChannel
+
+    Raises:
+        ValueError:
+            if the channel is not 'redis'. A LocalTickChannel only reaches ticks
+            published in this process, so it is passed to TickHandler directly
+
+    """
+    if config.tick_stream.channel != "redis":
+        raise ValueError(f"unknown tick channel {config.tick_stream.channel}")
+    return RedisTickChannel(
+        config.redis.host,
+        config.redis.port,
+        maxlen=config.tick_stream.maxlen,
+    )
+
+
+class TickPublisher:
+    """Publishes new ticks of a symbol."""
+
+    def __init__(self, channel, broker, symbol, fetch_ticks, start_time_msc):
+        """Init.
+
+        Args:
+            channel (RedisTickChannel | LocalTickChannel):
+                see get_tick_channel
+            broker (str):
+                broker name
+            symbol (str):
+                trading instrument, i.e. EURUSD
+            fetch_ticks (callable):
+                fetch_ticks(t0) returns the ticks from t0 in ms from epoch as a
+                structured array or dict of arrays with tick_columns, sorted by
+                time_msc, i.e. MT5Connector.get_ticks
+            start_time_msc (int):
+                time of the first tick to publish in ms from epoch
+
+        """
+        self.channel = channel
+        self.fetch_ticks = fetch_ticks
+        self.key = get_stream_key(broker, symbol)
+        self.seq = channel.last_seq(self.key) + 1
+        self.last_time_msc = start_time_msc
+        # ticks at last_time_msc that are already published
+        self.num_last = 0
+        self.stop_event = threading.Event()
+
+    def step(self):
+        """Publish the ticks since the last step.
+
+        Returns:
+            int
+                number of ticks published
+
+        """
+        ticks = self.fetch_ticks(self.last_time_msc)
+        if (ticks is None) or (len(ticks["time_msc"]) == 0):
+            return 0
+
+        time_msc = np.asarray(ticks["time_msc"])
+        is_new = time_msc > self.last_time_msc
+        is_new[np.flatnonzero(time_msc == self.last_time_msc)[self.num_last :]] = True
+        if not is_new.any():
+            return 0
+
+        table = pa.table(
+            {c: np.ascontiguousarray(np.asarray(ticks[c])[is_new]) for c in tick_columns},
+        )
+        self.channel.publish(self.key, self.seq, table)
+        self.seq += len(table)
+
+        if time_msc[-1] > self.last_time_msc:
+            self.num_last = 0
+        self.last_time_msc = int(time_msc[-1])
+        self.num_last += int(is_new[time_msc == self.last_time_msc].sum())
+        return len(table)
+
+    def run(self, interval=0.05):
+        """Publish ticks until stop is called.
+
+        Args:
+            interval (float):
+                seconds between polls of mt5
+
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.warning(f"{self.key} publish failed {str(repr(e))}")
+            sleep(interval)
+
+    def start(self, interval=0.05):
+        """Run in a daemon thread.
+
+        Args:
+            interval (float):
+                seconds between polls of mt5
+
+        Returns:
+            threading.Thread
+
+        """
+        thread = threading.Thread(target=self.run, args=(interval,), daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop run."""
+        self.stop_event.set()
+
+
+def replay_ticks(channel, broker, symbol, df, batch_size=100, first_seq=None):
+    """Replay ticks.
+
+    Fake publisher, publishes a dataframe of ticks in batches, i.e. for tests.
+
+    Args:
+        channel (RedisTickChannel | LocalTickChannel):
+            see get_tick_channel
+        broker (str):
+            broker name
+        symbol (str):
+            trading instrument, i.e. EURUSD
+        df (pl.DataFrame):
+            ticks with tick_columns, time_msc as datetime or ms from epoch
+        batch_size (int):
+            number of ticks per batch
+        first_seq (int | None):
+            sequence number of the first tick, continues the stream if None
+
+    Returns:
+        int
+            sequence number of the next tick
+
+    """
+    key = get_stream_key(broker, symbol)
+    seq = channel.last_seq(key) + 1 if first_seq is None else first_seq
+    df = df.select(tick_columns)
+    if df["time_msc"].dtype != pl.Int64:
+        df = df.with_columns(pl.col("time_msc").dt.epoch("ms"))
+    for i in range(0, len(df), batch_size):
+        table = df[i : i + batch_size].to_arrow()
+        channel.publish(key, seq, table)
+        seq += len(table)
+    return seq
+
+
+class TickSubscriber:
+    """Reads the ticks of symbols from a channel."""
+
+    def __init__(self, channel, broker_symbols):
+        """Init.
+
+        Only ticks that are published after init are read.
+
+        Args:
+            channel (RedisTickChannel | LocalTickChannel):
+                see get_tick_channel
+            broker_symbols (list[tuple[str, str]]):
+                broker and symbol of each stream
+
+        """
+        self.channel = channel
+        self.keys = {get_stream_key(b, s): f"{b}_{s}" for b, s in broker_symbols}
+        self.positions = {k: channel.latest_position(k) for k in self.keys}
+        self.next_seq = {k: None for k in self.keys}
+        self.num_duplicates = 0
+        self.num_missing = 0
+        # rows of the ticks returned by the last poll that follow missing ticks
+        self.gaps = {}
+
+    def poll(self, block_ms=0):
+        """Poll new ticks.
+
+        Args:
+            block_ms (int):
+                time to wait if there are no new ticks
+
+        Returns:
+            dict[str, pl.DataFrame]
+                new ticks by '{broker}_{symbol}', time_msc as datetime in ns. The
+                rows that follow missing ticks are in gaps
+
+        """
+        batches = defaultdict(list)
+        num_rows = defaultdict(int)
+        self.gaps = defaultdict(list)
+        for key, pos, first_seq, table in self.channel.read(self.positions, block_ms):
+            self.positions[key] = pos
+            broker_symbol = self.keys[key]
+            next_seq = self.next_seq[key]
+            if next_seq is not None:
+                if first_seq + len(table) <= next_seq:
+                    self.num_duplicates += len(table)
+                    continue
+                if first_seq < next_seq:
+                    self.num_duplicates += next_seq - first_seq
+                    table = table.slice(next_seq - first_seq)
+                    first_seq = next_seq
+                elif first_seq > next_seq:
+                    self.num_missing += first_seq - next_seq
+                    self.gaps[broker_symbol].append(num_rows[broker_symbol])
+                    logger.warning(f"{key} missing {first_seq - next_seq} ticks")
+            self.next_seq[key] = first_seq + len(table)
+            batches[broker_symbol].append(table)
+            num_rows[broker_symbol] += len(table)
+
+        new_ticks = {}
+        for broker_symbol, tables in batches.items():
+            df = pl.from_arrow(pa.concat_tables(tables))
+            new_ticks[broker_symbol] = df.with_columns(
+                pl.col("time_msc").cast(pl.Datetime("ms")).dt.cast_time_unit("ns"),
+            )
+        return new_ticks
@@ -19,15 +19,18 @@ from releat.utils.configs.constants import root_dir
 from releat.utils.configs.constants import trading_instruments
 from releat.utils.configs.data_models import AerospikeConfig
 from releat.utils.configs.data_models import AgentConfig
+from releat.utils.configs.data_models import FeatureBuildConfig
 from releat.utils.configs.data_models import FeatureGroupConfig
 from releat.utils.configs.data_models import GymEnvConfig
 from releat.utils.configs.data_models import MT5Config
+from releat.utils.configs.data_models import ObsStoreConfig
 from releat.utils.configs.data_models import Paths
 from releat.utils.configs.data_models import PositionConfig
 from releat.utils.configs.data_models import RawDataConfig
 from releat.utils.configs.data_models import RedisConfig
 from releat.utils.configs.data_models import SimpleFeatureConfig
 from releat.utils.configs.data_models import SymbolSpec
+from releat.utils.configs.data_models import TickStreamConfig
 from releat.utils.configs.data_models import TraderConfig
 from releat.utils.configs.data_models import TransformerConfig
 
@@ -172,6 +175,9 @@ def make_agent_config(config, feature_spec):
     config["aerospike"] = AerospikeConfig(**config["aerospike"])
     config["redis"] = RedisConfig(**config["redis"])
     config["mt5"] = MT5Config(**config["mt5"])
+    config["obs_store"] = ObsStoreConfig(**config.get("obs_store", {}))
+    config["feature_build"] = FeatureBuildConfig(**config.get("feature_build", {}))
+    config["tick_stream"] = TickStreamConfig(**config.get("tick_stream", {}))
 
     config = {**config, **get_ticker_info(feature_spec)}
 
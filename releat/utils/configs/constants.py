@@ -16,6 +16,9 @@ root_dir = str(Path(os.path.dirname(__file__)).parents[2])
 
 s3_secret = None
 
+# tick columns returned by the /get_ticks endpoint of the mt5 api, the columns used to
+# build features
+tick_columns = ["time_msc", "bid", "ask", "flags"]
 
 mt5_api_port_map = {
     "metaquotes": {
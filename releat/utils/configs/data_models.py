@@ -77,6 +77,11 @@ class RawDataConfig(BaseModel):
     max_obs_val: float
     # live or demo data
     data_mode: str
+    # if True, monthly tick files are cleaned once into a day partitioned store and
+    # loaded from it, see releat.data.tick_store
+    use_tick_store: bool = False
+    # root of the tick store, defaults to {tick_data_dir}/store
+    tick_store_dir: str | None = None
 
 
 class GymEnvConfig(BaseModel):
@@ -186,6 +191,91 @@ class AerospikeConfig(BaseModel):
     namespace: str
     # usually the same as agent_version
     set_name: str
+    # number of records read or written per batch call when uploading to aerospike
+    batch_size: int = 5000
+
+
+class ObsStoreConfig(BaseModel):
+    """Observation store config.
+
+    Where the gym environment reads its raw data from.
+
+    """
+
+    # 'aerospike' reads records from the database for each step, 'memmap' reads from
+    # memory mapped arrays exported from the database (see export_obs_store)
+    backend: str = "aerospike"
+    # folder of the exported arrays, defaults to {feature_dir}/obs_store
+    store_dir: str | None = None
+    # aerospike backend only - keep the lookback window of each feature group in
+    # memory and only read new records at each step
+    ring_buffer: bool = True
+
+
+class FeatureBuildConfig(BaseModel):
+    """Feature build config.
+
+    How the feature build is parallelised:
+    - months and symbols are built on num_workers processes, and the transforms of
+      each feature are fitted on num_workers processes
+    - features that run a python function over each tick window (i.e.
+      grad_with_peak_trends and inflection) use num_cpus processes
+
+    """
+
+    # number of processes per feature, defaults to all cpus
+    num_cpus: int | None = None
+    # minimum number of windows before a feature uses worker processes
+    pool_threshold: int = 20_000
+    # 'shared_memory' puts the tick arrays in shared memory once and workers read the
+    # windows by index, 'p_map' pickles the ticks of each window to the workers
+    executor: str = "shared_memory"
+    # number of processes that build months and symbols at the same time, 1 builds
+    # them one after the other, None uses all cpus
+    num_workers: int | None = 1
+    # memory budget of the months and symbols that are built at the same time, no
+    # limit if None
+    max_memory_gb: float | None = None
+    # estimated memory of building a month and symbol relative to its tick file size
+    memory_factor: float = 10.0
+    # reuse raw feature files of unchanged features and tick data, see
+    # releat.data.cache
+    use_cache: bool = True
+    # size of the cleaned tick data kept in memory during a build, no limit if None
+    tick_cache_gb: float | None = 4.0
+    # maximum number of rows that transforms are fitted on, features with more rows
+    # are sampled, see releat.data.transformers.fit_feature_transform_params
+    transform_sample_size: int = 1_000_000
+
+
+class TickStreamConfig(BaseModel):
+    """Tick stream config.
+
+    If enabled, the mt5 api publishes new ticks to a channel and the tick handler
+    reads them, instead of requesting a time range from the mt5 api at each trade
+    timestep, see releat.signals.tick_stream
+
+    """
+
+    enabled: bool = False
+    # only 'redis', which uses the redis config. An in memory LocalTickChannel is
+    # passed to TickHandler directly in tests
+    channel: str = "redis"
+    # approximate number of batches of ticks kept in each redis stream
+    maxlen: int = 100_000
+    # seconds between polls of mt5 by the publisher
+    interval: float = 0.05
+    # maximum seconds that update_tick_data waits for the stream to reach the trade
+    # time, there may be no new ticks when the market is quiet
+    wait_timeout: float = 1.0
+    # maximum number of ticks per symbol held by the tick handler, see
+    # releat.data.tick_buffer
+    buffer_capacity: int = 2_000_000
+    # update the features at inference from the new ticks of each trade timestep,
+    # see releat.data.incremental
+    incremental_features: bool = False
+    # trade timesteps between recalculations of the incremental feature state
+    resync_steps: int = 360
 
 
 class MT5Config(BaseModel):
@@ -379,15 +469,24 @@ class AgentConfig(BaseModel):
     action_space: Any
     # aerospace login details
     aerospike: AerospikeConfig
+    # source of the gym environment raw data
+    obs_store: ObsStoreConfig = ObsStoreConfig()
     # MT5 login details
     mt5: MT5Config
 
     raw_data: RawDataConfig
     features: list[FeatureGroupConfig]
+    # parallelisation of the feature build
+    feature_build: FeatureBuildConfig = FeatureBuildConfig()
+    # streaming of new ticks at inference
+    tick_stream: TickStreamConfig = TickStreamConfig()
     # Gym hyperparams
     # these parameters are uploaded to aerospike. the train process can update these
     # values and the individual gym environments reads off aerospike whilst training
     gym_env: GymEnvConfig
+    # if True, each rollout worker steps its num_envs_per_worker environments together
+    # in one FxVectorEnv rather than one FxEnv each
+    vector_env: bool = False
     # Config that ensembles multiple predictions
     trader: TraderConfig
 
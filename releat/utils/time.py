@@ -172,3 +172,48 @@ def ceil_timestamp(t, timeframe, trade_time_offset=3):
     timeframe = timeframe.replace("m", "T")
     t = t.ceil(timeframe) + pd.Timedelta(seconds=trade_time_offset)
     return t
+
+
+def count_trade_intervals(t0, t1, trade_timeframe):
+    """Count trade intervals.
+
+    Counts the number of trade timesteps between two times, using the same trade
+    calendar as fill_trade_interval, i.e. excluding weekends, christmas and new years
+    day. This is the difference in table index between two records in the database.
+
+    Args:
+        t0 (int):
+            start time as seconds since epoch, must be a trade time
+        t1 (int):
+            end time as seconds since epoch (not inclusive)
+        trade_timeframe (str):
+            polars format of time, i.e. '10s'
+
+    Returns:
+        int
+            number of trade timesteps in [t0, t1)
+
+    """
+    step = int(pd.Timedelta(trade_timeframe).total_seconds())
+    t0 = int(t0)
+    t1 = int(t1)
+    if t1 <= t0:
+        return 0
+
+    days = np.arange(t0 // 86400, (t1 - 1) // 86400 + 1, dtype="int64")
+
+    # weekday where monday = 0, note that 1970-01-01 was a thursday
+    weekday = (days + 3) % 7
+    months = days.astype("datetime64[D]").astype("datetime64[M]")
+    day = (days.astype("datetime64[D]") - months).astype("int64") + 1
+    month = months.astype("int64") % 12 + 1
+    is_trade_day = weekday < 5
+    is_trade_day &= ~((day == 25) & (month == 12))
+    is_trade_day &= ~((day == 1) & (month == 1))
+
+    # trade times in each day are t0 + k * step, k >= 0
+    lo = np.maximum(days * 86400, t0) - t0
+    hi = np.minimum((days + 1) * 86400, t1) - t0
+    counts = -(-hi // step) - -(-lo // step)
+
+    return int(counts[is_trade_day].sum())
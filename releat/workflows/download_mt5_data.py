@@ -2,6 +2,16 @@
 
 Start date for all data is 2019-01-01
 
+Ticks are downloaded by download_all, one thread per broker and symbol since each
+symbol has its own mt5 api port, see mt5_api_port_map. Each month is downloaded in
+day sized chunks:
+
+    {root_dir}/data/tick_data/{broker}/{symbol}/chunks/{%Y-%m-%d}.parquet
+
+and the days that are complete are recorded in manifest.json in the symbol folder,
+so that a failed download resumes from the day that failed. Once all days of a month
+are downloaded, the chunks are combined into the monthly tick file.
+
 Todo:
 - investigate old / stale tickers
 - create code to fill in missing dates (not just latest)
@@ -11,15 +21,23 @@ Todo:
 from __future__ import annotations
 
 import gc
+import json
 import os
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from datetime import datetime
 from datetime import timedelta
 from glob import glob
+from time import sleep
 
+import polars as pl
 import pytz
+from dateutil.relativedelta import relativedelta
 
 from releat.data.extractor import download_tick_data
+from releat.data.extractor import download_ticks
+from releat.data.tick_archive import read_tick_archive
+from releat.data.tick_archive import write_tick_archive
 from releat.utils.configs.constants import mt5_api_port_map
 from releat.utils.configs.constants import root_dir
 from releat.utils.logging import get_logger
@@ -48,7 +66,7 @@ def get_most_recent_file(broker, symbol):
     """
     utc_tz = pytz.timezone("Etc/UTC")
     s = symbol.replace("@", "")
-    files = list(sorted(glob(f"{root_dir}/data/tick_data/{broker}/{s}/*")))
+    files = list(sorted(glob(f"{root_dir}/data/tick_data/{broker}/{s}/*.parquet")))
     # two files are required because we take the second last file as the date
     # last file is often a partial month of data only
     if len(files) < 2:
@@ -101,7 +119,7 @@ def download_and_save_mt5_tick_data(
         folder = f"{root_dir}/data/tick_data/{broker}/{s}"
         os.makedirs(folder, exist_ok=True)
         f = f"{folder}/{str0}_{str1}.parquet"
-        df.to_parquet(f, engine="pyarrow")
+        write_tick_archive(df, f, broker, symbol)
         logger.info(
             (
                 f"{broker.ljust(10)} |"
@@ -120,6 +138,297 @@ def download_and_save_mt5_tick_data(
         return False
 
 
+def get_symbol_dir(broker, symbol):
+    """Get symbol dir.
+
+    Args:
+        broker (str):
+            i.e. 'metaquotes' or 'ampglobal'
+        symbol (str):
+            i.e. 'EURUSD'
+
+    Returns:
+        str
+            folder of the monthly tick files of the symbol
+
+    """
+    s = symbol.replace("@", "")
+    return f"{root_dir}/data/tick_data/{broker}/{s}"
+
+
+def load_manifest(symbol_dir):
+    """Load manifest.
+
+    Args:
+        symbol_dir (str):
+            see get_symbol_dir
+
+    Returns:
+        dict
+            days, number of ticks of each complete day, and months, the complete
+            monthly tick files
+
+    """
+    f = f"{symbol_dir}/manifest.json"
+    if not os.path.exists(f):
+        return {"days": {}, "months": []}
+    with open(f) as fp:
+        return json.load(fp)
+
+
+def save_manifest(symbol_dir, manifest):
+    """Save manifest.
+
+    Args:
+        symbol_dir (str):
+            see get_symbol_dir
+        manifest (dict):
+            see load_manifest
+
+    """
+    tmp_f = f"{symbol_dir}/.manifest.json.tmp"
+    with open(tmp_f, "w") as fp:
+        json.dump(manifest, fp, indent=4, sort_keys=True)
+    os.replace(tmp_f, f"{symbol_dir}/manifest.json")
+
+
+def download_day(broker, symbol, day, data_mode, check_api, timeout, max_retries=3):
+    """Download day.
+
+    Args:
+        broker (str):
+            i.e. 'metaquotes' or 'ampglobal'
+        symbol (str):
+            i.e. 'EURUSD'
+        day (datetime.datetime):
+            start of the day in utc
+        data_mode (str)
+            either 'demo' or 'live'
+        check_api (bool)
+            check mt5 connectivity and attempt to reconnect if not connected
+        timeout (int):
+            timeout of api in seconds
+        max_retries (int):
+            number of attempts before giving up
+
+    Returns:
+        int | None
+            number of ticks saved to the chunk file, None if the download failed
+
+    """
+    day1 = day + timedelta(days=1)
+    chunk_dir = f"{get_symbol_dir(broker, symbol)}/chunks"
+    os.makedirs(chunk_dir, exist_ok=True)
+
+    for i in range(max_retries):
+        try:
+            df = download_ticks(
+                broker,
+                symbol,
+                day,
+                day1,
+                data_mode,
+                check_api=check_api,
+                timeout=timeout,
+            )
+            if len(df) == 0:
+                return 0
+            f = f"{chunk_dir}/{day.strftime('%Y-%m-%d')}.parquet"
+            write_tick_archive(df, f, broker, symbol)
+            return len(df)
+        except Exception as e:
+            logger.warning(
+                f"{broker.ljust(10)} | {symbol.ljust(9)}: {day.date()} attempt {i + 1}"
+                f" {str(repr(e))}",
+            )
+            sleep(2**i)
+    return None
+
+
+def save_month(broker, symbol, month, days):
+    """Combine the day chunks into the monthly tick file.
+
+    Args:
+        broker (str):
+            i.e. 'metaquotes' or 'ampglobal'
+        symbol (str):
+            i.e. 'EURUSD'
+        month (datetime.datetime):
+            first day of the month
+        days (list[str]):
+            days of the month that have a chunk file
+
+    Returns:
+        int
+            number of ticks in the month
+
+    """
+    symbol_dir = get_symbol_dir(broker, symbol)
+    files = [f"{symbol_dir}/chunks/{day}.parquet" for day in sorted(days)]
+    files = [f for f in files if os.path.exists(f)]
+    if len(files) == 0:
+        return 0
+    # chunks that could not be encoded are plain parquet, see write_tick_archive
+    df = pl.concat(
+        [
+            read_tick_archive(f).select(
+                [
+                    pl.col("bid").cast(pl.Float64),
+                    pl.col("ask").cast(pl.Float64),
+                    pl.col("time_msc").dt.cast_time_unit("ns"),
+                    pl.col("flags").cast(pl.Int64),
+                ],
+            )
+            for f in files
+        ],
+        how="vertical",
+    )
+
+    str0 = month.strftime("%Y-%m-%d")
+    str1 = (month + relativedelta(months=1) - timedelta(days=1)).strftime("%Y-%m-%d")
+    f = f"{symbol_dir}/{str0}_{str1}.parquet"
+    write_tick_archive(df, f, broker, symbol)
+    return len(df)
+
+
+def download_symbol(broker, symbol, data_mode, check_api, timeout, max_retries=3):
+    """Download all months of a symbol, resuming from the manifest.
+
+    Args:
+        broker (str):
+            i.e. 'metaquotes' or 'ampglobal'
+        symbol (str):
+            i.e. 'EURUSD'
+        data_mode (str)
+            either 'demo' or 'live'
+        check_api (bool)
+            check mt5 connectivity and attempt to reconnect if not connected
+        timeout (int):
+            timeout of api in seconds
+        max_retries (int):
+            number of attempts per day
+
+    Returns:
+        dict
+            number of ticks and days downloaded, and days that failed
+
+    """
+    symbol_dir = get_symbol_dir(broker, symbol)
+    os.makedirs(symbol_dir, exist_ok=True)
+    manifest = load_manifest(symbol_dir)
+    now = datetime.utcnow()
+
+    if len(manifest["months"]) > 0:
+        month = datetime.strptime(max(manifest["months"]), "%Y-%m-%d")
+        month = month + relativedelta(months=1)
+    else:
+        # downloads from before the manifest, see get_most_recent_file
+        month = get_most_recent_file(broker, symbol).replace(tzinfo=None)
+
+    result = {"ticks": 0, "days": 0, "failed_days": 0}
+    while month < now:
+        month1 = month + relativedelta(months=1)
+        month_days = []
+        day = month
+        while (day < month1) and (day < now):
+            day_str = day.strftime("%Y-%m-%d")
+            month_days.append(day_str)
+            # today is downloaded again on the next run
+            if day_str not in manifest["days"]:
+                num_ticks = download_day(
+                    broker,
+                    symbol,
+                    day,
+                    data_mode,
+                    check_api,
+                    timeout,
+                    max_retries=max_retries,
+                )
+                check_api = False
+                if num_ticks is None:
+                    result["failed_days"] += 1
+                else:
+                    result["ticks"] += num_ticks
+                    result["days"] += 1
+                    if day + timedelta(days=1) <= now:
+                        manifest["days"][day_str] = num_ticks
+                        save_manifest(symbol_dir, manifest)
+            day += timedelta(days=1)
+
+        # the last day of the current month is today, which is not complete
+        complete = month1 <= now
+        days = month_days if complete else month_days[:-1]
+        if not all(day_str in manifest["days"] for day_str in days):
+            # resumed on the next run, the later months need this month first
+            break
+
+        num_ticks = save_month(broker, symbol, month, month_days)
+        logger.info(
+            f"{broker.ljust(10)} | {symbol.ljust(9)}: {str(num_ticks).rjust(8)} |"
+            f" {month.strftime('%Y-%m')}",
+        )
+        if complete:
+            manifest["months"].append(month.strftime("%Y-%m-%d"))
+            for day_str in month_days:
+                manifest["days"].pop(day_str, None)
+                f = f"{symbol_dir}/chunks/{day_str}.parquet"
+                if os.path.exists(f):
+                    os.remove(f)
+            save_manifest(symbol_dir, manifest)
+        gc.collect()
+        month = month1
+
+    return result
+
+
+def download_all(data_mode, check_api, timeout, max_retries=3):
+    """Download the tick data of all symbols, one thread per mt5 api port.
+
+    Args:
+        data_mode (str)
+            either 'demo' or 'live'
+        check_api (bool)
+            check mt5 connectivity and attempt to reconnect if not connected
+        timeout (int):
+            timeout of api in seconds
+        max_retries (int):
+            number of attempts per day
+
+    Returns:
+        dict
+            result of download_symbol by (broker, symbol)
+
+    """
+    symbols = []
+    for broker, port_map in mt5_api_port_map.items():
+        for symbol in port_map:
+            # general is the port used for other interactions with mt5, i.e. order and
+            # getting position
+            if symbol != "general":
+                symbols.append((broker, symbol))
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
+        futures = {
+            executor.submit(
+                download_symbol,
+                broker,
+                symbol,
+                data_mode,
+                check_api,
+                timeout,
+                max_retries,
+            ): (broker, symbol)
+            for broker, symbol in symbols
+        }
+        for future in as_completed(futures):
+            broker, symbol = futures[future]
+            result = future.result()
+            results[(broker, symbol)] = result
+            logger.info(f"{broker.ljust(10)} | {symbol.ljust(9)}: {result}")
+    return results
+
+
 if __name__ == "__main__":
     # start apis
     _ = start_all_mt5_apis()
@@ -128,22 +437,7 @@ if __name__ == "__main__":
     check_api = True
     timeout = 300
 
-    dl_args = []
-
-    for broker, port_map in mt5_api_port_map.items():
-        for symbol, port in port_map.items():
-            # general is the port used for other interactions with mt5, i.e. order and
-            # getting position
-            if symbol != "general":
-                dt0 = get_most_recent_file(broker, symbol)
-                while dt0 < datetime.now(pytz.timezone("Etc/UTC")):
-                    dt1 = ceil_dt(deepcopy(dt0), "month")
-                    dl_arg = [broker, symbol, dt0, dt1, data_mode, check_api, timeout]
-                    success = download_and_save_mt5_tick_data(*dl_arg)
-                    gc.collect()
-                    if success:
-                        dt0 = ceil_dt(deepcopy(dt0), "month")
-                        dt1 = ceil_dt(deepcopy(dt1), "month")
+    _ = download_all(data_mode, check_api, timeout)
 
     # kill mt5
     stop_mt5()
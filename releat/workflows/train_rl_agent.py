@@ -15,6 +15,8 @@ from ray.rllib.algorithms.impala import ImpalaConfig as RLAlgorithmConfig
 from ray.rllib.models import ModelCatalog
 
 from releat.gym_env.gym_env import FxEnv
+from releat.gym_env.vector_env import FxVectorEnv
+from releat.signals.checkpoint_watcher import write_checkpoint_manifest
 
 
 def train_rl_agent(config, AgentModel):
@@ -43,10 +45,12 @@ def train_rl_agent(config, AgentModel):
         "env_config": dict(config),
     }
 
+    env = FxVectorEnv if config.vector_env else FxEnv
+
     trainer = (
         RLAlgorithmConfig()
         .training(**config.rl_train)
-        .environment(env=FxEnv, **env_config)
+        .environment(env=env, **env_config)
         .framework(**config.rl_framework)
         .rollouts(**config.rl_rollouts)
         .exploration(**config.rl_explore)
@@ -62,7 +66,7 @@ def train_rl_agent(config, AgentModel):
     trainer.get_policy().model.base_model.summary()
 
     try:
-        files = sorted(glob(f"{logdir}/checkpoint*"))
+        files = sorted(f for f in glob(f"{logdir}/checkpoint*") if os.path.isdir(f))
         f = sorted(glob(f"{files[-1]}/*"))
         trainer.restore(f[0])
     except Exception as e:
@@ -109,7 +113,10 @@ def train_rl_agent(config, AgentModel):
 
         if (i + 1) % bins["save_freq"] == 0:
             checkpoint = trainer.save(logdir)
-            checkpoint_str = checkpoint.path.split("/")[-1].split("_")[-1]
+            # the manifest is only written once the checkpoint is complete, see
+            # releat.signals.checkpoint_watcher
+            write_checkpoint_manifest(logdir, checkpoint)
+            checkpoint_str = checkpoint.split("/")[-1].split("_")[-1]
             ckpt_print_str += f"  ckpt: {checkpoint_str}"
 
         print(" | " + ckpt_print_str)
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from releat.connectors.aerospike import search_aerospike_for_dt
+from releat.utils.configs.config_builder import load_config
+
+
+class FakeClient:
+    def __init__(self, set_name, dates):
+        self.set_name = set_name
+        self.dates = dates
+        self.batch_sizes = []
+
+    def info(self, command):
+        sets = f"set={self.set_name}:objects={len(self.dates)}:tombstones=0;"
+        return {"node": (None, sets)}
+
+    def select_many(self, keys, bins):
+        self.batch_sizes.append(len(keys))
+        out = []
+        for key in keys:
+            date = self.dates.get(key[2])
+            out.append((key, None, None) if date is None else (key, {}, {"date": date}))
+        return out
+
+
+def test_search_reads_at_most_num_probes_records_per_call():
+    config = load_config("t00001", is_training=False)
+    # irregular dates so that the calendar estimate misses, with a large range of
+    # records that do not exist
+    dates = {i: 1_000_000 + i * 7 + (i // 100) * 1000 for i in range(2000)}
+    for i in range(300, 1500):
+        dates[i] = None
+    client = FakeClient(config.agent_version, dates)
+
+    for ind in [0, 299, 1500, 1777, 1999]:
+        client.batch_sizes = []
+        assert search_aerospike_for_dt(config, client, dates[ind], num_probes=16) == ind
+        assert max(client.batch_sizes) <= 16
+
+    assert search_aerospike_for_dt(config, client, dates[1500] + 1, num_probes=16) is None
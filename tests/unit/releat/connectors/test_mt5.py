@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import importlib.util
+import sys
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from types import ModuleType
+from urllib.parse import urlparse
+
+import numpy as np
+import polars as pl
+import pytest
+import requests
+
+import releat.data.extractor as extractor
+from releat.data.extractor import download_ticks
+
+TICK_DTYPE = [
+    ("time", "<i8"),
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+    ("last", "<f8"),
+    ("volume", "<u8"),
+    ("time_msc", "<i8"),
+    ("flags", "<u4"),
+    ("volume_real", "<f8"),
+]
+T0 = 1_682_899_200_000  # 2023-05-01 in ms from epoch
+
+
+def make_ticks(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    ticks = np.zeros(n, dtype=TICK_DTYPE)
+    ticks["time_msc"] = T0 + np.cumsum(rng.integers(0, 300, n))
+    ticks["time"] = ticks["time_msc"] // 1000
+    ticks["bid"] = np.round(1.1 + np.cumsum(rng.integers(-2, 3, n)) * 1e-5, 5)
+    ticks["ask"] = ticks["bid"] + 2e-5
+    ticks["flags"] = rng.choice([2, 4, 6, 134], n)
+    return ticks
+
+
+def make_fake_mt5(ticks):
+    mt5 = ModuleType("MetaTrader5")
+    mt5.COPY_TICKS_ALL = -1
+    mt5.requests = []
+    mt5.fail = False
+
+    def copy_ticks_range(symbol, dt0, dt1, flags):
+        mt5.requests.append((dt0, dt1))
+        if mt5.fail:
+            return None
+        # mt5 only takes whole seconds
+        assert dt0.microsecond == 0 and dt1.microsecond == 0
+        t = ticks["time"]
+        return ticks[(t >= dt0.timestamp()) & (t < dt1.timestamp())]
+
+    mt5.copy_ticks_range = copy_ticks_range
+    mt5.last_error = lambda: (-1, "terminal: call failed")
+    return mt5
+
+
+@pytest.fixture
+def mt5_api(monkeypatch):
+    ticks = make_ticks()
+    mt5 = make_fake_mt5(ticks)
+    monkeypatch.setitem(sys.modules, "MetaTrader5", mt5)
+    monkeypatch.delitem(sys.modules, "releat.connectors.mt5", raising=False)
+    monkeypatch.setattr(sys, "argv", ["mt5.py", "-b", "metaquotes", "-s", "EURUSD"])
+
+    api_f = Path(__file__).parents[4] / "apis" / "mt5.py"
+    spec = importlib.util.spec_from_file_location("mt5_api", api_f)
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+    monkeypatch.setattr("releat.connectors.mt5.sleep", lambda x: None)
+    api.mt5c.conn = sys.modules["releat.connectors.mt5"].MT5Connector({})
+
+    client = api.app.test_client()
+
+    def get(url, json=None, timeout=None):
+        resp = client.get(urlparse(url).path, json=json)
+        out = requests.Response()
+        out.status_code = resp.status_code
+        out._content = resp.data
+        out.url = url
+        return out
+
+    monkeypatch.setattr(extractor.requests, "get", get)
+    return api, mt5, ticks
+
+
+def test_connector_get_ticks(mt5_api):
+    api, mt5, ticks = mt5_api
+    t0 = int(ticks["time_msc"][100]) + 1
+    t1 = int(ticks["time_msc"][900])
+
+    out = api.mt5c.conn.get_ticks("EURUSD", t0, t1)
+
+    expected = ticks[(ticks["time_msc"] >= t0) & (ticks["time_msc"] < t1)]
+    assert np.array_equal(out, expected)
+    dt0, dt1 = mt5.requests[-1]
+    assert dt0.timestamp() * 1000 <= t0 and dt1.timestamp() * 1000 >= t1
+
+
+def test_download_ticks_from_endpoint(mt5_api):
+    _, _, ticks = mt5_api
+    t0 = datetime.fromtimestamp(ticks["time_msc"][10] / 1000, tz=timezone.utc)
+    t1 = int(ticks["time_msc"][-10])
+
+    df = download_ticks("metaquotes", "EURUSD", t0, t1, "demo", check_api=False)
+
+    t0 = int(ticks["time_msc"][10])
+    expected = ticks[(ticks["time_msc"] >= t0) & (ticks["time_msc"] < t1)]
+    assert df.columns == ["time_msc", "bid", "ask", "flags"]
+    assert df["time_msc"].dtype == pl.Datetime("ns")
+    assert np.array_equal(
+        df["time_msc"].cast(pl.Int64).to_numpy(),
+        expected["time_msc"] * 1_000_000,
+    )
+    for col in ["bid", "ask", "flags"]:
+        assert np.array_equal(df[col].to_numpy(), expected[col])
+
+
+def test_download_ticks_raises_if_mt5_fails(mt5_api):
+    _, mt5, _ = mt5_api
+    mt5.fail = True
+
+    with pytest.raises(requests.HTTPError):
+        download_ticks("metaquotes", "EURUSD", T0, T0 + 60_000, "demo", check_api=False)
+    assert len(mt5.requests) == 10
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import polars as pl
+
+from releat.data.cache import add_to_cache
+from releat.data.cache import get_cache_file
+from releat.data.cache import get_feature_key
+from releat.data.cache import restore_from_cache
+from releat.data.cleaning import get_tick_file
+from releat.utils.configs.config_builder import load_config
+
+DT = "2023-05-01"
+
+
+def make_config(tmp_path):
+    config = load_config("t00001", is_training=False)
+    config.paths.feature_dir = str(tmp_path / "features")
+    config.paths.tick_data_dir = str(tmp_path / "ticks")
+    fc = config.features[0].simple_features[0]
+    for dt in ["2023-04-01", DT]:
+        tick_f = get_tick_file(config, fc.broker, fc.symbol, dt)
+        os.makedirs(os.path.dirname(tick_f), exist_ok=True)
+        pl.DataFrame({"bid": np.arange(10.0)}).write_parquet(tick_f)
+    return config
+
+
+def test_feature_params_invalidate_key(tmp_path):
+    config = make_config(tmp_path)
+    key = get_feature_key(config, 0, 0, DT)
+    assert get_feature_key(config, 0, 0, DT) == key
+
+    fc = config.features[0].simple_features[0]
+    fc.kwargs = {**fc.kwargs, "new_param": 1}
+    assert get_feature_key(config, 0, 0, DT) != key
+
+    config = make_config(tmp_path)
+    config.raw_data.trade_timeframe = "1m"
+    assert get_feature_key(config, 0, 0, DT) != key
+
+    config = make_config(tmp_path)
+    assert get_feature_key(config, 0, 0, "2023-06-01") != key
+
+
+def test_tick_fingerprint_invalidates_key(tmp_path):
+    config = make_config(tmp_path)
+    fc = config.features[0].simple_features[0]
+    key = get_feature_key(config, 0, 0, DT)
+
+    # the previous month is also read, see load_raw_tick_data
+    tick_f = get_tick_file(config, fc.broker, fc.symbol, "2023-04-01")
+    pl.DataFrame({"bid": np.arange(11.0)}).write_parquet(tick_f)
+    key1 = get_feature_key(config, 0, 0, DT)
+    assert key1 != key
+
+    # same size, newer file
+    stat = os.stat(tick_f)
+    os.utime(tick_f, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert get_feature_key(config, 0, 0, DT) not in [key, key1]
+
+
+def test_restore_from_cache(tmp_path):
+    config = make_config(tmp_path)
+    cache_f = get_cache_file(config, 0, 0, DT)
+    save_f = str(tmp_path / "raw_data" / f"{DT}.parquet")
+    assert not restore_from_cache(cache_f, save_f)
+
+    df = pl.DataFrame({"time_msc": np.arange(5), "feat": np.arange(5.0)})
+    os.makedirs(os.path.dirname(save_f))
+    df.write_parquet(save_f)
+    with open(save_f, "rb") as f:
+        content = f.read()
+    add_to_cache(save_f, cache_f)
+
+    # a rebuild replaces the raw feature file, the cached file is not modified
+    tmp_f = f"{save_f}.tmp"
+    df.with_columns(pl.col("feat") + 1).write_parquet(tmp_f)
+    os.replace(tmp_f, save_f)
+    assert restore_from_cache(cache_f, save_f)
+    with open(save_f, "rb") as f:
+        assert f.read() == content
+
+    os.remove(save_f)
+    assert restore_from_cache(cache_f, save_f)
+    assert pl.read_parquet(save_f).frame_equal(df)
+    # only the raw feature file is in its folder, no temporary files
+    assert os.listdir(os.path.dirname(save_f)) == [f"{DT}.parquet"]
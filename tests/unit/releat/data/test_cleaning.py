@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import numpy as np
+import polars as pl
+
+from releat.data.cleaning import TickCache
+from releat.data.cleaning import clean_raw_tick_data
+from releat.data.cleaning import get_trade_price
+from releat.utils.configs.config_builder import load_config
+
+
+def make_clean_ticks(n=20_000, seed=0, dt="2023-05-01"):
+    rng = np.random.default_rng(seed)
+    time_msc = np.datetime64(dt, "ns") + np.cumsum(
+        rng.integers(0, 2000, n) * 1_000_000,
+    )
+    bid = np.round(1.1 + np.cumsum(rng.integers(-2, 3, n)) * 1e-5, 5)
+    df = pl.DataFrame(
+        {
+            "time_msc": time_msc,
+            "bid": bid,
+            "ask": np.round(bid + rng.integers(0, 3, n) * 1e-5, 5),
+            "flags": rng.choice([2, 4, 6, 134], n),
+        },
+    )
+    return clean_raw_tick_data(df, 10)
+
+
+def test_trade_price_only_has_price_columns(tmp_path):
+    config = load_config("t00001", is_training=False)
+    config.paths.feature_dir = str(tmp_path)
+    tick_cache = TickCache(config)
+    tick_cache.tick_dfs[("b", "s", "2023-05-01")] = make_clean_ticks()
+
+    get_trade_price(config, "b", "s", "2023-05-01", tick_cache)
+
+    df = pl.read_parquet(f"{tmp_path}/trade_price/b/s/2023-05-01.parquet")
+    assert df.columns == ["time_msc", "min_bid", "max_bid", "min_ask", "max_ask"]
+    assert df.null_count().sum_horizontal()[0] == 0
+
+
+def test_tick_cache_evicts_least_recently_used(monkeypatch):
+    config = load_config("t00001", is_training=False)
+    dfs = {dt: make_clean_ticks(seed=i) for i, dt in enumerate(["m0", "m1", "m2"])}
+    loads = []
+
+    def load_raw_tick_data(config, broker, symbol, dt):
+        loads.append(dt)
+        return dfs[dt]
+
+    monkeypatch.setattr(
+        "releat.data.cleaning.load_raw_tick_data",
+        load_raw_tick_data,
+    )
+    # room for two months
+    size = max(x.estimated_size() for x in dfs.values())
+    tick_cache = TickCache(config, max_bytes=2.5 * size)
+
+    assert tick_cache.get("b", "s", "m0") is dfs["m0"]
+    tick_cache.get("b", "s", "m1")
+    tick_cache.get_group(0, "b", "s", "m1")
+    tick_cache.get_group(0, "b", "s", "m0")
+    # m0 was used last, so m1 is dropped with its groups
+    tick_cache.get("b", "s", "m2")
+    assert list(tick_cache.tick_dfs) == [("b", "s", "m0"), ("b", "s", "m2")]
+    assert {k[:3] for k in tick_cache.df_groups} == {("b", "s", "m0")}
+    assert loads == ["m0", "m1", "m2"]
+
+    # hits are not loaded again
+    tick_cache.get("b", "s", "m0")
+    assert loads == ["m0", "m1", "m2"]
+
+
+def test_tick_cache_keeps_most_recent(monkeypatch):
+    config = load_config("t00001", is_training=False)
+    df = make_clean_ticks()
+    monkeypatch.setattr(
+        "releat.data.cleaning.load_raw_tick_data",
+        lambda config, broker, symbol, dt: df,
+    )
+    tick_cache = TickCache(config, max_bytes=1)
+
+    tick_cache.get("b", "s", "m0")
+    tick_cache.get("b", "s", "m1")
+    assert list(tick_cache.tick_dfs) == [("b", "s", "m1")]
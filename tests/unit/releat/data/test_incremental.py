@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from releat.data.incremental import IncrementalFeatureEngine
+from releat.data.inference import init_feature_dict
+from releat.data.inference import update_feature_dict
+from releat.data.tick_buffer import TickRingBuffer
+from releat.utils.configs.config_builder import load_config
+
+
+def make_ticks(n=60_000, seed=0):
+    rng = np.random.default_rng(seed)
+    time_msc = pd.Timestamp("2023-05-01") + pd.to_timedelta(
+        np.cumsum(rng.integers(0, 1800, n)),
+        unit="ms",
+    )
+    bid = np.round(1.1 + np.cumsum(rng.integers(-2, 3, n)) * 1e-5, 5)
+    return pd.DataFrame(
+        {
+            "time_msc": time_msc,
+            "bid": bid,
+            "ask": np.round(bid + rng.integers(0, 3, n) * 1e-5, 5),
+            "flags": rng.choice([2, 4, 6, 134], n),
+        },
+    )
+
+
+def test_incremental_features_match_update_feature_dict():
+    config = load_config("t00001", is_training=False)
+    df = make_ticks()
+    now = pd.Timestamp("2023-05-01 12:00:05")
+    tick_buffer = TickRingBuffer(100_000)
+    tick_buffer.append(df[df["time_msc"] <= now])
+    tick_data = {fc.symbol: tick_buffer for fc in config.features[0].simple_features}
+
+    feature_data = init_feature_dict(config, tick_data, now)
+    engine = IncrementalFeatureEngine(config, tick_data, feature_data, resync_steps=7)
+
+    trade_time = pd.Timestamp(feature_data[0][0]["time_msc"][-1])
+    for _ in range(40):
+        trade_time += pd.Timedelta(config.raw_data.trade_timeframe)
+        new_ticks = df[
+            (df["time_msc"] > tick_buffer.last_time())
+            & (df["time_msc"] <= trade_time + pd.Timedelta(seconds=3))
+        ]
+        tick_buffer.append(new_ticks)
+
+        feature_data = update_feature_dict(config, tick_data, feature_data, trade_time)
+        engine.update(trade_time)
+
+        assert engine.last_time() == trade_time
+        out = engine.feature_data
+        for feat_group_ind, feats in feature_data.items():
+            for feat_ind, expected in feats.items():
+                assert out[feat_group_ind][feat_ind].equals(expected)
+
+
+def test_incremental_features_with_late_ticks():
+    config = load_config("t00001", is_training=False)
+    df = make_ticks(seed=1)
+    now = pd.Timestamp("2023-05-01 12:00:05")
+    tick_buffer = TickRingBuffer(100_000)
+    tick_buffer.append(df[df["time_msc"] <= now])
+    tick_data = {fc.symbol: tick_buffer for fc in config.features[0].simple_features}
+
+    feature_data = init_feature_dict(config, tick_data, now)
+    engine = IncrementalFeatureEngine(config, tick_data, feature_data, resync_steps=1000)
+
+    trade_time = pd.Timestamp(feature_data[0][0]["time_msc"][-1])
+    late = pd.Timedelta(seconds=2)
+    for i in range(40):
+        trade_time += pd.Timedelta(config.raw_data.trade_timeframe)
+        # the ticks of the last 2 seconds before the previous trade time arrive late,
+        # and replace the ticks from there as in TickHandler.backfill_gap
+        t_late = trade_time - pd.Timedelta(config.raw_data.trade_timeframe) - late
+        tick_buffer.drop_from(t_late)
+        new_ticks = df[(df["time_msc"] >= t_late) & (df["time_msc"] <= trade_time)]
+        if i % 2 == 0:
+            # only every other tick of the last 2 seconds has arrived yet
+            is_late = new_ticks["time_msc"] > trade_time - late
+            new_ticks = new_ticks[~is_late | (np.arange(len(new_ticks)) % 2 == 0)]
+        tick_buffer.append(new_ticks)
+
+        feature_data = update_feature_dict(config, tick_data, feature_data, trade_time)
+        engine.update(trade_time)
+
+        out = engine.feature_data
+        for feat_group_ind, feats in feature_data.items():
+            for feat_ind, expected in feats.items():
+                assert out[feat_group_ind][feat_ind].equals(expected)
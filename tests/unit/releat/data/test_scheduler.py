@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import os
+from time import sleep
+from time import time
+
+import numpy as np
+import polars as pl
+
+from releat.data.scheduler import run_tasks
+
+
+def build_month(i, delay):
+    t0 = time()
+    sleep(delay)
+    return {"i": i, "pid": os.getpid(), "num_ticks": i * 10, "t": (t0, time())}
+
+
+def test_run_tasks_in_process():
+    tasks = [(i, 0.0) for i in range(5)]
+
+    results = run_tasks(build_month, tasks, num_workers=1)
+
+    assert [x["i"] for x in results] == list(range(5))
+    assert {x["pid"] for x in results} == {os.getpid()}
+
+
+def test_run_tasks_keeps_task_order():
+    # polars has used its thread pool in the parent, a forked pool could deadlock
+    df = pl.DataFrame({"k": np.arange(100_000) % 7, "v": np.arange(100_000)})
+    df.group_by("k").agg(pl.col("v").sum())
+
+    # later tasks finish first
+    tasks = [(i, 0.4 - i * 0.05) for i in range(8)]
+
+    results = run_tasks(build_month, tasks, num_workers=2)
+
+    assert [x["i"] for x in results] == list(range(8))
+    assert [x["num_ticks"] for x in results] == [i * 10 for i in range(8)]
+    assert os.getpid() not in {x["pid"] for x in results}
+
+
+def test_run_tasks_within_memory_budget():
+    tasks = [(i, 0.2) for i in range(4)]
+
+    # no two tasks fit in the budget together, and one task is larger on its own
+    results = run_tasks(
+        build_month,
+        tasks,
+        task_memory=[2, 2, 5, 2],
+        num_workers=2,
+        max_memory=3,
+    )
+
+    assert [x["i"] for x in results] == list(range(4))
+    # the tasks ran one after the other, in order
+    for x0, x1 in zip(results[:-1], results[1:]):
+        assert x0["t"][1] <= x1["t"][0]
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import numpy as np
+import polars as pl
+from numba import njit
+
+from releat.data.simple.segments import apply_windows
+from releat.data.simple.segments import apply_windows_shared
+from releat.data.simple.segments import reduce_windows
+
+
+@njit(cache=True, nogil=True)
+def mean_kernel(t, y, params, out):
+    if len(y) >= params[0]:
+        out[0] = y.mean()
+        out[1] = (t[-1] - t[0]) * 1e-9
+
+
+def window_range(t, y):
+    return float(y.max() - y.min()), int(t[-1] - t[0])
+
+
+def test_apply_windows_shared():
+    rng = np.random.default_rng(1)
+    t = np.cumsum(rng.integers(1, 1000, 1000)).astype("int64")
+    y = rng.normal(0, 1, 1000).astype("float32")
+    starts = np.arange(0, 900, 7, dtype="int64")
+    ends = starts + rng.integers(1, 100, len(starts))
+
+    expected = apply_windows(window_range, t, y, starts, ends)
+    vals = apply_windows_shared(window_range, t, y, starts, ends, num_cpus=2)
+
+    assert vals == expected
+
+
+def test_apply_windows_shared_after_polars():
+    # a forked pool could deadlock once the polars thread pool had been used
+    df = pl.DataFrame({"k": np.arange(100_000) % 7, "v": np.arange(100_000)})
+    df.group_by("k").agg(pl.col("v").sum())
+
+    t = np.arange(100, dtype="int64")
+    y = np.arange(100, dtype="float32")
+    starts = np.arange(0, 100, 10, dtype="int64")
+    ends = starts + 10
+
+    vals = apply_windows_shared(window_range, t, y, starts, ends, num_cpus=2)
+
+    assert vals == [(9.0, 9)] * 10
+
+
+def test_reduce_windows():
+    rng = np.random.default_rng(0)
+    t = np.cumsum(rng.integers(1, 1000, 1000)).astype("int64") * 1_000_000
+    y = rng.normal(0, 1, 1000).astype("float32")
+    starts = np.arange(0, 900, 10, dtype="int64")
+    ends = starts + rng.integers(1, 100, len(starts))
+
+    out = reduce_windows(mean_kernel, t, y, starts, ends, np.array([5.0]), 2)
+
+    assert out.shape == (len(starts), 2)
+    for w in range(len(starts)):
+        i0, i1 = starts[w], ends[w]
+        if i1 - i0 < 5:
+            assert np.isnan(out[w]).all()
+        else:
+            assert np.isclose(out[w, 0], y[i0:i1].mean(), atol=1e-5)
+            assert np.isclose(out[w, 1], (t[i1 - 1] - t[i0]) * 1e-9)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import numpy as np
+
+from releat.data.sketches import QuantileSketch
+from releat.data.sketches import ReservoirSample
+
+
+def test_quantile_sketch_matches_np_percentile():
+    rng = np.random.default_rng(0)
+    arr = rng.standard_t(3, size=(200_000, 2))
+    arr[::97, 1] = np.nan
+
+    exact = QuantileSketch(2, k=len(arr) + 1)
+    sketch = QuantileSketch(2, k=4096)
+    for chunk in np.array_split(arr, 7):
+        exact.update(chunk)
+        sketch.update(chunk)
+
+    assert exact.is_exact() and not sketch.is_exact()
+    for q in [0.1, 25, 50, 99.9]:
+        expected = np.nanpercentile(arr, q, axis=0)
+        assert np.array_equal(exact.percentile(q), expected)
+
+        # rank error is about n / k
+        out = sketch.percentile(q)
+        for j in range(2):
+            col = np.sort(arr[:, j][~np.isnan(arr[:, j])])
+            rank = np.searchsorted(col, out[j]) / len(col)
+            assert abs(rank - q / 100) < 2e-3
+
+
+def test_reservoir_sample_is_uniform():
+    sample = ReservoirSample(1000, seed=0)
+    for chunk in np.array_split(np.arange(100_000, dtype="float32")[:, None], 9):
+        sample.update(chunk)
+
+    rows = sample.sample()[:, 0]
+    assert not sample.is_complete()
+    assert len(np.unique(rows)) == 1000
+    assert abs(rows.mean() / 50_000 - 1) < 0.05
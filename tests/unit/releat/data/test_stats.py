@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import numpy as np
+import polars as pl
+
+from releat.data.simple.stats import calc_grad
+from releat.data.simple.stats import calc_rolling_grad
+from releat.data.simple.stats import get_skew
+
+
+def test_calc_rolling_grad():
+    rng = np.random.default_rng(0)
+    num = 5000
+    # tick times in ns with irregular spacing, some ticks share a timestamp
+    t = 1_690_000_000_000_000_000 + np.cumsum(
+        rng.integers(0, 2000, num) * 1_000_000,
+    ).astype("int64")
+    y = (1.1 + np.cumsum(rng.normal(0, 2e-5, num))).astype("float32")
+
+    starts = np.arange(0, num - 200, 37, dtype="int64")
+    ns = rng.integers(1, 200, len(starts)).astype("int64")
+    ns[:3] = [5, 10, 11]
+
+    # small blocks so that windows span several blocks
+    grads = calc_rolling_grad(t, y, starts, starts + ns, 1e-4, 20, block_size=64)
+
+    for w in range(len(starts)):
+        i0, n = starts[w], ns[w]
+        if n <= 10:
+            assert np.isnan(grads[w])
+            continue
+        x = ((t[i0 : i0 + n] - t[i0]) * 1e-9 / 60).astype("float32")
+        expected = calc_grad(x, y[i0 : i0 + n], 1e-4, 20)
+        assert abs(grads[w] - expected) < 1e-2, (w, grads[w], expected)
+
+
+def test_get_skew_matches_polars():
+    rng = np.random.default_rng(1)
+    num = 20_000
+    time_msc = np.datetime64("2023-05-01") + np.cumsum(
+        rng.integers(0, 1500, num),
+    ).astype("timedelta64[ms]")
+    bid = np.round(1.1 + np.cumsum(rng.integers(-2, 3, num)) * 1e-5, 5)
+    # a flat stretch, where the skew is nan
+    bid[5000:5600] = bid[5000]
+    tick_df = pl.DataFrame({"time_msc": time_msc, "bid": bid}).with_row_count(
+        "tick_ind",
+    )
+    df_group = tick_df.set_sorted("time_msc").group_by_dynamic(
+        "time_msc",
+        every="10s",
+        period="1m",
+    )
+    fc = SimpleNamespace(inputs=["bid"], kwargs={"min_num": 20})
+    pip = 1e-4
+
+    out = get_skew(df_group, fc, tick_df)
+
+    expected = (
+        df_group.agg(
+            [
+                ((pl.col("bid") - pl.col("bid").first()) / pip).skew().alias("feat"),
+                pl.count().alias("n"),
+            ],
+        )
+        .with_columns(
+            pl.when(pl.col("n") > fc.kwargs["min_num"])
+            .then(pl.col("feat"))
+            .otherwise(0)
+            .alias("feat"),
+        )
+    )
+    assert out["time_msc"].equals(expected["time_msc"])
+    feat = out["feat"].to_numpy()
+    expected_feat = expected["feat"].to_numpy()
+    assert np.isnan(expected_feat).any()
+    assert np.array_equal(np.isnan(feat), np.isnan(expected_feat))
+    assert (expected_feat == 0).any()
+    assert np.allclose(feat, expected_feat, atol=1e-4, equal_nan=True)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from releat.data.cleaning import clean_raw_tick_data
+from releat.data.tick_archive import is_tick_archive
+from releat.data.tick_archive import read_tick_archive
+from releat.data.tick_archive import write_tick_archive
+
+
+def make_ticks(n=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    time_msc = np.datetime64("2023-02-01", "ms") + np.cumsum(rng.integers(0, 5000, n))
+    bid = np.round(1.1 + np.cumsum(rng.integers(-3, 4, n)) * 1e-5, 5)
+    ask = np.round(bid + rng.integers(0, 20, n) * 1e-5, 5)
+    return pd.DataFrame(
+        {
+            "time": time_msc.astype("datetime64[s]").astype("int64"),
+            "bid": bid,
+            "ask": ask,
+            "last": 0.0,
+            "volume": 0,
+            "time_msc": pd.to_datetime(time_msc),
+            "flags": rng.choice([2, 4, 6, 134], n).astype("uint32"),
+            "volume_real": 0.0,
+        },
+    )
+
+
+def test_tick_archive_is_lossless(tmp_path):
+    df = make_ticks()
+    f = str(tmp_path / "ticks.parquet")
+    write_tick_archive(df, f, "metaquotes", "EURUSD")
+
+    assert is_tick_archive(f)
+    out = read_tick_archive(f)
+    expected = pl.from_pandas(df[["bid", "ask", "time_msc", "flags"]])
+    for col in ["bid", "ask", "flags"]:
+        assert np.array_equal(out[col].to_numpy(), expected[col].to_numpy())
+    assert out["time_msc"].dtype == pl.Datetime("ns")
+    assert out["time_msc"].to_list() == expected["time_msc"].to_list()
+
+
+def test_tick_archive_cleans_as_downloaded(tmp_path):
+    df = make_ticks()
+    f = str(tmp_path / "ticks.parquet")
+    write_tick_archive(df, f, "metaquotes", "EURUSD")
+
+    out = clean_raw_tick_data(read_tick_archive(f), 10)
+    expected = clean_raw_tick_data(
+        pl.from_pandas(df[["bid", "ask", "time_msc", "flags"]]),
+        10,
+    )
+    assert out["time_msc"].to_list() == expected["time_msc"].to_list()
+    assert out["time_diff"].to_list() == expected["time_diff"].to_list()
+    # ticks are up to 5s apart
+    assert 1 < out["time_diff"].max() <= 5
+
+
+def test_clean_raw_tick_data_time_unit():
+    df = pl.from_pandas(make_ticks()[["bid", "ask", "time_msc", "flags"]])
+    out = clean_raw_tick_data(df, 10)
+    for time_unit in ["ms", "us"]:
+        df_unit = df.with_columns(pl.col("time_msc").dt.cast_time_unit(time_unit))
+        assert clean_raw_tick_data(df_unit, 10).equals(out)
+
+
+def test_tick_archive_falls_back_to_parquet(tmp_path):
+    df = make_ticks()
+    df["bid"] += 1e-7
+    f = str(tmp_path / "ticks.parquet")
+    write_tick_archive(df, f, "metaquotes", "EURUSD")
+
+    assert not is_tick_archive(f)
+    assert read_tick_archive(f)["bid"].to_list() == df["bid"].tolist()
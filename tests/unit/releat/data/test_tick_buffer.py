@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from releat.data.tick_buffer import TickRingBuffer
+
+
+def make_ticks(t0, n, rng):
+    time_msc = pd.Timestamp(t0) + pd.to_timedelta(
+        np.cumsum(rng.integers(1, 500, n)),
+        unit="ms",
+    )
+    return pd.DataFrame(
+        {
+            "time_msc": time_msc,
+            "bid": rng.normal(size=n),
+            "ask": rng.normal(size=n),
+            "flags": rng.integers(0, 100, n),
+        },
+    )
+
+
+def test_tick_ring_buffer():
+    rng = np.random.default_rng(0)
+    tick_buffer = TickRingBuffer(1000)
+    expected = make_ticks("2023-05-02", 1, rng)
+    tick_buffer.append(expected)
+    for _ in range(100):
+        df = make_ticks(expected["time_msc"].iloc[-1], int(rng.integers(1, 400)), rng)
+        tick_buffer.append(df)
+        expected = pd.concat([expected, df], ignore_index=True).iloc[-1000:]
+
+        out = tick_buffer.to_frame().to_pandas()
+        assert len(tick_buffer) == len(expected)
+        for col in ["time_msc", "bid", "ask", "flags"]:
+            assert np.array_equal(out[col].to_numpy(), expected[col].to_numpy())
+
+    expected = expected.reset_index(drop=True)
+    t0 = expected["time_msc"].iloc[100]
+    t1 = expected["time_msc"].iloc[500]
+    out = tick_buffer.to_frame(t0, t1)
+    assert len(out) == 401
+    assert np.shares_memory(out["bid"].to_numpy(), tick_buffer.view("bid"))
+    assert tick_buffer.last_time_before(t0) == expected["time_msc"].iloc[99]
+
+    tick_buffer.drop_from(t1)
+    assert tick_buffer.last_time() == expected["time_msc"].iloc[499]
+
+
+def test_tick_ring_buffer_trim():
+    # a tick every hour from Friday to the next Tuesday
+    time_msc = pd.date_range("2023-05-05", "2023-05-09 12:00", freq="1h")
+    df = pd.DataFrame(
+        {"time_msc": time_msc, "bid": 1.0, "ask": 1.0, "flags": 6},
+    )
+
+    # Tuesday keeps the last 24 hours
+    tick_buffer = TickRingBuffer(1000)
+    tick_buffer.append(df)
+    tick_buffer.trim()
+    assert tick_buffer.to_frame()["time_msc"][0] == pd.Timestamp("2023-05-08 13:00")
+
+    # Monday keeps the last 72 hours, over the weekend
+    tick_buffer = TickRingBuffer(1000)
+    tick_buffer.append(df[df["time_msc"] <= "2023-05-08 12:00"])
+    tick_buffer.trim()
+    assert tick_buffer.to_frame()["time_msc"][0] == pd.Timestamp("2023-05-05 13:00")
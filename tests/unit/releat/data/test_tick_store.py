@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from datetime import timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import polars as pl
+
+from releat.data.cleaning import get_tick_file
+from releat.data.cleaning import load_tick_store_month
+from releat.data.cleaning import prepare_tick_data
+from releat.data.tick_archive import write_tick_archive
+from releat.data.tick_store import TICK_SCHEMA
+from releat.data.tick_store import get_file_fingerprint
+from releat.data.tick_store import get_month_files
+from releat.data.tick_store import is_month_ingested
+from releat.data.tick_store import scan_tick_files
+from releat.data.tick_store import write_tick_month
+
+
+def make_store_config(tmp_path):
+    return SimpleNamespace(
+        raw_data=SimpleNamespace(
+            tick_store_dir=None,
+            use_tick_store=True,
+            tick_time_diff_clip_val=10,
+            data_mode="demo",
+        ),
+        paths=SimpleNamespace(tick_data_dir=str(tmp_path)),
+    )
+
+
+def write_ticks(config, dt, days):
+    t = np.datetime64(dt, "ms") + np.arange(0, days * 24, 3).astype("timedelta64[h]")
+    df = pl.DataFrame(
+        {
+            "bid": np.round(1.1 + np.arange(len(t)) * 1e-5, 5),
+            "ask": np.round(1.1 + np.arange(len(t)) * 1e-5 + 2e-5, 5),
+            "time_msc": t,
+            "flags": np.full(len(t), 6, dtype="uint32"),
+        },
+    )
+    tick_f = get_tick_file(config, "metaquotes", "EURUSD", dt)
+    os.makedirs(os.path.dirname(tick_f), exist_ok=True)
+    write_tick_archive(df, tick_f, "metaquotes", "EURUSD")
+    return tick_f
+
+
+def test_write_and_scan_tick_month(tmp_path):
+    config = make_store_config(tmp_path)
+    t = np.datetime64("2023-02-01T00:00:00", "ns") + np.arange(0, 240, 3).astype(
+        "timedelta64[h]",
+    )
+    df = pl.DataFrame({"time_msc": t, "bid": np.arange(len(t), dtype="float32")})
+
+    assert not is_month_ingested(config, "b", "s", "2023-02-01")
+    write_tick_month(config, "b", "s", "2023-02-01", df, row_group_size=4)
+    assert is_month_ingested(config, "b", "s", "2023-02-01")
+
+    files = get_month_files(config, "b", "s", "2023-02-01")
+    assert len(files) == 10
+    assert scan_tick_files(files).collect().equals(df)
+
+    files = get_month_files(config, "b", "s", "2023-02-01", start_date="2023-02-09")
+    t0 = datetime(2023, 2, 9, 12)
+    out = scan_tick_files(files, t0=t0).collect()
+    assert len(files) == 2
+    assert out.equals(df.filter(pl.col("time_msc") >= t0))
+
+
+def test_month_is_ingested_again_when_source_changes(tmp_path):
+    config = make_store_config(tmp_path)
+    tick_f = str(tmp_path / "ticks.parquet")
+    pl.DataFrame({"bid": [1.0]}).write_parquet(tick_f)
+    t = np.datetime64("2023-02-01", "ns") + np.arange(5).astype("timedelta64[D]")
+    df = pl.DataFrame({"time_msc": t, "bid": np.arange(5, dtype="float32")})
+
+    source = get_file_fingerprint(tick_f)
+    write_tick_month(config, "b", "s", "2023-02-01", df, source=source)
+    assert is_month_ingested(config, "b", "s", "2023-02-01", tick_f)
+
+    pl.DataFrame({"bid": [1.0, 2.0]}).write_parquet(tick_f)
+    assert not is_month_ingested(config, "b", "s", "2023-02-01", tick_f)
+
+    # a shorter month replaces the days of the previous version
+    write_tick_month(
+        config,
+        "b",
+        "s",
+        "2023-02-01",
+        df.head(3),
+        source=get_file_fingerprint(tick_f),
+    )
+    assert is_month_ingested(config, "b", "s", "2023-02-01", tick_f)
+    files = get_month_files(config, "b", "s", "2023-02-01")
+    assert scan_tick_files(files).collect().equals(df.head(3))
+
+
+def test_prepare_tick_data_ingests_changed_months(tmp_path):
+    config = make_store_config(tmp_path)
+    for dt in ["2023-01-01", "2023-02-01"]:
+        write_ticks(config, dt, days=10)
+    prepare_tick_data(config, "metaquotes", "EURUSD", "2023-02-01")
+    files = get_month_files(config, "metaquotes", "EURUSD", "2023-02-01")
+    assert len(files) == 10
+
+    # the month is downloaded again with fewer days
+    tick_f = write_ticks(config, "2023-02-01", days=4)
+    stat = os.stat(tick_f)
+    os.utime(tick_f, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    prepare_tick_data(config, "metaquotes", "EURUSD", "2023-02-01")
+    files = get_month_files(config, "metaquotes", "EURUSD", "2023-02-01")
+    assert len(files) == 4
+    assert is_month_ingested(config, "metaquotes", "EURUSD", "2023-02-01", tick_f)
+
+
+def test_load_month_without_ticks(tmp_path):
+    config = make_store_config(tmp_path)
+    write_ticks(config, "2023-01-01", days=10)
+    # a month that has just started, or only has holidays
+    write_ticks(config, "2023-02-01", days=0)
+
+    df = load_tick_store_month(config, "metaquotes", "EURUSD", "2023-02-01")
+    assert is_month_ingested(config, "metaquotes", "EURUSD", "2023-02-01")
+    assert get_month_files(config, "metaquotes", "EURUSD", "2023-02-01") == []
+    assert df.schema == TICK_SCHEMA
+    # only the last day before the last tick of the previous month
+    assert len(df) == 9
+    assert df["time_msc"].min() == datetime(2023, 1, 10, 21) - timedelta(days=1)
+
+    assert scan_tick_files([]).collect().schema == TICK_SCHEMA
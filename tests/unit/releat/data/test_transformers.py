@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from releat.data.transformers import apply_transform
+from releat.data.transformers import apply_transforms
+from releat.data.transformers import clip_by_value
+from releat.data.transformers import difference_windows
+from releat.data.transformers import enrich_transform_config
+from releat.data.transformers import fit_feature_transform_params
+from releat.data.transformers import get_transform_file
+from releat.data.transformers import get_transform_params
+from releat.data.transformers import load_scaled_feature
+from releat.data.transformers import load_transform_params
+from releat.data.transformers import scale_feature
+from releat.data.transformers import yeo_johnson_transform
+from releat.data.utils import get_feature_dir
+from releat.utils.configs.config_builder import load_config
+from releat.utils.configs.data_models import TransformerConfig
+
+
+def test_transform_params_are_loaded_once_and_broadcast(tmp_path):
+    config = load_config("t00001", is_training=False)
+    config.paths.feature_dir = str(tmp_path)
+    feat_group_ind, feat_ind = 0, 1
+    fc = config.features[feat_group_ind].simple_features[feat_ind]
+
+    rng = np.random.default_rng(0)
+    feats = rng.gamma(2.0, size=(1000, fc.output_shape[1])).astype("float32")
+    _ = get_transform_params(config, feat_group_ind, feat_ind, feats.copy())
+
+    # the parameters are kept in memory after they are fitted or loaded
+    transform_f = get_transform_file(config, feat_group_ind, feat_ind, 0)
+    shutil.rmtree(os.path.dirname(transform_f))
+    for t_ind in range(len(fc.transforms)):
+        fc = enrich_transform_config(config, feat_group_ind, feat_ind, t_ind)
+
+    obs = feats[: fc.output_shape[0]]
+    out = obs.copy()
+    expected = obs.copy()
+    ones = np.ones(obs.shape)
+    for tc in fc.transforms:
+        out = apply_transform(out, tc)
+        if tc.name == "clip":
+            assert tc.clip_min.shape == (obs.shape[1],)
+            expected = clip_by_value(
+                expected,
+                tc.clip_min * ones,
+                tc.clip_max * ones,
+                tc.scale_factor,
+            )
+        elif tc.method == "PowerTransformer":
+            assert tc.lam.shape == (obs.shape[1],)
+            expected = yeo_johnson_transform(
+                tc.lam * ones,
+                tc.mean * ones,
+                tc.std * ones,
+                expected,
+            )
+        else:
+            expected = apply_transform(expected, tc)
+
+    assert np.array_equal(out, expected)
+
+
+def test_apply_transforms_matches_each_transform():
+    rng = np.random.default_rng(0)
+    transforms = [
+        TransformerConfig(
+            name="clip",
+            method="percentile",
+            clip_min=np.array([-1.0, 0.0, -2.0]),
+            clip_max=np.array([5.0, 3.0, 4.0]),
+            scale_factor=1.0,
+        ),
+        TransformerConfig(
+            name="scale",
+            method="PowerTransformer",
+            lam=np.array([0.5, 0.0, 2.0]),
+            mean=np.array([0.1, 0.2, 0.3]),
+            std=np.array([1.5, 2.0, 0.5]),
+        ),
+        TransformerConfig(name="scale", method="PiecewiseLinear"),
+        TransformerConfig(
+            name="clip",
+            method="value",
+            clip_min=np.full(3, -3.0),
+            clip_max=np.full(3, 3.0),
+            scale_factor=0.5,
+        ),
+    ]
+    feats = rng.normal(0, 3, (10_000, 3)).astype("float32")
+
+    expected = feats.copy()
+    for tc in transforms:
+        expected = apply_transform(expected, tc)
+
+    for parallel in [False, True]:
+        out = apply_transforms(feats.copy(), transforms, parallel=parallel)
+        assert out.dtype == np.float32
+        assert np.allclose(out, expected, rtol=0, atol=1e-6)
+
+
+def test_streaming_fit_matches_fit_on_all_months(tmp_path):
+    config = load_config("t00001", is_training=False)
+    feat_group_ind, feat_ind = 0, 1
+    fc = config.features[feat_group_ind].simple_features[feat_ind]
+
+    rng = np.random.default_rng(0)
+    time_msc = pd.date_range("2023-01-01", periods=30_000, freq="10s")
+    feats = rng.gamma(2.0, size=(len(time_msc), fc.output_shape[1]))
+    df = pd.DataFrame(feats, columns=[str(i) for i in range(feats.shape[1])])
+    df.insert(0, "time_msc", time_msc)
+
+    config.paths.feature_dir = str(tmp_path / "all")
+    _ = get_transform_params(config, feat_group_ind, feat_ind, feats.copy())
+    expected = [
+        load_transform_params(config, feat_group_ind, feat_ind, t_ind)
+        for t_ind in range(len(fc.transforms))
+        if fc.transforms[t_ind].method != "PiecewiseLinear"
+    ]
+
+    # months overlap, the overlapping rows are only used once
+    config.paths.feature_dir = str(tmp_path / "months")
+    raw_dir = f"{get_feature_dir(config, feat_group_ind, feat_ind)}/raw_data"
+    os.makedirs(raw_dir)
+    for i, i0 in enumerate(range(0, len(df), 10_000)):
+        df.iloc[max(i0 - 50, 0) : i0 + 10_000].to_parquet(f"{raw_dir}/{i}.parquet")
+
+    params = fit_feature_transform_params(config, feat_group_ind, feat_ind)
+    assert len(params) == len(expected)
+    for out, scaler in zip(params.values(), expected):
+        for k, v in scaler.items():
+            assert np.array_equal(out[k], v)
+
+    # with a sample, the percentile clip uses the quantile sketch
+    config.feature_build.transform_sample_size = 5_000
+    params = fit_feature_transform_params(config, feat_group_ind, feat_ind)
+    clip_vals = params[get_transform_file(config, feat_group_ind, feat_ind, 0)]
+    tc = fc.transforms[0]
+    for k, q in [("clip_min", tc.lower_lim), ("clip_max", tc.upper_lim)]:
+        assert np.allclose(clip_vals[k], np.percentile(feats, q, axis=0), rtol=1e-3)
+
+
+def test_difference_windows():
+    rng = np.random.default_rng(0)
+    x = 1.1 + np.cumsum(rng.normal(0, 1e-5, 1000))
+    obs_len, step, pip = 5, 3, 1e-4
+
+    out = difference_windows(x, obs_len, step, pip)
+    assert out.shape == (1000 - obs_len * step, obs_len)
+    assert out.dtype == np.float32
+    for i in [0, 17, len(out) - 1]:
+        window = x[i : i + obs_len * step + 1 : step]
+        expected = (window[:-1] - window[-1]) / pip
+        assert np.allclose(out[i], expected, rtol=0, atol=1e-5)
+
+    assert difference_windows(x[:10], obs_len, step, pip).shape == (0, obs_len)
+
+
+def test_scaled_feature_is_saved_as_one_array(tmp_path):
+    config = load_config("t00001", is_training=False)
+    config.paths.feature_dir = str(tmp_path)
+    feat_group_ind, feat_ind = 0, 1
+    fc = config.features[feat_group_ind].simple_features[feat_ind]
+
+    rng = np.random.default_rng(0)
+    feats = rng.gamma(2.0, size=(1000, fc.output_shape[1])).astype("float32")
+    _ = get_transform_params(config, feat_group_ind, feat_ind, feats.copy())
+    for t_ind in range(len(fc.transforms)):
+        fc = enrich_transform_config(config, feat_group_ind, feat_ind, t_ind)
+
+    time_msc = pd.date_range("2023-01-01", periods=len(feats), freq="10s")
+    df = pd.DataFrame(feats, columns=[str(i) for i in range(feats.shape[1])])
+    df.insert(0, "time_msc", time_msc)
+    raw_dir = f"{get_feature_dir(config, feat_group_ind, feat_ind)}/raw_data"
+    os.makedirs(raw_dir)
+    df.to_parquet(f"{raw_dir}/2023-01-01.parquet")
+
+    scale_feature(config, feat_group_ind, feat_ind, "2023-01-01")
+    out_time, out = load_scaled_feature(
+        config,
+        feat_group_ind,
+        feat_ind,
+        "2023-01-01",
+        time_msc[10],
+        time_msc[20],
+    )
+
+    expected = apply_transforms(feats.copy(), fc.transforms)
+    assert isinstance(out, np.memmap)
+    assert np.array_equal(out_time, time_msc[10:20].to_numpy())
+    assert np.array_equal(out, expected[10:20])
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from releat.data.pipeline import export_obs_store
+from releat.gym_env.data_backend import AerospikeDataBackend
+from releat.gym_env.data_backend import MemmapDataBackend
+from releat.gym_env.data_backend import ObsRingBuffer
+from releat.gym_env.obs_processor import get_raw_data
+from releat.utils.configs.config_builder import load_config
+
+
+class FakeClient:
+    def __init__(self, set_name, columns):
+        self.set_name = set_name
+        self.columns = columns
+
+    def info(self, command):
+        n = len(self.columns["date"])
+        return {"node": (None, f"set={self.set_name}:objects={n}:tombstones=0;")}
+
+    def select_many(self, keys, bins):
+        out = []
+        for key in keys:
+            i = key[2]
+            if (i < 0) or (i >= len(self.columns["date"])):
+                out.append((key, None, None))
+                continue
+            record = {}
+            for b in bins:
+                # a bin that is shorter than the table is missing from later records
+                if i < len(self.columns[b]):
+                    v = self.columns[b][i]
+                    record[b] = int(v) if b == "date" else v.tolist()
+            out.append((key, {}, record))
+        return out
+
+
+def make_columns(config, n, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {
+        "date": 1_600_000_000 + 10 * np.arange(n),
+        "trade_price": rng.normal(size=(n, 4)),
+        "date_arr": rng.random((n, 3)).astype("float32"),
+    }
+    for i, feat_group in enumerate(config.features):
+        width = sum(fc.output_shape[1] for fc in feat_group.simple_features)
+        columns[str(i)] = rng.normal(size=(n, width)).astype("float32")
+    return columns
+
+
+def make_obs_shape(config):
+    raw_data_shape = {i: 5 for i in range(len(config.features))}
+    raw_data_shape["max"] = 5
+    obs_interval = {str(i): 3 + i for i in range(len(config.features))}
+    return raw_data_shape, obs_interval
+
+
+def test_memmap_backend_matches_get_raw_data(tmp_path):
+    config = load_config("t00001", is_training=False)
+    config.obs_store.store_dir = str(tmp_path / "obs_store")
+    columns = make_columns(config, 200)
+    client = FakeClient(config.agent_version, columns)
+    # the last record is incomplete and is not exported
+    columns["0"] = columns["0"][:199]
+
+    export_obs_store(config, client)
+    backend = MemmapDataBackend(dict(config))
+    assert backend.max_data_ind == 198
+
+    raw_data_shape, obs_interval = make_obs_shape(config)
+    inds = np.array([30, 100, 198])
+    batch = backend.get_raw_data_batch(raw_data_shape, obs_interval, inds)
+    for j, ind in enumerate(inds):
+        expected = get_raw_data(dict(config), client, raw_data_shape, obs_interval, ind)
+        out = backend.get_raw_data(raw_data_shape, obs_interval, ind)
+        for k, v in expected.items():
+            assert np.allclose(out[k], v)
+            assert np.allclose(batch[k][j], v)
+
+
+def test_export_raises_without_complete_records(tmp_path):
+    config = load_config("t00001", is_training=False)
+    config.obs_store.store_dir = str(tmp_path / "obs_store")
+    columns = make_columns(config, 10)
+    columns["0"] = columns["0"][:0]
+    client = FakeClient(config.agent_version, columns)
+
+    with pytest.raises(ValueError):
+        export_obs_store(config, client)
+
+
+def test_obs_ring_buffer_wraps_around():
+    num, interval, width = 4, 3, 2
+    rows = np.arange(100 * width, dtype="float32").reshape((-1, width))
+    buffer = ObsRingBuffer(num, interval, width)
+
+    # steps of different sizes wrap around the buffer several times, a step back
+    # rewrites the whole window
+    for ind in [12, 13, 14, 17, 25, 26, 40, 20, 21, 60]:
+        i0 = buffer.get_start_ind(ind)
+        buffer.write(i0, rows[i0 : ind + 1])
+        view = buffer.view()
+        assert np.shares_memory(view, buffer.buf)
+        assert np.array_equal(view, rows[ind - num * interval : ind + 1 : interval])
+
+
+def test_aerospike_backend_matches_get_raw_data():
+    config = load_config("t00001", is_training=False)
+    client = FakeClient(config.agent_version, make_columns(config, 300))
+    raw_data_shape, obs_interval = make_obs_shape(config)
+
+    backend = AerospikeDataBackend(dict(config), client)
+    inds = np.array([40, 41, 43, 50, 51, 120, 45, 299])
+    for ind in inds:
+        expected = get_raw_data(dict(config), client, raw_data_shape, obs_interval, ind)
+        out = backend.get_raw_data(raw_data_shape, obs_interval, ind)
+        for k, v in expected.items():
+            assert np.allclose(out[k], v)
+
+    batch = backend.get_raw_data_batch(raw_data_shape, obs_interval, inds)
+    for j, ind in enumerate(inds):
+        expected = get_raw_data(dict(config), client, raw_data_shape, obs_interval, ind)
+        for k, v in expected.items():
+            assert np.allclose(batch[k][j], v)
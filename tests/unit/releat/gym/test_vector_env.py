@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import aerospike
+import numpy as np
+
+from releat.gym_env.gym_env import FxEnv
+from releat.gym_env.vector_env import FxVectorEnv
+from releat.utils.configs.config_builder import load_config
+
+
+class FakeClient:
+    def __init__(self, columns, hparams):
+        self.columns = columns
+        self.hparams = hparams
+
+    def connect(self):
+        return self
+
+    def get(self, key):
+        return key, {}, dict(self.hparams)
+
+    def select_many(self, keys, bins):
+        out = []
+        for key in keys:
+            record = {}
+            for b in bins:
+                v = self.columns[b][key[2]]
+                record[b] = int(v) if b == "date" else v.tolist()
+            out.append((key, {}, record))
+        return out
+
+
+def make_env_config(monkeypatch, num_envs, n=3000, seed=0):
+    config = load_config("t00001", is_training=False)
+    config.rl_rollouts["num_envs_per_worker"] = num_envs
+    rng = np.random.default_rng(seed)
+    # fitted transform parameters, so that no transform files are needed
+    for feat_group in config.features:
+        for fc in feat_group.simple_features:
+            for tc in fc.transforms:
+                if tc.name == "clip":
+                    tc.clip_min = np.full(fc.output_shape, -3.0)
+                    tc.clip_max = np.full(fc.output_shape, 3.0)
+                if tc.method == "PowerTransformer":
+                    tc.lam = 0.8 + 0.4 * rng.random(fc.output_shape)
+                    tc.mean = np.zeros(fc.output_shape)
+                    tc.std = np.ones(fc.output_shape)
+
+    price = 1.1 + np.cumsum(rng.normal(0, 1e-4, (n, 1)), axis=0)
+    columns = {
+        "date": 1_600_000_000 + 10 * np.arange(n),
+        # min and max of the bid and of the ask are equal, so that the sampled
+        # prices are the same in both envs
+        "trade_price": price + np.array([[0, 0, 2e-5, 2e-5]]),
+        "date_arr": rng.random((n, 3)).astype("float32"),
+    }
+    for i, feat_group in enumerate(config.features):
+        width = sum(fc.output_shape[1] for fc in feat_group.simple_features)
+        columns[str(i)] = rng.normal(size=(n, width)).astype("float32")
+        columns[str(i)][:, 0] = price[:, 0]
+
+    hparams = {**config.gym_env.dict(), "max_data_ind": n - 1, "max_samples": n}
+    client = FakeClient(columns, hparams)
+    monkeypatch.setattr(aerospike, "client", lambda *args, **kwargs: client)
+    return dict(config), client
+
+
+def assert_obs_equal(out, expected):
+    assert out.keys() == expected.keys()
+    for k, v in expected.items():
+        assert np.allclose(out[k], v, rtol=0, atol=1e-5), k
+
+
+def test_vector_env_matches_fx_envs(monkeypatch):
+    num_envs = 3
+    config, client = make_env_config(monkeypatch, num_envs)
+    vector_env = FxVectorEnv(config)
+    envs = [FxEnv(config, client) for _ in range(num_envs)]
+
+    # the first env reaches the end of the data and is reset on its own
+    seeds = [2900, 500, 1200]
+    obs, _ = vector_env.vector_reset(seeds=seeds)
+    for i, env in enumerate(envs):
+        expected, _ = env.reset(seed=seeds[i])
+        assert_obs_equal(obs[i], expected)
+
+    rng = np.random.default_rng(0)
+    num_resets = 0
+    for _ in range(150):
+        actions = [int(rng.choice(np.flatnonzero(x["mask"] == 1))) for x in obs]
+        obs, rewards, dones, _, _ = vector_env.vector_step(actions)
+        for i, env in enumerate(envs):
+            expected, reward, done, _, _ = env.step(actions[i])
+            assert_obs_equal(obs[i], expected)
+            assert np.isclose(rewards[i], reward)
+            assert dones[i] == done
+
+            if done:
+                num_resets += 1
+                obs[i], _ = vector_env.reset_at(i, seed=1000 + num_resets)
+                expected, _ = env.reset(seed=1000 + num_resets)
+                assert_obs_equal(obs[i], expected)
+
+    assert num_resets > 0
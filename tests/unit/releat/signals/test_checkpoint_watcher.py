@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+import pickle
+from glob import glob
+
+import numpy as np
+
+from releat.signals.checkpoint_watcher import CheckpointWatcher
+from releat.signals.checkpoint_watcher import load_policy_weights
+from releat.signals.checkpoint_watcher import read_checkpoint_manifest
+from releat.signals.checkpoint_watcher import write_checkpoint_manifest
+
+
+def save_checkpoint(algo_dir, name, val):
+    checkpoint_dir = f"{algo_dir}/{name}"
+    policy_dir = f"{checkpoint_dir}/policies/default_policy"
+    os.makedirs(policy_dir)
+    with open(f"{policy_dir}/policy_state.pkl", "wb") as f:
+        pickle.dump({"weights": {"w": np.full(3, val)}}, f)
+    return checkpoint_dir
+
+
+def test_watcher_only_loads_checkpoints_in_the_manifest(tmp_path):
+    algo_dir = str(tmp_path)
+    watcher = CheckpointWatcher(algo_dir)
+    assert read_checkpoint_manifest(algo_dir) is None
+    assert not watcher.step()
+
+    # a checkpoint without a manifest may be partially written
+    checkpoint_dir = save_checkpoint(algo_dir, "checkpoint_000001", 1.0)
+    assert not watcher.step()
+
+    write_checkpoint_manifest(algo_dir, checkpoint_dir)
+    assert watcher.step()
+    assert not watcher.step()
+
+    standby = watcher.pop_standby()
+    assert standby["checkpoint_id"] == "checkpoint_000001"
+    assert np.array_equal(standby["weights"]["w"], np.ones(3))
+    assert watcher.pop_standby() is None
+
+    # only the latest loaded checkpoint is swapped in
+    for i in [2, 3]:
+        checkpoint_dir = save_checkpoint(algo_dir, f"checkpoint_00000{i}", i)
+        write_checkpoint_manifest(algo_dir, checkpoint_dir)
+        assert watcher.step()
+    standby = watcher.pop_standby()
+    assert standby["checkpoint_id"] == "checkpoint_000003"
+    assert np.array_equal(
+        standby["weights"]["w"],
+        load_policy_weights(checkpoint_dir)["w"],
+    )
+
+
+def test_manifest_is_not_a_checkpoint(tmp_path):
+    # train_rl_agent resumes from the last checkpoint* in the algo_dir
+    algo_dir = str(tmp_path)
+    checkpoint_dir = save_checkpoint(algo_dir, "checkpoint_000001", 1.0)
+    write_checkpoint_manifest(algo_dir, checkpoint_dir)
+
+    assert sorted(glob(f"{algo_dir}/checkpoint*")) == [checkpoint_dir]
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import os
+import pickle
+
+import gymnasium as gym
+import numpy as np
+import pytest
+from ray.rllib.connectors.agent.obs_preproc import ObsPreprocessorConnector
+from ray.rllib.connectors.agent.pipeline import AgentConnectorPipeline
+from ray.rllib.connectors.connector import ConnectorContext
+from ray.rllib.models.preprocessors import get_preprocessor
+
+from releat.signals.checkpoint_watcher import CheckpointWatcher
+from releat.signals.checkpoint_watcher import write_checkpoint_manifest
+from releat.signals.rl_actor import RLActor
+
+
+obs_space = gym.spaces.Dict(
+    {
+        "feats": gym.spaces.Box(-1, 1, (2, 4)),
+        "mask": gym.spaces.Box(0, 1, (3,)),
+        "pos_val": gym.spaces.Box(-1, 1, (2,)),
+    },
+)
+
+
+class FakePolicy:
+    """Policy with the connectors of a rollout worker and a linear model."""
+
+    def __init__(self):
+        ctx = ConnectorContext(config={}, observation_space=obs_space)
+        self.agent_connectors = AgentConnectorPipeline(
+            ctx,
+            [ObsPreprocessorConnector(ctx)],
+        )
+        self.w = np.random.default_rng(0).normal(size=(13, 3))
+        self.input_dicts = []
+
+    def set_weights(self, weights):
+        self.w = weights["w"]
+
+    def compute_actions_from_input_dict(self, input_dict, explore=None):
+        assert not explore
+        self.input_dicts.append(input_dict)
+        logits = input_dict["obs"] @ self.w
+        return logits.argmax(axis=1), [], {"action_dist_inputs": logits}
+
+
+class FakeWorker:
+    def __init__(self, preprocessors):
+        self.preprocessors = preprocessors
+
+
+class FakeWorkerSet:
+    def __init__(self, preprocessors):
+        self.worker = FakeWorker(preprocessors)
+
+    def local_worker(self):
+        return self.worker
+
+
+class FakeTrainer:
+    def __init__(self, preprocessors=None):
+        self.policy = FakePolicy()
+        self.workers = FakeWorkerSet(preprocessors)
+
+    def get_policy(self):
+        return self.policy
+
+
+def make_actor():
+    actor = RLActor.__new__(RLActor)
+    actor.trainer = FakeTrainer()
+    actor.checkpoint = "checkpoint_000001/policies"
+    actor.checkpoint_id = "checkpoint_000001"
+    actor.reload_latency = 0.5
+    actor.watcher = None
+    return actor
+
+
+def make_gym_obs_data(rng):
+    return {
+        "feats": rng.uniform(-1, 1, (2, 4)).astype(np.float32),
+        "mask": np.ones(3, dtype=np.float32),
+        "pos_val": np.array([0.5, -0.5], dtype=np.float32),
+        "pos_val_no_pos": np.zeros(2, dtype=np.float32),
+        "mask_no_pos": np.array([1, 1, 0], dtype=np.float32),
+        "pos_val_hedge": np.array([-0.5, 0.5], dtype=np.float32),
+        "mask_hedge": np.array([0, 1, 1], dtype=np.float32),
+    }
+
+
+def test_predict_batch_runs_one_forward_pass():
+    actor = make_actor()
+    gym_obs_data = make_gym_obs_data(np.random.default_rng(1))
+    out = actor.predict(dict(gym_obs_data))
+
+    # the variants are stacked into one batch of flattened observations
+    policy = actor.trainer.policy
+    assert len(policy.input_dicts) == 1
+    obs = policy.input_dicts[0]["obs"]
+    assert obs.shape == (3, 13)
+    expected = np.concatenate(
+        [gym_obs_data["feats"].ravel(), gym_obs_data["mask"], gym_obs_data["pos_val"]],
+    )
+    assert np.array_equal(obs[0], expected)
+    assert np.array_equal(obs[1, 8:], [1, 1, 0, 0, 0])
+    assert np.array_equal(obs[2, 8:], [0, 1, 1, -0.5, 0.5])
+
+    logits = obs @ policy.w
+    for i, k in enumerate(["pos", "no_pos", "hedge"]):
+        assert out[f"action_{k}"] == int(logits[i].argmax())
+        assert isinstance(out[f"action_{k}"], int)
+        assert np.allclose(out[f"action_dist_{k}"], logits[i])
+    assert out["checkpoint_id"] == "checkpoint_000001"
+    assert out["reload_latency"] == 0.5
+
+
+def test_predict_batch_without_connectors():
+    gym_obs_data = make_gym_obs_data(np.random.default_rng(1))
+    expected = make_actor().predict(dict(gym_obs_data))
+
+    # with enable_connectors=False the rollout worker has the preprocessors
+    actor = make_actor()
+    preprocessor = get_preprocessor(obs_space)(obs_space)
+    actor.trainer = FakeTrainer({"default_policy": preprocessor})
+    actor.trainer.policy.agent_connectors = None
+    assert actor.predict(dict(gym_obs_data)) == expected
+
+    # without either, i.e. the connectors have no obs preprocessor
+    actor = make_actor()
+    actor.trainer = FakeTrainer({"default_policy": None})
+    actor.trainer.policy.agent_connectors.remove("ObsPreprocessorConnector")
+    with pytest.raises(ValueError, match="observation preprocessor"):
+        actor.predict(dict(gym_obs_data))
+
+
+def save_checkpoint(algo_dir, name, w):
+    checkpoint_dir = f"{algo_dir}/{name}"
+    policy_dir = f"{checkpoint_dir}/policies/default_policy"
+    os.makedirs(policy_dir)
+    with open(f"{policy_dir}/policy_state.pkl", "wb") as f:
+        pickle.dump({"weights": {"w": w}}, f)
+    write_checkpoint_manifest(algo_dir, checkpoint_dir)
+
+
+def test_swap_policy_between_predictions(tmp_path):
+    algo_dir = str(tmp_path)
+    actor = make_actor()
+    policy = actor.trainer.policy
+    actor.watcher = CheckpointWatcher(algo_dir, actor.checkpoint_id)
+    gym_obs_data = make_gym_obs_data(np.random.default_rng(2))
+
+    # no new checkpoint, the weights are unchanged
+    w1 = policy.w
+    out = actor.predict(dict(gym_obs_data))
+    assert policy.w is w1
+    assert out["checkpoint_id"] == "checkpoint_000001"
+
+    # the weights that the watcher loaded are used by the next prediction
+    w2 = np.random.default_rng(3).normal(size=(13, 3))
+    save_checkpoint(algo_dir, "checkpoint_000002", w2)
+    assert actor.watcher.step()
+    assert policy.w is w1
+
+    out = actor.predict(dict(gym_obs_data))
+    assert np.array_equal(policy.w, w2)
+    assert out["checkpoint_id"] == "checkpoint_000002"
+    assert out["checkpoint"] == f"{algo_dir}/checkpoint_000002"
+    logits = policy.input_dicts[-1]["obs"] @ w2
+    assert np.allclose(out["action_dist_pos"], logits[0])
+    assert actor.watcher.pop_standby() is None
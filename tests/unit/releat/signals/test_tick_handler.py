@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from time import time
+
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+
+import releat.signals.tick_handler as tick_handler
+from releat.signals.tick_handler import TickHandler
+from releat.signals.tick_stream import LocalTickChannel
+from releat.signals.tick_stream import replay_ticks
+from releat.utils.configs.config_builder import load_config
+
+T0 = np.datetime64("2023-05-02T10:00:00", "ms")
+# a tick every 250ms for 10 minutes
+TIME_MSC = T0 + np.arange(2400) * np.timedelta64(250, "ms")
+
+
+def make_ticks(inds):
+    return pl.DataFrame(
+        {
+            "time_msc": TIME_MSC[inds].astype("int64"),
+            "bid": 1.1 + inds * 1e-5,
+            "ask": 1.1 + inds * 1e-5 + 2e-5,
+            "flags": np.full(len(inds), 6, dtype="uint32"),
+        },
+    )
+
+
+def to_str(t):
+    return pd.Timestamp(t).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class FakeResponse:
+    status_code = 200
+
+    def json(self):
+        return {"status": "ok"}
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    downloads = []
+
+    def download_tick_data(broker, symbol, dt0, dt1, data_mode, check_api=True):
+        downloads.append((pd.Timestamp(dt0).tz_localize(None), pd.Timestamp(dt1)))
+        # mt5 only takes whole seconds
+        dt0 = np.datetime64(pd.Timestamp(dt0).tz_localize(None).floor("s"), "ms")
+        dt1 = np.datetime64(pd.Timestamp(dt1).tz_localize(None).floor("s"), "ms")
+        inds = np.flatnonzero((TIME_MSC >= dt0) & (TIME_MSC < dt1))
+        tick_df = make_ticks(inds).to_pandas()
+        tick_df["time_msc"] = pd.to_datetime(tick_df["time_msc"], unit="ms")
+        return {"broker": broker, "symbol": symbol, "tick_df": tick_df}
+
+    monkeypatch.setattr(
+        tick_handler,
+        "load_config",
+        lambda agent_version, **kwargs: load_config(agent_version, is_training=False),
+    )
+    monkeypatch.setattr(tick_handler.requests, "get", lambda url: FakeResponse())
+    monkeypatch.setattr(tick_handler.requests, "post", lambda url, json: FakeResponse())
+    monkeypatch.setattr(tick_handler, "download_tick_data", download_tick_data)
+
+    channel = LocalTickChannel()
+    th = TickHandler("t00001", channel=channel)
+    th.config.tick_stream.wait_timeout = 0.2
+    th.init_tick_data(to_str(TIME_MSC[1000]), hour_delta=1)
+    th.downloads = downloads
+    return th, channel
+
+
+def replay(th, channel, inds, first_seq=None):
+    for si in th.config.symbol_info:
+        replay_ticks(channel, si.broker, si.symbol, make_ticks(inds), first_seq=first_seq)
+
+
+def assert_buffer(th, inds):
+    for tick_buffer in th.tick_data.values():
+        df = tick_buffer.to_frame()
+        assert df["time_msc"].dt.epoch("ms").to_list() == (
+            TIME_MSC[inds].astype("int64").tolist()
+        )
+        assert np.allclose(df["bid"].to_numpy(), 1.1 + inds * 1e-5)
+
+
+def test_stream_gap_is_backfilled(handler):
+    th, channel = handler
+    # the stream starts before the end of the initial download
+    replay(th, channel, np.arange(990, 1200), first_seq=0)
+    th.update_tick_data(to_str(TIME_MSC[1100]))
+    assert_buffer(th, np.arange(0, 1200))
+
+    # 300 ticks are missing from the stream
+    replay(th, channel, np.arange(1500, 1600), first_seq=510)
+    replay(th, channel, np.arange(1600, 1700), first_seq=610)
+    th.update_tick_data(to_str(TIME_MSC[1650]))
+    assert th.subscriber.num_missing == 300
+    assert_buffer(th, np.arange(0, 1700))
+    # the backfill starts at the second of the last tick before the gap
+    dt0, dt1 = th.downloads[-1]
+    assert dt0 == pd.Timestamp(TIME_MSC[1199]).floor("s")
+    assert dt1 > pd.Timestamp(TIME_MSC[1500])
+
+
+def test_update_waits_for_stream(handler):
+    th, channel = handler
+    replay(th, channel, np.arange(1000, 1100), first_seq=0)
+
+    # the ticks up to the trade time arrive after the update starts
+    timer = threading.Timer(
+        0.05,
+        replay,
+        (th, channel, np.arange(1100, 1200), 100),
+    )
+    timer.start()
+    th.update_tick_data(to_str(TIME_MSC[1150]))
+    timer.join()
+    assert_buffer(th, np.arange(0, 1200))
+
+    # no ticks after the trade time, i.e. a quiet market
+    t0 = time()
+    th.update_tick_data(to_str(TIME_MSC[1300]))
+    assert 0.2 <= time() - t0 < 1.0
+    assert_buffer(th, np.arange(0, 1200))
+    assert th.is_stream_behind(datetime(2023, 5, 2, 10, 5))
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import importlib.util
+import sys
+import threading
+from collections import defaultdict
+from pathlib import Path
+from time import sleep
+from time import time
+from types import ModuleType
+from types import SimpleNamespace
+
+import numpy as np
+import polars as pl
+import pytest
+
+from releat.signals.tick_stream import get_stream_key
+from releat.signals.tick_stream import get_tick_channel
+from releat.signals.tick_stream import LocalTickChannel
+from releat.signals.tick_stream import RedisTickChannel
+from releat.signals.tick_stream import replay_ticks
+from releat.signals.tick_stream import TickPublisher
+from releat.signals.tick_stream import TickSubscriber
+
+
+class FakeRedisServer:
+    """Redis streams of one server, shared by its clients."""
+
+    def __init__(self):
+        self.streams = defaultdict(list)
+        self.cond = threading.Condition()
+        self.num_ids = 0
+
+
+class FakeRedis:
+    """Redis client with the stream commands of RedisTickChannel."""
+
+    def __init__(self, server, **kwargs):
+        self.server = server
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        with self.server.cond:
+            self.server.num_ids += 1
+            msg_id = f"{self.server.num_ids}-0".encode()
+            fields = {k.encode(): v for k, v in fields.items()}
+            fields = {
+                k: v if isinstance(v, bytes) else str(v).encode()
+                for k, v in fields.items()
+            }
+            stream = self.server.streams[key.encode()]
+            stream.append((msg_id, fields))
+            if maxlen is not None:
+                del stream[:-maxlen]
+            self.server.cond.notify_all()
+            return msg_id
+
+    def xrevrange(self, key, count=None):
+        with self.server.cond:
+            return list(reversed(self.server.streams[key.encode()]))[:count]
+
+    def _new_msgs(self, streams):
+        out = []
+        for key, pos in streams.items():
+            pos = int(pos.split(b"-")[0]) if isinstance(pos, bytes) else 0
+            msgs = self.server.streams[key.encode()]
+            msgs = [x for x in msgs if int(x[0].split(b"-")[0]) > pos]
+            if len(msgs) > 0:
+                out.append([key.encode(), msgs])
+        return out
+
+    def xread(self, streams, block=None):
+        with self.server.cond:
+            out = self._new_msgs(streams)
+            if (len(out) == 0) and (block is not None):
+                self.server.cond.wait(block / 1000)
+                out = self._new_msgs(streams)
+            return out
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = FakeRedisServer()
+    monkeypatch.setattr(
+        "releat.signals.tick_stream.redis.Redis",
+        lambda **kwargs: FakeRedis(server, **kwargs),
+    )
+    return server
+
+
+def make_ticks(time_msc):
+    n = len(time_msc)
+    return {
+        "time_msc": np.asarray(time_msc, dtype="int64"),
+        "bid": np.arange(n, dtype="float64"),
+        "ask": np.arange(n, dtype="float64") + 1,
+        "flags": np.full(n, 6, dtype="uint32"),
+    }
+
+
+def test_publisher_skips_published_ticks():
+    channel = LocalTickChannel()
+    subscriber = TickSubscriber(channel, [("b", "s")])
+    # mt5 returns all ticks from t0, including the ones at t0 that were published
+    polls = [
+        make_ticks([1000, 1000, 1500]),
+        make_ticks([1500, 1500, 2000]),
+        make_ticks([2000]),
+    ]
+    publisher = TickPublisher(channel, "b", "s", lambda t0: polls.pop(0), 1000)
+
+    assert [publisher.step() for _ in range(3)] == [3, 2, 0]
+    df = subscriber.poll()["b_s"]
+    assert df["time_msc"].dt.epoch("ms").to_list() == [1000, 1000, 1500, 1500, 2000]
+    assert subscriber.num_duplicates == 0
+    assert subscriber.num_missing == 0
+
+
+def test_subscriber_drops_duplicates_and_counts_gaps():
+    channel = LocalTickChannel()
+    subscriber = TickSubscriber(channel, [("b", "s")])
+    df = pl.DataFrame(make_ticks(np.arange(10) * 100))
+
+    next_seq = replay_ticks(channel, "b", "s", df, batch_size=4)
+    assert next_seq == 10
+    # resend the last 5 ticks, then skip 2
+    replay_ticks(channel, "b", "s", df[5:], first_seq=5)
+    replay_ticks(channel, "b", "s", df[:3], first_seq=12)
+
+    out = subscriber.poll()["b_s"]
+    assert len(out) == 13
+    assert subscriber.num_duplicates == 5
+    assert subscriber.num_missing == 2
+    assert channel.last_seq(get_stream_key("b", "s")) == 14
+    assert subscriber.poll() == {}
+
+
+def test_redis_channel(redis_server):
+    publisher = RedisTickChannel("localhost", 6379, maxlen=3)
+    channel = RedisTickChannel("localhost", 6379)
+    df = pl.DataFrame(make_ticks(np.arange(10) * 100))
+    key = get_stream_key("b", "s")
+
+    # ticks published before the subscriber are not read
+    replay_ticks(publisher, "b", "s", df[:2])
+    subscriber = TickSubscriber(channel, [("b", "s")])
+    assert channel.last_seq(key) == 1
+
+    replay_ticks(publisher, "b", "s", df[2:], batch_size=3)
+    out = subscriber.poll()["b_s"]
+    assert out["time_msc"].dtype == pl.Datetime("ns")
+    assert out["time_msc"].dt.epoch("ms").to_list() == list(range(200, 1000, 100))
+    assert out.select(["bid", "ask", "flags"]).equals(
+        df[2:].select(["bid", "ask", "flags"]),
+    )
+    assert channel.last_seq(key) == 9
+    # the stream is trimmed to the last 3 batches
+    assert len(redis_server.streams[key.encode()]) == 3
+    assert subscriber.poll() == {}
+
+
+def test_subscriber_marks_gaps():
+    channel = LocalTickChannel()
+    subscriber = TickSubscriber(channel, [("b", "s")])
+    df = pl.DataFrame(make_ticks(np.arange(10) * 100))
+
+    replay_ticks(channel, "b", "s", df[:2])
+    replay_ticks(channel, "b", "s", df[4:6], first_seq=4)
+    replay_ticks(channel, "b", "s", df[6:7], first_seq=6)
+    replay_ticks(channel, "b", "s", df[8:], first_seq=8)
+
+    assert len(subscriber.poll()["b_s"]) == 7
+    assert subscriber.gaps["b_s"] == [2, 5]
+    assert subscriber.num_missing == 3
+
+
+def test_local_channel_is_not_configurable():
+    config = SimpleNamespace(
+        tick_stream=SimpleNamespace(channel="local", maxlen=10),
+        redis=SimpleNamespace(host="localhost", port=6379),
+    )
+    with pytest.raises(ValueError):
+        get_tick_channel(config)
+
+
+def load_mt5_api(monkeypatch, ticks):
+    """Load apis/mt5.py with a stubbed MetaTrader5 module."""
+    mt5 = ModuleType("MetaTrader5")
+    mt5.COPY_TICKS_ALL = -1
+    mt5.symbol_info_tick = lambda symbol: SimpleNamespace(
+        time_msc=int(ticks["time_msc"][0]),
+    )
+
+    def copy_ticks_range(symbol, dt0, dt1, flags):
+        t = ticks["time_msc"] // 1000
+        return ticks[(t >= dt0.timestamp()) & (t < dt1.timestamp())]
+
+    mt5.copy_ticks_range = copy_ticks_range
+    monkeypatch.setitem(sys.modules, "MetaTrader5", mt5)
+    monkeypatch.delitem(sys.modules, "releat.connectors.mt5", raising=False)
+    monkeypatch.setattr(sys, "argv", ["mt5.py", "-b", "b", "-s", "s"])
+
+    api_f = Path(__file__).parents[4] / "apis" / "mt5.py"
+    spec = importlib.util.spec_from_file_location("mt5_api", api_f)
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+    api.mt5c.conn = sys.modules["releat.connectors.mt5"].MT5Connector({})
+    return api
+
+
+def test_start_stream(monkeypatch, redis_server):
+    t = 1_682_899_200_000 + np.arange(20) * 150
+    ticks = np.zeros(
+        20,
+        dtype=[("time_msc", "<i8"), ("bid", "<f8"), ("ask", "<f8"), ("flags", "<u4")],
+    )
+    ticks["time_msc"] = t
+    ticks["bid"] = np.arange(20)
+    ticks["ask"] = np.arange(20) + 1
+    ticks["flags"] = 6
+    api = load_mt5_api(monkeypatch, ticks)
+    client = api.app.test_client()
+    subscriber = TickSubscriber(RedisTickChannel("localhost", 6379), [("b", "s")])
+
+    payload = {"broker": "b", "symbol": "s", "host": "localhost", "port": 6379}
+    resp = client.post("/start_stream", json={**payload, "interval": 0.01})
+    assert resp.status_code == 200
+    assert resp.json == {"status": "ok", "start_time_msc": int(t[0])}
+    try:
+        resp = client.post("/start_stream", json=payload)
+        assert resp.json == {"status": "already streaming"}
+
+        out = []
+        t_wait = time() + 10
+        while (sum(len(x) for x in out) < 20) and (time() < t_wait):
+            out += list(subscriber.poll(block_ms=100).values())
+            sleep(0.01)
+    finally:
+        api.mt5c.publishers[("b", "s")].stop()
+
+    out = pl.concat(out)
+    assert out["time_msc"].dt.epoch("ms").to_list() == t.tolist()
+    assert out["bid"].to_list() == list(range(20))
+    assert subscriber.num_duplicates == 0
+    assert subscriber.num_missing == 0
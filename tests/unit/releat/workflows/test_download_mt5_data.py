@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+import pytz
+
+import releat.workflows.download_mt5_data as download_mt5_data
+from releat.data.tick_archive import read_tick_archive
+from releat.workflows.download_mt5_data import download_symbol
+from releat.workflows.download_mt5_data import load_manifest
+
+NOW = datetime(2023, 3, 15, 12)
+
+
+class FakeDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return NOW
+
+
+def make_day_ticks(t0):
+    time_msc = np.datetime64(t0, "ns") + np.array([1, 2, 3], dtype="timedelta64[h]")
+    return pl.DataFrame(
+        {
+            "bid": [1.1, 1.10001, 1.10002],
+            "ask": [1.10002, 1.10003, 1.10004],
+            "time_msc": time_msc,
+            "flags": [6, 2, 4],
+        },
+    )
+
+
+def patch_download(monkeypatch, tmp_path, failed_days=()):
+    calls = []
+
+    def download_ticks(broker, symbol, t0, t1, data_mode, check_api, timeout):
+        day = t0.strftime("%Y-%m-%d")
+        calls.append(day)
+        if day in failed_days:
+            raise ConnectionError("mt5 api down")
+        return make_day_ticks(t0)
+
+    monkeypatch.setattr(download_mt5_data, "root_dir", str(tmp_path))
+    monkeypatch.setattr(download_mt5_data, "datetime", FakeDatetime)
+    monkeypatch.setattr(download_mt5_data, "download_ticks", download_ticks)
+    monkeypatch.setattr(download_mt5_data, "sleep", lambda x: None)
+    monkeypatch.setattr(
+        download_mt5_data,
+        "get_most_recent_file",
+        lambda broker, symbol: datetime(2023, 1, 1, tzinfo=pytz.utc),
+    )
+    return calls
+
+
+def read_month(tmp_path, f):
+    df = read_tick_archive(f"{tmp_path}/data/tick_data/metaquotes/EURUSD/{f}")
+    return df["time_msc"].dt.cast_time_unit("ns").to_list()
+
+
+def expected_month(t0, t1):
+    days = np.arange(np.datetime64(t0), np.datetime64(t1))
+    return pl.concat([make_day_ticks(day) for day in days])["time_msc"].to_list()
+
+
+def test_download_symbol(monkeypatch, tmp_path):
+    calls = patch_download(monkeypatch, tmp_path)
+
+    result = download_symbol("metaquotes", "EURUSD", "demo", False, 60)
+
+    symbol_dir = f"{tmp_path}/data/tick_data/metaquotes/EURUSD"
+    manifest = load_manifest(symbol_dir)
+    assert result == {"ticks": 3 * 74, "days": 74, "failed_days": 0}
+    assert len(calls) == 74
+    assert manifest["months"] == ["2023-01-01", "2023-02-01"]
+    # today is not complete, it is downloaded again on the next run
+    assert sorted(manifest["days"]) == [f"2023-03-{d:02d}" for d in range(1, 15)]
+    assert read_month(tmp_path, "2023-02-01_2023-02-28.parquet") == expected_month(
+        "2023-02-01",
+        "2023-03-01",
+    )
+    assert read_month(tmp_path, "2023-03-01_2023-03-31.parquet") == expected_month(
+        "2023-03-01",
+        "2023-03-16",
+    )
+    # only the chunks of the current month are kept
+    assert sorted(os.listdir(f"{symbol_dir}/chunks")) == [
+        f"2023-03-{d:02d}.parquet" for d in range(1, 16)
+    ]
+
+
+def test_download_symbol_resumes(monkeypatch, tmp_path):
+    calls = patch_download(monkeypatch, tmp_path, failed_days=["2023-02-10"])
+
+    result = download_symbol("metaquotes", "EURUSD", "demo", False, 60, max_retries=2)
+
+    symbol_dir = f"{tmp_path}/data/tick_data/metaquotes/EURUSD"
+    manifest = load_manifest(symbol_dir)
+    assert result["failed_days"] == 1
+    assert calls.count("2023-02-10") == 2
+    assert manifest["months"] == ["2023-01-01"]
+    # the other days of the month are kept, the later months wait for it
+    assert len(manifest["days"]) == 27
+    assert "2023-02-10" not in manifest["days"]
+    assert not any(day.startswith("2023-03") for day in calls)
+    assert not os.path.exists(f"{symbol_dir}/2023-02-01_2023-02-28.parquet")
+
+    calls = patch_download(monkeypatch, tmp_path)
+    result = download_symbol("metaquotes", "EURUSD", "demo", False, 60)
+
+    manifest = load_manifest(symbol_dir)
+    assert calls[0] == "2023-02-10"
+    assert len(calls) == 1 + 15
+    assert result["failed_days"] == 0
+    assert manifest["months"] == ["2023-01-01", "2023-02-01"]
+    assert read_month(tmp_path, "2023-02-01_2023-02-28.parquet") == expected_month(
+        "2023-02-01",
+        "2023-03-01",
+    )